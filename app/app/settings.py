@@ -43,15 +43,17 @@ INSTALLED_APPS = [
     'core',
     'user',
     'exercise',
+    'images',
 ]
 
+# session, csrf, auth and messages are skipped on API_PATH_PREFIXES
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.CsrfViewMiddleware',
+    'core.middleware.AuthenticationMiddleware',
+    'core.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -79,16 +81,62 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# the backends in core.db.backends add HEALTH_CHECKS and POOL, a pooled
+# connection goes back to the pool when the request ends
+DB_POOL = os.environ.get('DB_POOL') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.environ.get('DB_ENGINE', 'core.db.backends.postgresql'),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE',
+                                           0 if DB_POOL else 60)),
+        'HEALTH_CHECKS': True,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        } if DB_POOL else None,
     }
 }
 
+# DB_REPLICAS lists the replica hosts with an optional weight, as in
+# "replica-1:3,replica-2", each gets a replica_<n> alias
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(
+        filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    host, _, weight = replica.partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host,
+                        'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+# DB_SHARDS lists the hosts of the databases sharing the recipe data with
+# default, each gets a shard_<n> alias. Only append to it, the position of
+# a shard gives its id block, see core.db.shards
+DATABASE_SHARDS = ['default']
+for number, host in enumerate(
+        filter(None, os.environ.get('DB_SHARDS', '').split(',')), 1):
+    alias = f'shard_{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_SHARDS.append(alias)
+SHARD_VNODES = 64
+SHARD_MAP_CACHE = 'default'
+SHARD_MAP_CACHE_TTL = 30
+
+DATABASE_ROUTERS = ['core.db.shards.ShardRouter',
+                    'core.db.replicas.ReplicaRouter']
+# replicas further behind the primary are skipped, in seconds
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = 2
+# users read from the primary this long after a write, more than the lag
+READ_YOUR_WRITES_WINDOW = float(
+    os.environ.get('READ_YOUR_WRITES_WINDOW', 10))
+REPLICA_PIN_CACHE = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -108,6 +156,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHERS = [
+    'user.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+# changing it rehashes every password on its next login
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 216000))
+
+AUTHENTICATION_BACKENDS = ['user.backends.PooledModelBackend']
+
+# login and signup hash in a bounded pool, requests past workers + queue
+# get a 429 with Retry-After instead of starving the other endpoints
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 8))
+PASSWORD_HASHING_RETRY_AFTER = 1
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
@@ -136,5 +202,122 @@ STATIC_ROOT = '/vol/web/static'
 
 MEDIA_ROOT = '/vol/web/media'  # this is where to store all the media files
 
+# token authenticated routes, see core.middleware
+API_PATH_PREFIXES = ('/api/', MEDIA_URL)
+
+# resized variants of the recipe images, kept outside of the media root
+# so they are only reachable through the resize endpoint
+IMAGE_CACHE_ROOT = os.environ.get('IMAGE_CACHE_ROOT', '/vol/web/cache')
+IMAGE_CACHE_MAX_BYTES = int(
+    os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_RESIZE_MAX_DIMENSION = 2048
+
+# chunks of resumable uploads are assembled here before validation
+IMAGE_UPLOAD_TEMP_DIR = os.environ.get(
+    'IMAGE_UPLOAD_TEMP_DIR', '/vol/web/uploads-tmp')
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40 * 1000 * 1000))
+
+# flag near duplicate uploads comparing a difference hash of the images
+IMAGE_PERCEPTUAL_HASH = os.environ.get('IMAGE_PERCEPTUAL_HASH') == '1'
+IMAGE_PERCEPTUAL_HASH_DISTANCE = 6
+
+# '' streams from python (os.sendfile through the server file wrapper),
+# 'x-accel-redirect' for nginx or 'x-sendfile' for apache/lighttpd
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', '')
+# nginx: location /protected/ { internal; alias /vol/web/; }
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected/')
+MEDIA_ACCEL_ROOT = '/vol/web'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ['core.throttling.BucketThrottle'],
+    # requests per user, or per IP when anonymous, and scope, as token
+    # buckets: the whole budget at once at most, refilled over the period
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '120/min'),
+        'user': os.environ.get('THROTTLE_RATE_USER', '1200/min'),
+        'auth': '60/min',
+        'recipe_search': '120/min',
+        'image_upload': '60/min',
+        'image_resize': '600/min',
+        'media': '6000/min',
+        'batch': '120/min',
+    },
+}
+# counters are only consistent across processes in a shared backend
+THROTTLE_CACHE = 'default'
+
+# /api/batch/ runs up to BATCH_MAX_REQUESTS calls under BATCH_PATH_PREFIX,
+# reads in parallel on BATCH_WORKERS threads when asked to
+BATCH_MAX_REQUESTS = 20
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_PATH_PREFIX = '/api/'
+
+# values computed by one worker at a time, see core.cache, in seconds: how
+# long the worker holds the lock, the others wait for a first value and
+# are served an expired one
+SINGLE_FLIGHT_LEASE = 10
+SINGLE_FLIGHT_WAIT = 2
+SINGLE_FLIGHT_STALE_TTL = 60
+
+# rendered recipe details, and lists and stats of each user, kept until
+# their data changes or the ttl in seconds
+RECIPE_DETAIL_CACHE = 'default'
+RECIPE_DETAIL_CACHE_TTL = 24 * 60 * 60
+RECIPE_USER_CACHE = 'default'
+RECIPE_USER_CACHE_TTL = 10 * 60
+
+# background jobs of core.jobs, run by the run_workers command: a failed
+# job is tried again after JOB_RETRY_DELAY seconds, doubled every attempt
+# up to JOB_RETRY_MAX_DELAY, JOB_MAX_ATTEMPTS times at most, one running
+# for longer than JOB_LEASE seconds is queued again, idle workers look for
+# new jobs every JOB_POLL_INTERVAL seconds
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+JOB_LEASE = 60 * 60
+JOB_POLL_INTERVAL = 1
+
+# the recipe, tag and ingredient changes are appended to the ChangeEvent
+# outbox of their shard, see core.outbox: readers only get the events older
+# than CHANGE_FEED_DELAY seconds, the transactions writing them have to
+# commit within it, the dispatch_changes command hands them to the dotted
+# paths of CHANGE_HANDLERS in batches, prune_change_events deletes the
+# ones older than CHANGE_EVENT_RETENTION seconds
+CHANGE_FEED_DELAY = 2
+CHANGE_FEED_MAX_LIMIT = 1000
+CHANGE_HANDLERS = []
+CHANGE_DISPATCH_BATCH_SIZE = 500
+CHANGE_EVENT_RETENTION = 7 * 24 * 60 * 60
+
+# deleted users are purged by a job, a raw delete of
+# USER_DELETION_BATCH_SIZE rows at a time, see core.deletion, a purge not
+# progressing for USER_DELETION_STALLED_AFTER seconds can start over
+USER_DELETION_BATCH_SIZE = 1000
+USER_DELETION_STALLED_AFTER = 60 * 60
+
+# authenticated users are cached per token key for this many seconds, in
+# each process and in the shared cache (an alias of CACHES, empty to
+# disable), every hit checks a version per user kept in
+# TOKEN_AUTH_VERSION_CACHE, bumped on revocations, so this cache must be
+# shared by the processes, the checks refuse a process local one
+TOKEN_AUTH_CACHE_MAX_ENTRIES = 10000
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 30))
+TOKEN_AUTH_SHARED_CACHE = os.environ.get('TOKEN_AUTH_SHARED_CACHE', '')
+TOKEN_AUTH_VERSION_CACHE = 'default'
+
+# lifetime in seconds of the signed access tokens, refreshed with the
+# database token
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 300))
+
 AUTH_USER_MODEL = 'core.User'  # this overrides the default
 # user model to the customized one
@@ -13,8 +13,9 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from core.batch import BatchView
+from core.views import DatabasePoolView, JobQueueView
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
@@ -22,6 +23,11 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/exercise/', include('exercise.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-# this creates the path to access to the media without the need for creating a new server for
-# hosting our files
+    path('api/images/', include('images.api_urls')),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/db-pool/', DatabasePoolView.as_view(), name='db-pool'),
+    path('api/jobs/', JobQueueView.as_view(), name='jobs'),
+    path(settings.MEDIA_URL.lstrip('/'), include('images.urls')),
+]
+# the media files are served by the images app, checking who can see them
+# and handing the transfer to the web server when MEDIA_SENDFILE_BACKEND is set
@@ -35,4 +35,6 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
 admin.site.register(models.Recipe)
+admin.site.register(models.AccountDeletion)
+admin.site.register(models.Job)
 # register the modified user admin
@@ -0,0 +1,103 @@
+"""Helpers for the async read endpoints
+
+The ORM is synchronous in this Django version, queries run in worker
+threads with sync_to_async(thread_sensitive=False) so independent ones of
+the same request go out at the same time, each on its own connection.
+"""
+import asyncio
+import functools
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework import exceptions
+
+from .db.shards import pinned_shard, user_shard
+from .throttling import BucketThrottle
+
+
+def call_in_worker(fn, *args):
+    """Call fn from a pool thread, releasing its connections after
+    """
+    try:
+        return fn(*args)
+    finally:
+        # the worker thread outlives the request, honour CONN_MAX_AGE here
+        for conn in connections.all():
+            conn.close_if_unusable_or_obsolete()
+
+
+async def run_query(fn, *args):
+    """Run a blocking database call in a worker thread
+    """
+    return await sync_to_async(
+        call_in_worker, thread_sensitive=False)(fn, *args)
+
+
+async def run_queries(*calls):
+    """Run independent database calls concurrently
+
+    Args:
+        calls: callables without arguments, results come back in order
+    """
+    return await asyncio.gather(*(run_query(call) for call in calls))
+
+
+def _authenticate(request, authentication_classes):
+    for auth_class in authentication_classes:
+        result = auth_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    raise exceptions.NotAuthenticated()
+
+
+def _check_request(request, authentication_classes, throttle_scope):
+    """Authenticate and throttle like the DRF views, return the user and
+    their shard or the error response
+    """
+    try:
+        # the items of a batch come with the user of the batch
+        request.user = getattr(request, '_force_auth_user', None) or \
+            _authenticate(request, authentication_classes)
+
+        throttle = BucketThrottle()
+        view = SimpleNamespace(throttle_scope=throttle_scope)
+        if not throttle.allow_request(request, view):
+            raise exceptions.Throttled(wait=throttle.wait())
+    except exceptions.APIException as exc:
+        response = JsonResponse({'detail': str(exc.detail)},
+                                status=exc.status_code)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(int(exc.wait) + 1)
+        if response.status_code == 401:
+            response['WWW-Authenticate'] = \
+                authentication_classes[0]().authenticate_header(request)
+        return None, None, response
+    return request.user, user_shard(request.user.pk)[0], None
+
+
+def async_api_view(authentication_classes, throttle_scope=None):
+    """Decorate an async read view with token authentication and throttling
+
+    Only GET and HEAD are accepted, request.user is set and the queries
+    pinned to the shard of the user before the view runs.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=405)
+            user, shard, error = await run_query(
+                _check_request, request, authentication_classes,
+                throttle_scope)
+            if error is not None:
+                return error
+            request.user = user
+            # the worker threads of the queries inherit the context
+            with pinned_shard(shard):
+                return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,155 @@
+"""Several API calls in one HTTP request
+
+The client posts a list of {"method", "path", "body"} items and gets back
+one {"status", "body"} per item, in order. Items are dispatched straight
+to the resolved views as the already authenticated user, without the
+middleware or the authentication running again. The async views are run
+to completion in an event loop of their own.
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+from rest_framework import exceptions, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from user.authentication import (AccessTokenAuthentication,
+                                 CachedTokenAuthentication)
+
+from .async_api import call_in_worker
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# copied from the batch request, the rest describes the item
+ITEM_META_SKIPPED = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING',
+                     'SCRIPT_URL', 'REDIRECT_URL', 'wsgi.input')
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BATCH_WORKERS, thread_name_prefix='batch')
+
+
+async def _awaited(coroutine):
+    return await coroutine
+
+
+def _error(status, detail):
+    return {'status': status, 'body': {'detail': detail}}
+
+
+def _sub_request(request, method, path, body):
+    """Build the request of an item on top of the batch request
+    """
+    url = urlsplit(path)
+    environ = {key: value for key, value in request.META.items()
+               if key not in ITEM_META_SKIPPED}
+    content = b'' if body is None else json.dumps(body).encode()
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': BytesIO(content),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub_request = WSGIRequest(environ)
+    # DRF authenticates these with ForcedAuthentication
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def dispatch(request, item):
+    """Run one item of the batch and return its status and body
+    """
+    if not isinstance(item, dict):
+        return _error(400, 'Every item must be an object.')
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if not isinstance(path, str) or \
+            not path.startswith(settings.BATCH_PATH_PREFIX):
+        return _error(400, 'Items must have an API path.')
+
+    sub_request = _sub_request(request, method, path, item.get('body'))
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return _error(404, 'Not found.')
+    if getattr(match.func, 'view_class', None) is BatchView:
+        return _error(400, 'Batches can not be nested.')
+    sub_request.resolver_match = match
+
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if asyncio.iscoroutine(response):
+            response = async_to_sync(_awaited)(response)
+        if hasattr(response, 'render'):
+            response.render()
+        content = response.content
+        if response.get('Content-Type', '').startswith('application/json'):
+            content = json.loads(content) if content else None
+        else:
+            content = content.decode(response.charset, 'replace')
+    except Exception:
+        logger.exception('Batch item failed: %s %s', method, path)
+        return _error(500, 'Server error.')
+    return {'status': response.status_code, 'body': content}
+
+
+class BatchView(APIView):
+    """Run a list of API calls for the authenticated user
+
+    With ?parallel=1 consecutive reads run at the same time in a thread
+    pool, each on its own database connection, writes always run alone
+    and in order.
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_scope = 'batch'
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise exceptions.ValidationError(
+                'Expected a list of {"method", "path", "body"} items.')
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            raise exceptions.ValidationError(
+                f'At most {settings.BATCH_MAX_REQUESTS} items per batch.')
+
+        parallel = request.query_params.get('parallel') == '1'
+        results = []
+        for group in self._groups(items, parallel):
+            if len(group) == 1:
+                results.append(dispatch(request, group[0]))
+            else:
+                results.extend(_executor.map(
+                    lambda item: call_in_worker(dispatch, request, item),
+                    group))
+        return Response(results)
+
+    def _groups(self, items, parallel):
+        """Split the items in runs that can go at the same time
+        """
+        group = []
+        for item in items:
+            read = parallel and isinstance(item, dict) and \
+                str(item.get('method', 'GET')).upper() in SAFE_METHODS
+            if not read:
+                if group:
+                    yield group
+                    group = []
+                yield [item]
+            else:
+                group.append(item)
+        if group:
+            yield group
@@ -0,0 +1,102 @@
+"""Cached values recomputed by one worker at a time
+
+get_or_compute keeps a value with its expiry and the time it took to
+compute. Once expired, the worker winning a lock taken with cache.add
+recomputes it, holding the lock SINGLE_FLIGHT_LEASE seconds at most, while
+the others are served the old value, kept SINGLE_FLIGHT_STALE_TTL seconds
+past the expiry for that. With no value at all, they wait for the new one
+up to SINGLE_FLIGHT_WAIT seconds before computing it themselves. None is
+never kept, a compute() finding nothing is run again on the next read.
+
+A read may also refresh the value before it expires, the more likely the
+closer the expiry and the longer the computation, so the values cached
+together do not all expire and get recomputed together.
+
+The versions are tokens to put in the keys of values depending on some
+data: bumping the version when the data changes leaves the values of the
+previous version unreachable.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+LOCK_SUFFIX = ':lock'
+POLL_INTERVAL = 0.05
+
+
+def get_version(key, alias='default'):
+    cache = caches[alias]
+    version = cache.get(key)
+    if version is None:
+        # a new token rather than a counter, an evicted one cannot come back
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(keys, alias='default'):
+    caches[alias].set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def _refresh_early(expires, delta, beta):
+    # -log(u) for u uniform in (0, 1] is exponential with a mean of 1
+    gap = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + gap >= expires
+
+
+def get_or_compute(key, compute, ttl, alias='default', beta=1.0):
+    """The cached value of the key, computed by compute() when missing or
+    expired
+
+    Args:
+        ttl: seconds before the value is computed again
+        beta: above 1 refreshes earlier, 0 never before the expiry
+    """
+    cache = caches[alias]
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if not _refresh_early(expires, delta, beta):
+            return value
+        lock = _lock(cache, key)
+        if lock is None:
+            return value  # being refreshed by another worker
+        return _compute(cache, key, compute, ttl, lock)
+
+    lock = _lock(cache, key)
+    if lock is None:
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+            if cache.get(f'{key}{LOCK_SUFFIX}') is None:
+                break  # computed nothing to keep
+    return _compute(cache, key, compute, ttl, lock)
+
+
+def _lock(cache, key):
+    token = uuid.uuid4().hex
+    if cache.add(f'{key}{LOCK_SUFFIX}', token, settings.SINGLE_FLIGHT_LEASE):
+        return token
+    return None
+
+
+def _compute(cache, key, compute, ttl, lock):
+    try:
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        if value is not None:
+            cache.set(key, (value, time.time() + ttl, delta),
+                      ttl + settings.SINGLE_FLIGHT_STALE_TTL)
+        return value
+    finally:
+        # past the lease the lock may be another worker's
+        if lock is not None and cache.get(f'{key}{LOCK_SUFFIX}') == lock:
+            cache.delete(f'{key}{LOCK_SUFFIX}')
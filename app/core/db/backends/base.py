@@ -0,0 +1,99 @@
+"""Health checks and pooling on top of the stock database backends
+
+Two settings of the database, next to the Django ones:
+
+    HEALTH_CHECKS: when a persistent connection (CONN_MAX_AGE) is reused
+        by a new request, check it still works before the first query and
+        reconnect when it does not, instead of failing the request.
+    POOL: opt in to the in process connection pool, a dict with MIN_SIZE,
+        MAX_SIZE, TIMEOUT, MAX_IDLE and CHECK_AFTER, see ConnectionPool.
+        Closing a connection gives it back, pair it with CONN_MAX_AGE = 0
+        so threads do not keep theirs between requests.
+"""
+import functools
+
+from core.db.pool import ConnectionPool, close_pools, get_pool
+
+POOL_DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_IDLE': 300,
+    'CHECK_AFTER': 30,
+}
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixed in front of the DatabaseWrapper of a backend
+    """
+    health_check_done = False
+    pool = None
+
+    def check_connection(self, connection):
+        """Whether a raw connection still answers
+        """
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return super().get_new_connection(conn_params)
+        options = {**POOL_DEFAULTS, **options}
+        key = tuple(sorted((name, repr(value))
+                           for name, value in conn_params.items()))
+        self.pool = get_pool(self.alias, key, lambda: ConnectionPool(
+            functools.partial(super(PooledDatabaseWrapperMixin, self)
+                              .get_new_connection, conn_params),
+            self.check_connection,
+            min_size=options['MIN_SIZE'],
+            max_size=options['MAX_SIZE'],
+            timeout=options['TIMEOUT'],
+            max_idle=options['MAX_IDLE'],
+            check_after=options['CHECK_AFTER'],
+        ))
+        self.pool.fill()
+        return self.pool.acquire()
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done:
+            self.health_check_done = True
+            if self.settings_dict.get('HEALTH_CHECKS') and \
+                    not self.in_atomic_block and \
+                    not self.check_connection(self.connection):
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # runs when requests start and end, check again on the next use
+        self.health_check_done = False
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        # half done transactions and changed sessions are not reused
+        discard = self.in_atomic_block or self.errors_occurred or \
+            self.autocommit != self.settings_dict['AUTOCOMMIT']
+        with self.wrap_database_errors:
+            self.pool.release(self.connection, discard=discard)
+
+
+class PooledDatabaseCreationMixin:
+    """Close the pooled connections before the test database is dropped
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,12 @@
+from core.db.backends.base import (PooledDatabaseCreationMixin,
+                                   PooledDatabaseWrapperMixin)
+from django.db.backends.sqlite3 import base, creation
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin,
+                       creation.DatabaseCreation):
+    pass
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
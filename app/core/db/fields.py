@@ -0,0 +1,64 @@
+"""Model fields working the same on every database of the project
+
+django.contrib.postgres needs psycopg2 on import, so the array of ids is
+a JSON list with an overlap lookup written for each vendor.
+"""
+from django.db import NotSupportedError, models
+
+
+class IdArrayField(models.JSONField):
+    """List of integer ids, filtered with __overlap
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', list)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('default') is list:
+            del kwargs['default']
+        if kwargs.get('blank'):
+            del kwargs['blank']
+        return name, path, args, kwargs
+
+
+@IdArrayField.register_lookup
+class Overlap(models.Lookup):
+    """The rows sharing at least one id with the given ones
+    """
+    lookup_name = 'overlap'
+    prepare_rhs = False
+
+    def _ids(self):
+        return [int(value) for value in self.rhs]
+
+    def as_postgresql(self, compiler, connection):
+        # one containment per id, each answered by the GIN index
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        ids = self._ids()
+        if not ids:
+            return 'FALSE', []
+        sql = ' OR '.join([f'{lhs} @> %s::jsonb'] * len(ids))
+        return f'({sql})', [*lhs_params * len(ids),
+                            *(f'[{value}]' for value in ids)]
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        ids = ','.join(str(value) for value in self._ids())
+        return f'JSON_OVERLAPS({lhs}, %s)', [*lhs_params, f'[{ids}]']
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        ids = self._ids()
+        if not ids:
+            return '0', []
+        placeholders = ', '.join(['%s'] * len(ids))
+        return (f'EXISTS (SELECT 1 FROM json_each({lhs}) '
+                f'WHERE json_each.value IN ({placeholders}))'), \
+            [*lhs_params, *ids]
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            f'__overlap is not supported on {connection.vendor}')
@@ -0,0 +1,99 @@
+"""Migration operations building indexes without locking the tables
+
+On PostgreSQL the indexes are built CONCURRENTLY, which cannot run in a
+transaction: the migrations using these set atomic = False. The other
+databases get a plain CREATE INDEX, or none for the index types only
+PostgreSQL has.
+"""
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db import NotSupportedError, connections, migrations
+
+
+def _concurrently(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.in_atomic_block:
+        raise NotSupportedError(
+            'Building an index concurrently needs a migration with '
+            'atomic = False')
+    return True
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex without locking out the writes on PostgreSQL
+    """
+
+    def allow_migrate_model(self, connection_alias, model):
+        if isinstance(self.index, PostgresIndex) and \
+                connections[connection_alias].vendor != 'postgresql':
+            return False
+        return super().allow_migrate_model(connection_alias, model)
+
+    def describe(self):
+        return f'Concurrently {super().describe().lower()}'
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index,
+                                    **self._options(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index,
+                                       **self._options(schema_editor))
+
+    def _options(self, schema_editor):
+        return {'concurrently': True} if _concurrently(schema_editor) else {}
+
+
+class AddThroughIndexConcurrently(migrations.operations.base.Operation):
+    """Index on the table Django makes for a ManyToManyField
+
+    The model of the table is not in the migration state, so the index
+    is not either, it is only made in the database.
+    """
+    reduces_to_sql = False
+
+    def __init__(self, model_name, field_name, index):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.index = index
+
+    def deconstruct(self):
+        return (self.__class__.__name__, [], {
+            'model_name': self.model_name,
+            'field_name': self.field_name,
+            'index': self.index,
+        })
+
+    def describe(self):
+        return (f'Concurrently create index {self.index.name} on the '
+                f'{self.model_name}.{self.field_name} table')
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _through(self, app_label, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        return model._meta.get_field(self.field_name).remote_field.through
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        through = self._through(app_label, to_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, through):
+            options = {'concurrently': True} \
+                if _concurrently(schema_editor) else {}
+            schema_editor.add_index(through, self.index, **options)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        through = self._through(app_label, from_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, through):
+            options = {'concurrently': True} \
+                if _concurrently(schema_editor) else {}
+            schema_editor.remove_index(through, self.index, **options)
@@ -0,0 +1,236 @@
+"""In process pool of database connections
+
+Django opens a connection per thread and drops it when the request ends
+or after CONN_MAX_AGE. With the pool the close hands the raw connection
+back and the next request of any thread takes it over, the TCP and
+authentication handshake only happens when the pool grows. The backends in
+core.db.backends use it when the database has a POOL entry.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import DatabaseError
+
+# window of the creation rate in the stats, in seconds
+CREATION_RATE_WINDOW = 60
+
+
+class PoolTimeout(DatabaseError):
+    """No connection was given back in time
+    """
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections
+
+    Idle connections are handed out last in first out, the ones idle for
+    more than check_after seconds are checked before, the ones idle for
+    more than max_idle seconds are closed down to min_size.
+
+    Args:
+        connect: callable opening a new connection
+        check: callable telling whether a connection still works
+        min_size: connections kept open when idle
+        max_size: connections open at most, in use or idle
+        timeout: seconds to wait for a connection before PoolTimeout
+        max_idle: seconds an idle connection above min_size is kept
+        check_after: idle seconds after which a connection is checked
+    """
+
+    def __init__(self, connect, check, min_size=0, max_size=10, timeout=10,
+                 max_idle=300, check_after=30):
+        self._connect = connect
+        self._check = check
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, given back at), oldest first
+        self._size = 0  # open or being opened, in use or idle
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._timeouts = 0
+        self._creations = deque()  # times of the recent creations
+
+    def fill(self):
+        """Open connections up to min_size
+        """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._create()
+            except Exception:
+                self._forget()
+                raise
+            self.release_idle(connection)
+
+    def acquire(self):
+        """Take a connection, opening one when none is idle and the pool
+        is not full, waiting for one otherwise
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f'No database connection free after '
+                            f'{self.timeout}s, {self._size} in use.')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            if self._idle:
+                connection, since = self._idle.pop()
+            else:
+                connection, since = None, None
+                self._size += 1
+            self._in_use += 1
+
+        if connection is not None and \
+                time.monotonic() - since >= self.check_after and \
+                not self._check(connection):
+            # keep its slot for the replacement
+            self._close(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = self._create()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                self._forget()
+                raise
+        return connection
+
+    def release(self, connection, discard=False):
+        """Give a connection back, closing it when discard is set
+        """
+        with self._cond:
+            self._in_use -= 1
+        if discard:
+            self._close(connection)
+            self._forget()
+        else:
+            self.release_idle(connection)
+
+    def release_idle(self, connection):
+        expired = []
+        with self._cond:
+            now = time.monotonic()
+            self._idle.append((connection, now))
+            while len(self._idle) > 1 and self._size > self.min_size and \
+                    now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.popleft()[0])
+                self._size -= 1
+            self._cond.notify()
+        for connection in expired:
+            self._close(connection)
+
+    def close_idle(self):
+        """Close the idle connections, the ones in use are left alone
+        """
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._cond:
+            self._trim_creations(time.monotonic())
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'created': self._created,
+                'created_per_minute':
+                    len(self._creations) * 60 / CREATION_RATE_WINDOW,
+                'timeouts': self._timeouts,
+            }
+
+    def _create(self):
+        connection = self._connect()
+        with self._cond:
+            now = time.monotonic()
+            self._created += 1
+            self._creations.append(now)
+            self._trim_creations(now)
+        return connection
+
+    def _forget(self):
+        """Free the slot of a connection that is gone
+        """
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _trim_creations(self, now):
+        while self._creations and \
+                self._creations[0] < now - CREATION_RATE_WINDOW:
+            self._creations.popleft()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(alias, key, factory):
+    """The pool of a database for this process, made by factory on first
+    use. key tells apart the connection parameters of the alias, the test
+    runner connects the same alias to other databases.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # forked, the connections belong to the parent
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get((alias, key))
+        if pool is None:
+            pool = _pools[alias, key] = factory()
+            pool.alias = alias
+    return pool
+
+
+def close_pools(alias=None):
+    """Close the idle connections of the pools of alias, or of all
+    """
+    with _pools_lock:
+        pools = [pool for (pool_alias, _), pool in _pools.items()
+                 if alias is None or pool_alias == alias]
+    for pool in pools:
+        pool.close_idle()
+
+
+def pool_stats():
+    """The stats of the pools of this process by database alias
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = {}
+    for pool in pools:
+        for name, value in pool.stats().items():
+            stats.setdefault(pool.alias, {}).setdefault(name, 0)
+            stats[pool.alias][name] += value
+    return stats
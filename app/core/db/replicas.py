@@ -0,0 +1,180 @@
+"""Reads from the replicas, writes and fresh reads from the primary
+
+The views with ReplicaReadsMixin serve their safe requests from a replica
+of DATABASE_REPLICAS, picked by weight once per request among the ones at
+most REPLICA_MAX_LAG seconds behind. Everything else stays on the primary,
+so do the requests of a user for READ_YOUR_WRITES_WINDOW seconds after one
+of theirs wrote, as a lagging replica may not have their change yet. The
+marker lives in REPLICA_PIN_CACHE, shared by all the processes.
+"""
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY_PREFIX = 'replica-pin:'
+# seconds since the last replayed transaction, 0 when all is replayed
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END'
+)
+
+
+class RoutingState:
+    """What the router knows about the current request
+    """
+
+    def __init__(self):
+        self.replica_reads = False
+        self.replica = None
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+class ReplicaLag:
+    """Replication lag of the replicas in seconds, measured at most every
+    REPLICA_LAG_CHECK_INTERVAL, None for the ones not answering
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lags = {}  # alias -> (lag, measured at)
+
+    def get(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            lag, measured = self._lags.get(alias, (None, None))
+        if measured is not None and \
+                now - measured < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return lag
+        lag = self.measure(alias)
+        with self._lock:
+            self._lags[alias] = (lag, now)
+        return lag
+
+    def measure(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                return float(cursor.fetchone()[0] or 0)
+        except DatabaseError:
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._lags.clear()
+
+
+replica_lag = ReplicaLag()
+
+
+def choose_replica():
+    """Pick a replica by weight among the ones close enough to the
+    primary, None when there is none
+    """
+    aliases, weights = [], []
+    for alias, weight in settings.DATABASE_REPLICAS.items():
+        lag = replica_lag.get(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            aliases.append(alias)
+            weights.append(weight)
+    if not aliases:
+        return None
+    return random.choices(aliases, weights)[0]
+
+
+def pin_key(user_id):
+    return f'{PIN_KEY_PREFIX}{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Serve the user from the primary until the replicas caught up
+    """
+    caches[settings.REPLICA_PIN_CACHE].set(
+        pin_key(user_id), 1, settings.READ_YOUR_WRITES_WINDOW)
+
+
+def is_pinned(user_id):
+    return caches[settings.REPLICA_PIN_CACHE].get(pin_key(user_id)) \
+        is not None
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Read from the primary within the block, for the values kept past
+    the request, which a lagging replica would leave stale
+    """
+    token = _state.set(None)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """Send the replica reads of the request to its replica, the rest to
+    the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote or \
+                connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        same_data = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in same_data and obj2._state.db in same_data:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadsMixin:
+    """Serve the safe requests of an API view from the replicas
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _state.set(RoutingState())
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _state.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # decided once the user is known, the authentication reads the
+        # primary
+        _state.get().replica_reads = bool(settings.DATABASE_REPLICAS) and \
+            request.method in SAFE_METHODS and \
+            not is_pinned(request.user.pk)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if _state.get().wrote and request.user.is_authenticated:
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,259 @@
+"""Recipe data split by user across databases
+
+The recipes, tags, ingredients, uploads and change events of a user live
+together on one shard of DATABASE_SHARDS, picked by a consistent hash of
+the user id unless a UserShard row says otherwise, which is how move_user
+relocates a user. Users, tokens and image blobs stay on the default
+database.
+
+Views with UserShardMixin pin every query of the request to the shard of
+the user, queries outside of a pinned request go to the default database
+unless they say where with using(). Each shard is a full copy of the
+schema, run migrate with --database for every one of them. The ids of
+the shard at position n of DATABASE_SHARDS start at n * SHARD_ID_BLOCK
+so the rows of a moved user keep their ids. Appending a shard hands part
+of the users to it on the ring, move them with move_user before, or give
+them a UserShard row keeping them where they are.
+"""
+import bisect
+import contextlib
+import contextvars
+import hashlib
+import threading
+
+from core.models import (ChangeEvent, ImageUpload, Ingredient, Recipe,
+                         RecipeSummary, Tag, UserShard)
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from rest_framework import exceptions
+
+SHARDED_MODELS = frozenset((
+    'core.tag', 'core.ingredient', 'core.recipe', 'core.recipe_tags',
+    'core.recipe_ingredients', 'core.imageupload', 'core.recipesummary',
+    'core.changeevent',
+))
+SHARD_KEY_PREFIX = 'user-shard:'
+SHARD_ID_BLOCK = 10 ** 8
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_shard = contextvars.ContextVar('user_shard', default=None)
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def sharded_models():
+    """The models of SHARDED_MODELS, the referenced ones first
+    """
+    return [Tag, Ingredient, Recipe, Recipe.tags.through,
+            Recipe.ingredients.through, ImageUpload, RecipeSummary,
+            ChangeEvent]
+
+
+def owned_rows(model, user, alias):
+    """The rows of the user in a sharded table
+    """
+    names = {field.name for field in model._meta.fields}
+    lookup = 'user' if 'user' in names else 'recipe__user'
+    return model._base_manager.using(alias).filter(**{lookup: user})
+
+
+def reserve_id_block(alias):
+    """Move the id sequences of the sharded tables of a shard to its block
+    """
+    start = settings.DATABASE_SHARDS.index(alias) * SHARD_ID_BLOCK + 1
+    if start == 1:
+        return
+    connection = connections[alias]
+    tables = [model._meta.db_table for model in sharded_models()
+              if isinstance(model._meta.pk, models.AutoField)]
+    with connection.cursor() as cursor:
+        for table in tables:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST("
+                    "%s, nextval(pg_get_serial_sequence(%s, 'id'))), false)",
+                    [table, start, table])
+            elif connection.vendor == 'mysql':
+                # lower than the current value is ignored
+                cursor.execute(
+                    f'ALTER TABLE {connection.ops.quote_name(table)} '
+                    f'AUTO_INCREMENT = {start}')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence '
+                               'WHERE name = %s', [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) '
+                                   'VALUES (%s, %s)', [table, start - 1])
+                elif row[0] < start - 1:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s '
+                                   'WHERE name = %s', [start - 1, table])
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class ShardMap:
+    """Consistent hash ring of the shards
+
+    Every shard owns `vnodes` points of the ring, a user goes to the
+    owner of the first point after the hash of their id. Adding a shard
+    only takes users away from the others in proportion.
+    """
+
+    def __init__(self, shards, vnodes):
+        self.shards = tuple(shards)
+        ring = sorted((_hash(f'{shard}#{i}'), shard)
+                      for shard in self.shards for i in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [shard for _, shard in ring]
+
+    def shard_for(self, user_id):
+        if len(self.shards) == 1:
+            return self.shards[0]
+        index = bisect.bisect(self._points, _hash(str(user_id)))
+        return self._owners[index % len(self._owners)]
+
+
+_shard_maps = {}
+_shard_maps_lock = threading.Lock()
+
+
+def get_shard_map():
+    """The ring of the current settings, shared by the whole process
+    """
+    key = (tuple(settings.DATABASE_SHARDS), settings.SHARD_VNODES)
+    with _shard_maps_lock:
+        shard_map = _shard_maps.get(key)
+        if shard_map is None:
+            shard_map = _shard_maps[key] = ShardMap(*key)
+    return shard_map
+
+
+def user_shard(user_id):
+    """The (shard, locked) of a user, locked while move_user finishes
+    copying their data
+    """
+    shards = settings.DATABASE_SHARDS
+    if len(shards) == 1:
+        return shards[0], False
+    cache = caches[settings.SHARD_MAP_CACHE]
+    key = f'{SHARD_KEY_PREFIX}{user_id}'
+    found = cache.get(key)
+    if found is None:
+        # never from a lagging replica, the user may have just moved
+        found = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id).values_list('shard', 'locked').first()
+        found = found or (get_shard_map().shard_for(user_id), False)
+        cache.set(key, found, settings.SHARD_MAP_CACHE_TTL)
+    return tuple(found)
+
+
+def forget_user_shard(user_id):
+    caches[settings.SHARD_MAP_CACHE].delete(f'{SHARD_KEY_PREFIX}{user_id}')
+
+
+def current_shard():
+    return _shard.get()
+
+
+@contextlib.contextmanager
+def pinned_shard(alias):
+    """Send the queries on sharded models to alias within the block
+    """
+    token = _shard.set(alias)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+def shard_aliases():
+    """Every shard, the pinned one first
+    """
+    shards = list(settings.DATABASE_SHARDS)
+    pinned = _shard.get()
+    if pinned in shards:
+        shards.remove(pinned)
+        shards.insert(0, pinned)
+    return shards
+
+
+def on_each_shard(queryset):
+    """The queryset on every shard, for the lookups across users
+    """
+    return (queryset.using(alias) for alias in shard_aliases())
+
+
+def first_on_shards(queryset):
+    """The first row of the queryset found on a shard, or None
+    """
+    for sharded in on_each_shard(queryset):
+        row = sharded.first()
+        if row is not None:
+            return row
+    return None
+
+
+class ShardRouter:
+    """Send the sharded models to the shard of the instance they come
+    from, or else to the pinned shard
+
+    The other models follow an instance of a shard too, as migrate does
+    with the content types and permissions it makes on each of them.
+    """
+
+    def _shard_for(self, model, hints):
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) == \
+                is_sharded(model) and \
+                instance._state.db in settings.DATABASE_SHARDS:
+            shard = instance._state.db
+        elif is_sharded(model):
+            shard = _shard.get()
+        else:
+            return None
+        # the default shard is left to the replica router
+        return None if shard == DEFAULT_DB_ALIAS else shard
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded1, sharded2 = is_sharded(type(obj1)), is_sharded(type(obj2))
+        if sharded1 and sharded2:
+            return obj1._state.db == obj2._state.db
+        if sharded1 or sharded2:
+            return True  # to a user, kept on the default database
+        return None
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Your data is being moved, try again in a moment.'
+    default_code = 'shard_moving'
+    wait = 5
+
+
+class UserShardMixin:
+    """Pin the queries of an API view to the shard of the user
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with pinned_shard(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            shard, locked = user_shard(request.user.pk)
+            if locked and request.method not in SAFE_METHODS:
+                raise ShardMoving()
+            _shard.set(shard)
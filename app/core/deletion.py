@@ -0,0 +1,157 @@
+"""Deletion of the users in the background, a batch of rows at a time
+
+Deleting a user with the ORM loads the whole cascade in memory and deletes
+it in one transaction, holding the locks as long as that takes. Instead
+start_deletion deactivates the user right away and queues a job where
+purge_user deletes their rows, shard by shard and table by table, with raw
+deletes of USER_DELETION_BATCH_SIZE rows in a transaction each. The user
+goes last, once its cascade is down to a few rows, and the progress is
+kept on an AccountDeletion. A purge failing raises for the job to be
+tried again, it carries on from where it was.
+
+The raw deletes send no signals: the images of the recipes are released
+and the change events recorded here, the summaries go with their own
+table. The change events of the user are left to the pruning, for the
+handlers not done with them. The cached data of the user is left to
+expire, nobody reads it once the user is inactive.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from images.storage import release_image
+from images.uploads import remove_part
+
+from .db.shards import forget_user_shard, owned_rows, sharded_models
+from .jobs import enqueue
+from .models import (AccountDeletion, ChangeEvent, ImageUpload, Ingredient,
+                     Recipe, Tag)
+from .outbox import record_changes, record_recipe_updates
+from .summaries import refresh_summaries
+
+
+def start_deletion(user):
+    """Deactivate the user and queue the purge of their data, return the
+    AccountDeletion
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        deletion, _ = AccountDeletion.objects.using(DEFAULT_DB_ALIAS) \
+            .get_or_create(user_id=user.pk)
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        enqueue(purge_user, str(deletion.pk))
+    return deletion
+
+
+def claimable():
+    """The deletions no worker is purging, pending, failed or stalled
+    """
+    stalled = timezone.now() - datetime.timedelta(
+        seconds=settings.USER_DELETION_STALLED_AFTER)
+    return AccountDeletion.objects.using(DEFAULT_DB_ALIAS).filter(
+        Q(status__in=[AccountDeletion.PENDING, AccountDeletion.FAILED]) |
+        Q(status=AccountDeletion.RUNNING, updated__lt=stalled))
+
+
+def purge_user(deletion_id, batch_size=None):
+    """Delete the data of the user of the deletion and the user, return
+    the deletion, or None when another worker has it
+
+    Raises what made the purge fail, once recorded on the deletion.
+    """
+    # the conditional update lets a single worker through
+    if not claimable().filter(pk=deletion_id).update(
+            status=AccountDeletion.RUNNING, updated=timezone.now()):
+        return None
+    deletion = AccountDeletion.objects.using(DEFAULT_DB_ALIAS).get(
+        pk=deletion_id)
+    batch_size = batch_size or settings.USER_DELETION_BATCH_SIZE
+    try:
+        for alias in settings.DATABASE_SHARDS:
+            # the referencing rows first
+            for model in reversed(sharded_models()):
+                if model is not ChangeEvent:
+                    _purge_table(deletion, model, alias, batch_size)
+        _progress(deletion, 'user')
+        user = get_user_model()._base_manager.using(DEFAULT_DB_ALIAS) \
+            .filter(pk=deletion.user_id).first()
+        if user is not None:
+            user.delete()
+        forget_user_shard(deletion.user_id)
+    except Exception as error:
+        deletion.status = AccountDeletion.FAILED
+        deletion.error = str(error)
+        deletion.save(update_fields=['status', 'error', 'updated'])
+        raise
+    deletion.status = AccountDeletion.DONE
+    deletion.step = ''
+    deletion.error = ''
+    deletion.finished = timezone.now()
+    deletion.save(update_fields=['status', 'step', 'error', 'finished',
+                                 'updated'])
+    return deletion
+
+
+def _batches(rows, batch_size):
+    """The rows, batch_size at a time, for deleting each batch before the
+    next one is read
+    """
+    manager = rows.model._base_manager.using(rows.db)
+    while True:
+        pks = list(rows.order_by('pk').values_list('pk', flat=True)
+                   [:batch_size])
+        if not pks:
+            return
+        yield manager.filter(pk__in=pks)
+
+
+def _purge_table(deletion, model, alias, batch_size):
+    _progress(deletion, f'{model._meta.db_table} on {alias}')
+    for batch in _batches(owned_rows(model, deletion.user_id, alias),
+                          batch_size):
+        images = []
+        if model is ImageUpload:
+            for upload in batch:
+                remove_part(upload)
+        elif model is Recipe:
+            images = [name for name in batch.values_list('image', flat=True)
+                      if name]
+        with transaction.atomic(using=alias):
+            if model in (Recipe, Tag, Ingredient):
+                record_changes(model, batch.values_list('pk', 'user_id'),
+                               ChangeEvent.DELETED, alias)
+            deleted = batch._raw_delete(alias)
+        # once the recipes are gone, the files may be unreferenced
+        for name in images:
+            release_image(name, alias)
+        _progress(deletion, deletion.step, deleted, len(images))
+    if model._meta.auto_created:
+        _unlink_other_recipes(deletion, model, alias, batch_size)
+
+
+def _unlink_other_recipes(deletion, through, alias, batch_size):
+    """Delete the links of the recipes of other users to the tags or
+    ingredients of the user
+    """
+    related = next(field.name for field in through._meta.fields
+                   if field.is_relation and field.related_model is not Recipe)
+    rows = through._base_manager.using(alias).filter(
+        **{f'{related}__user': deletion.user_id})
+    for batch in _batches(rows, batch_size):
+        recipe_ids = set(batch.values_list('recipe_id', flat=True))
+        with transaction.atomic(using=alias):
+            deleted = batch._raw_delete(alias)
+            record_recipe_updates(recipe_ids, alias)
+        refresh_summaries(recipe_ids, alias)
+        _progress(deletion, deletion.step, deleted)
+
+
+def _progress(deletion, step, rows=0, images=0):
+    deletion.step = step
+    deletion.rows_deleted += rows
+    deletion.images_released += images
+    deletion.save(update_fields=['step', 'rows_deleted', 'images_released',
+                                 'updated'])
@@ -0,0 +1,250 @@
+"""Functions called in the background, queued in the database
+
+enqueue adds a Job calling a module level function with JSON arguments,
+in the transaction of the caller so it only exists once that commits. The
+threads of the run_workers command claim the due jobs, the highest
+priority and then the oldest first, with SELECT ... FOR UPDATE SKIP
+LOCKED, a worker never waits on the rows another one is claiming. The
+databases without SKIP LOCKED, like SQLite, claim with the conditional
+update alone.
+
+A job raising is tried again after JOB_RETRY_DELAY seconds, doubled at
+every attempt up to JOB_RETRY_MAX_DELAY, until max_attempts, then it is
+left failed for someone to look at. The jobs done are deleted. A job
+still running after JOB_LEASE seconds is taken as lost with its worker
+and queued again, a function may then run twice and has to cope with it.
+"""
+import datetime
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .async_api import call_in_worker
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _jobs():
+    return Job.objects.using(DEFAULT_DB_ALIAS)
+
+
+def task_name(task):
+    """The dotted path of a function, the workers import it from there
+    """
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def enqueue(task, *args, priority=0, delay=0, max_attempts=None,
+            using=DEFAULT_DB_ALIAS):
+    """Queue a call of task(*args) for when the transaction open on using
+    commits
+
+    The job is written in that transaction on the default database,
+    after its commit on the other ones, either way a rollback drops it.
+    Returns the job, None until the commit on the other databases.
+    """
+    def create():
+        return _jobs().create(
+            task=task_name(task),
+            args=list(args),
+            priority=priority,
+            run_at=timezone.now() + datetime.timedelta(seconds=delay),
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        )
+
+    if using == DEFAULT_DB_ALIAS:
+        return create()
+    transaction.on_commit(create, using=using)
+    return None
+
+
+def claim(worker):
+    """The next due job, marked running for the worker, or None
+    """
+    while True:
+        now = timezone.now()
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            job = _jobs().select_for_update(skip_locked=True).filter(
+                status=Job.QUEUED, run_at__lte=now) \
+                .order_by('-priority', 'run_at', 'id').first()
+            if job is None:
+                return None
+            token = f'{worker} {uuid.uuid4().hex}'
+            claimed = _jobs().filter(pk=job.pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, claimed_by=token, claimed_at=now,
+                attempts=F('attempts') + 1)
+        if claimed:
+            job.status = Job.RUNNING
+            job.claimed_by = token
+            job.claimed_at = now
+            job.attempts += 1
+            return job
+        # taken by a worker without SKIP LOCKED, try the next one
+
+
+def retry_delay(attempts):
+    """Seconds before another attempt, spread out so the jobs failing
+    together are not tried again together
+    """
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job):
+    """Call the function of a claimed job and record how it went, return
+    'done', 'retried' or 'failed'
+    """
+    try:
+        import_string(job.task)(*job.args)
+    except Exception:
+        logger.exception('Job %s (%s) failed, attempt %s of %s', job.pk,
+                         job.task, job.attempts, job.max_attempts)
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            _finish(job, status=Job.QUEUED, last_error=error,
+                    run_at=now + datetime.timedelta(
+                        seconds=retry_delay(job.attempts)))
+            return 'retried'
+        _finish(job, status=Job.FAILED, last_error=error, finished=now)
+        return 'failed'
+    # unless the lease ran out and the job is another worker's now
+    _jobs().filter(pk=job.pk, claimed_by=job.claimed_by).delete()
+    return 'done'
+
+
+def _finish(job, **fields):
+    _jobs().filter(pk=job.pk, claimed_by=job.claimed_by).update(**fields)
+
+
+def requeue_lost():
+    """Queue again the jobs running for longer than JOB_LEASE, or fail
+    the ones out of attempts, return how many
+    """
+    now = timezone.now()
+    lost = _jobs().filter(
+        status=Job.RUNNING,
+        claimed_at__lt=now - datetime.timedelta(seconds=settings.JOB_LEASE))
+    failed = lost.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error='Lease expired', finished=now)
+    queued = lost.update(status=Job.QUEUED, claimed_by='', run_at=now)
+    return failed + queued
+
+
+def queue_stats():
+    """The jobs per status and the seconds the oldest due one has waited
+    """
+    counts = dict(_jobs().order_by().values_list('status')
+                  .annotate(Count('id')))
+    oldest = _jobs().filter(status=Job.QUEUED,
+                            run_at__lte=timezone.now()) \
+        .aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        'queued': counts.get(Job.QUEUED, 0),
+        'running': counts.get(Job.RUNNING, 0),
+        'failed': counts.get(Job.FAILED, 0),
+        'lag': (timezone.now() - oldest).total_seconds() if oldest else 0,
+    }
+
+
+class WorkerStats:
+    """Throughput of the threads of a worker since it started
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._outcomes = Counter()
+        self._busy = 0.0
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            self._outcomes[outcome] += 1
+            self._busy += seconds
+
+    def snapshot(self):
+        with self._lock:
+            jobs = sum(self._outcomes.values())
+            elapsed = time.monotonic() - self._started
+            return {
+                'done': self._outcomes['done'],
+                'retried': self._outcomes['retried'],
+                'failed': self._outcomes['failed'],
+                'per_second': jobs / elapsed if elapsed else 0.0,
+                'average_seconds': self._busy / jobs if jobs else 0.0,
+            }
+
+
+class Worker:
+    """Threads claiming and running jobs until stopped
+
+    With burst the threads stop once no job is due, instead of polling
+    every JOB_POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, threads=1, burst=False):
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.threads = threads
+        self.burst = burst
+        self.stats = WorkerStats()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, report=None, report_interval=60):
+        """Run the threads until stopped, calling report with the stats
+        every report_interval seconds
+        """
+        threads = [threading.Thread(target=self._work,
+                                    name=f'worker-{i}', daemon=True)
+                   for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        next_requeue = time.monotonic()
+        next_report = next_requeue + report_interval
+        # once stopping, until the jobs being run are over
+        while any(thread.is_alive() for thread in threads):
+            now = time.monotonic()
+            if now >= next_requeue and not self._stopping.is_set():
+                call_in_worker(requeue_lost)
+                next_requeue = now + settings.JOB_LEASE / 10
+            if report is not None and now >= next_report:
+                report(self.stats.snapshot())
+                next_report = now + report_interval
+            for thread in threads:
+                thread.join(settings.JOB_POLL_INTERVAL / len(threads))
+        connections.close_all()
+        if report is not None:
+            report(self.stats.snapshot())
+
+    def _work(self):
+        try:
+            while not self._stopping.is_set():
+                job = call_in_worker(claim, self.name)
+                if job is None:
+                    if self.burst:
+                        return
+                    self._stopping.wait(settings.JOB_POLL_INTERVAL)
+                    continue
+                started = time.monotonic()
+                outcome = call_in_worker(run_job, job)
+                self.stats.record(outcome, time.monotonic() - started)
+        finally:
+            connections.close_all()
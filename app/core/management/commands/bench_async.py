@@ -0,0 +1,117 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.models import Ingredient, Recipe, Tag
+from core.throttling import BucketThrottle
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    """Django command to compare the recipe list served by WSGI threads
+    and by the async view under ASGI
+
+    Every query is delayed by --latency milliseconds to stand in for a
+    remote database, the WSGI side runs --threads requests at a time and
+    the ASGI side --concurrency. Writes a throwaway user to the database.
+    """
+    help = 'Compare sync and async recipe list throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--latency', type=float, default=5.0)
+        parser.add_argument('--recipes', type=int, default=20)
+
+    def handle(self, *args, **options):
+        user = self._sample_data(options['recipes'])
+        authorization = f'Token {Token.objects.create(user=user).key}'
+        latency = options['latency'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(connection, **kwargs):
+            # connections are reopened, only delay once
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        rates = BucketThrottle.THROTTLE_RATES
+        BucketThrottle.THROTTLE_RATES = {**rates, 'user': None}
+        connection_created.connect(add_delay)
+        connection.execute_wrappers.append(delay)
+        try:
+            hosts = ['testserver', '127.0.0.1']  # sync and async clients
+            with override_settings(ALLOWED_HOSTS=hosts):
+                wsgi = self._wsgi(options, authorization)
+                asgi = asyncio.run(self._asgi(options, authorization))
+        finally:
+            connection.execute_wrappers.remove(delay)
+            connection_created.disconnect(add_delay)
+            BucketThrottle.THROTTLE_RATES = rates
+            user.delete()
+
+        self.stdout.write(f'WSGI {wsgi:.1f} requests/s '
+                          f'({options["threads"]} threads)')
+        self.stdout.write(f'ASGI {asgi:.1f} requests/s '
+                          f'({options["concurrency"]} concurrent)')
+        self.stdout.write(self.style.SUCCESS(f'SPEEDUP {asgi / wsgi:.2f}x'))
+
+    def _sample_data(self, recipes):
+        user = get_user_model().objects.create_user(
+            f'bench-{time.time()}@bench.local', None)
+        tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        for i in range(recipes):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=10, price=5)
+            recipe.tags.add(*tags)
+            recipe.ingredients.add(ingredient)
+        return user
+
+    def _wsgi(self, options, authorization):
+        url = reverse('exercise:recipe-list')
+
+        def request(_):
+            response = Client().get(url, HTTP_AUTHORIZATION=authorization)
+            return response.status_code
+
+        with ThreadPoolExecutor(options['threads']) as pool:
+            start = time.perf_counter()
+            statuses = list(pool.map(request, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+        self._check(statuses)
+        return options['requests'] / elapsed
+
+    async def _asgi(self, options, authorization):
+        url = reverse('exercise:async-recipe-list')
+        client = AsyncClient()
+        # the test client of this Django takes the raw ASGI headers
+        headers = [(b'authorization', authorization.encode())]
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def request():
+            async with slots:
+                response = await client.get(url, headers=headers)
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(
+            *(request() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        self._check(statuses)
+        return options['requests'] / elapsed
+
+    def _check(self, statuses):
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            self.stderr.write(f'{len(failed)} requests failed: {failed[0]}')
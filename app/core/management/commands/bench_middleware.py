@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import path
+
+# the middleware before the API routes skipped the browser ones
+STOCK_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+
+def empty_view(request, path):
+    return HttpResponse()
+
+
+# requests are routed here, the view costs nothing next to the middleware
+urlpatterns = [
+    path('<path:path>', empty_view),
+]
+
+
+class Command(BaseCommand):
+    """Django command to time the middleware of a request, stock and as
+    configured
+    """
+    help = 'Compare the per request middleware overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/exercise/recipes/')
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        stock = self._time(STOCK_MIDDLEWARE, options)
+        current = self._time(settings.MIDDLEWARE, options)
+        self.stdout.write(f'PATH {options["path"]}')
+        self.stdout.write(f'STOCK {stock:.1f} us/request')
+        self.stdout.write(f'CURRENT {current:.1f} us/request')
+        self.stdout.write(self.style.SUCCESS(
+            f'SAVED {stock - current:.1f} us/request'))
+
+    def _time(self, middleware, options):
+        factory = RequestFactory()
+        with override_settings(MIDDLEWARE=middleware,
+                               ALLOWED_HOSTS=['testserver']):
+            handler = BaseHandler()
+            handler.load_middleware()
+            for _ in range(100):  # warm up
+                self._request(handler, factory, options['path'])
+            start = time.perf_counter()
+            for _ in range(options['requests']):
+                self._request(handler, factory, options['path'])
+            elapsed = time.perf_counter() - start
+        return elapsed / options['requests'] * 1e6
+
+    def _request(self, handler, factory, path):
+        request = factory.get(path)
+        request.urlconf = __name__
+        return handler.get_response(request)
@@ -0,0 +1,35 @@
+import signal
+
+from core.outbox import Dispatcher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to hand the change events to CHANGE_HANDLERS
+
+    Runs until SIGTERM or SIGINT, or until every handler is caught up
+    with --burst. One process at a time, the handlers keep one cursor
+    each.
+    """
+    help = 'Dispatch the recipe, tag and ingredient changes to the handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds between rounds once caught up')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the handlers are caught up')
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher(batch_size=options['batch_size'])
+        if options['burst']:
+            while dispatcher.dispatch():
+                pass
+        else:
+            signal.signal(signal.SIGTERM, lambda *args: dispatcher.stop())
+            signal.signal(signal.SIGINT, lambda *args: dispatcher.stop())
+            dispatcher.run(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(dispatcher.handlers)} HANDLERS, '
+            f'{dispatcher.handed} EVENTS HANDED'))
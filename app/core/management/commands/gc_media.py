@@ -0,0 +1,133 @@
+import datetime
+import os
+import time
+
+from core.db.shards import on_each_shard
+from core.models import RECIPE_IMAGE_DIR, ImageBlob, ImageUpload, Recipe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from images.storage import delete_if_unreferenced
+from images.uploads import remove_part
+
+
+def walk_files(root):
+    """Yield (path, stat) for every file under root without listing a
+    whole tree in memory, only the pending directories are kept
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    """Django command to delete the recipe images nothing points at
+
+    The media tree is streamed with os.scandir and checked batch by batch
+    against the indexed Recipe.image column, memory stays bounded by the
+    batch size whatever the number of files.
+    """
+    help = 'Delete orphaned recipe image files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Skip files modified in the last seconds')
+        parser.add_argument('--upload-expiry', type=int, default=86400,
+                            help='Drop resumable uploads older than seconds')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.seen = self.orphans = self.freed = 0
+        cutoff = time.time() - options['min_age']
+        root = os.path.join(settings.MEDIA_ROOT, RECIPE_IMAGE_DIR)
+
+        batch = {}
+        for path, stat in walk_files(root):
+            self.seen += 1
+            # uploads in flight and the files shard_recipe_images just
+            # linked, which it touches, are left alone
+            if stat.st_mtime > cutoff:
+                continue
+            name = os.path.relpath(path, settings.MEDIA_ROOT)
+            batch[name] = stat.st_size
+            if len(batch) >= options['batch_size']:
+                self._collect(batch)
+                batch = {}
+        if batch:
+            self._collect(batch)
+        self._collect_blobs(options['batch_size'])
+        self._collect_uploads(options['upload_expiry'])
+
+        action = 'WOULD DELETE' if self.dry_run else 'DELETED'
+        self.stdout.write(self.style.SUCCESS(
+            f'SCANNED {self.seen} FILES, {action} {self.orphans} '
+            f'({self.freed} BYTES)'))
+
+    def _collect(self, batch):
+        """Delete the files of the batch no recipe or blob references
+        """
+        names = list(batch)
+        referenced = set(ImageBlob.objects.filter(
+            name__in=names, ref_count__gt=0).values_list('name', flat=True))
+        referenced.update(self._used(names))
+        for name in names:
+            if name in referenced:
+                continue
+            if self.dry_run:
+                self.stdout.write(f'ORPHAN {name}')
+            # checked again under the lock of the blob row, an upload of
+            # the same bytes committing meanwhile keeps the file
+            elif not delete_if_unreferenced(name):
+                continue
+            self.orphans += 1
+            self.freed += batch[name]
+
+    def _used(self, names):
+        """The names of the batch a recipe of any shard points at
+        """
+        used = set()
+        for recipes in on_each_shard(Recipe.objects.filter(image__in=names)):
+            used.update(recipes.values_list('image', flat=True))
+        return used
+
+    def _collect_blobs(self, batch_size):
+        """Delete the blobs left without references or file
+        """
+        last_pk = 0
+        while True:
+            blobs = list(ImageBlob.objects.filter(
+                pk__gt=last_pk, ref_count=0).order_by('pk')
+                .values_list('pk', 'name')[:batch_size])
+            if not blobs:
+                return
+            last_pk = blobs[-1][0]
+            names = [name for _, name in blobs]
+            used = self._used(names)
+            unused = [pk for pk, name in blobs if name not in used]
+            if unused and not self.dry_run:
+                with transaction.atomic():
+                    ImageBlob.objects.filter(pk__in=unused,
+                                             ref_count=0).delete()
+
+    def _collect_uploads(self, expiry):
+        """Delete the resumable uploads abandoned before finishing
+        """
+        created = timezone.now() - datetime.timedelta(seconds=expiry)
+        for expired in on_each_shard(
+                ImageUpload.objects.filter(created__lt=created)):
+            for upload in expired.iterator():
+                self.stdout.write(f'EXPIRED UPLOAD {upload.pk}')
+                if not self.dry_run:
+                    remove_part(upload)
+                    upload.delete()
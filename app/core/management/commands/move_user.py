@@ -0,0 +1,169 @@
+import time
+
+from core.db.shards import (forget_user_shard, get_shard_map, owned_rows,
+                            sharded_models)
+from core.models import UserShard
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class Command(BaseCommand):
+    """Django command to move the recipe data of a user to another shard
+
+    The move is online: the rows are copied while the user keeps working
+    on the source shard, then their writes are refused for a moment while
+    the rows changed meanwhile are copied again, then the user switches to
+    the target and the copies left on the other shards are deleted. Every
+    step compares both sides, running the command again with the same
+    arguments finishes an interrupted move.
+    """
+    help = 'Move the recipes, tags and ingredients of a user to a shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Id or email of the user')
+        parser.add_argument('shard')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--settle', type=float, default=settings.SHARD_MAP_CACHE_TTL,
+            help='Seconds for every process to see the new shard map')
+
+    def handle(self, *args, **options):
+        user = self._user(options['user'])
+        target = options['shard']
+        if target not in settings.DATABASE_SHARDS:
+            raise CommandError(f'Unknown shard {target}')
+        self.batch_size = options['batch_size']
+
+        record = UserShard.objects.filter(user=user).first()
+        source = record.shard if record else \
+            get_shard_map().shard_for(user.pk)
+        if source != target:
+            record, _ = UserShard.objects.update_or_create(
+                user=user, defaults={'shard': source, 'moving_to': target})
+            self._sync(user, source, target)
+            self.stdout.write(f'COPIED TO {target}, LOCKING WRITES')
+
+            record.locked = True
+            record.save(update_fields=['locked'])
+            self._publish(user, options['settle'])
+            self._sync(user, source, target)
+            self._switch(user, record, target)
+            # requests still reading the source finish before the cleanup
+            self._publish(user, options['settle'])
+        elif record is not None and (record.moving_to or record.locked):
+            # a move to another shard is called off
+            self._switch(user, record, target)
+            forget_user_shard(user.pk)
+        deleted = self._cleanup(user, target)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'USER {user.pk} ON {target}, {deleted} ROWS LEFT BEHIND DELETED'))
+
+    def _user(self, user):
+        users = get_user_model().objects
+        found = users.filter(pk=user).first() if user.isdigit() else \
+            users.filter(email=user).first()
+        if found is None:
+            raise CommandError(f'Unknown user {user}')
+        return found
+
+    def _publish(self, user, settle):
+        forget_user_shard(user.pk)
+        time.sleep(settle)
+
+    def _sync(self, user, source, target):
+        """Make the rows of the user on target the same as on source
+        """
+        gone = {}
+        for model in sharded_models():
+            gone[model] = self._copy(model, user, source, target)
+        # the referencing rows first
+        for model in reversed(sharded_models()):
+            if gone[model]:
+                owned_rows(model, user, target).filter(
+                    pk__in=gone[model])._raw_delete(target)
+
+    def _copy(self, model, user, source, target):
+        """Create and update the rows of a table, return the pks only on
+        target
+
+        Both sides are read in pk order a page at a time and compared like
+        a merge join, neither is held in memory whole. The rows written
+        come before the page of target being read.
+        """
+        fields = [field.attname for field in model._meta.concrete_fields
+                  if not field.primary_key]
+        copied = self._rows(model, user, target, fields)
+        previous = next(copied, None)
+        created = updated = 0
+        new, changed, gone = [], [], []
+        for row in self._rows(model, user, source, fields):
+            while previous is not None and previous[0] < row[0]:
+                gone.append(previous[0])
+                previous = next(copied, None)
+            if previous is not None and previous[0] == row[0]:
+                same = previous[1:] == row[1:]
+                previous = next(copied, None)
+                if same:
+                    continue
+                changed.append(model(pk=row[0], **dict(zip(fields, row[1:]))))
+                updated += 1
+            else:
+                new.append(model(pk=row[0], **dict(zip(fields, row[1:]))))
+                created += 1
+            if len(new) + len(changed) >= self.batch_size:
+                self._write(model, target, fields, new, changed)
+                new, changed = [], []
+        self._write(model, target, fields, new, changed)
+        while previous is not None:
+            gone.append(previous[0])
+            previous = next(copied, None)
+        self.stdout.write(f'{model._meta.label}: {created} CREATED, '
+                          f'{updated} UPDATED, {len(gone)} GONE')
+        return gone
+
+    def _rows(self, model, user, alias, fields):
+        """The (pk, *fields) of the rows of the user on alias in pk order,
+        batch_size at a time
+        """
+        rows = owned_rows(model, user, alias).order_by('pk') \
+            .values_list('pk', *fields)
+        last_pk = None
+        while True:
+            page = list((rows if last_pk is None else
+                         rows.filter(pk__gt=last_pk))[:self.batch_size])
+            yield from page
+            if len(page) < self.batch_size:
+                return
+            last_pk = page[-1][0]
+
+    def _write(self, model, target, fields, new, changed):
+        manager = model._base_manager.using(target)
+        if new:
+            manager.bulk_create(new)
+        if changed:
+            manager.bulk_update(changed, fields)
+
+    def _switch(self, user, record, target):
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            if get_shard_map().shard_for(user.pk) == target:
+                record.delete()
+            else:
+                record.shard = target
+                record.moving_to = ''
+                record.locked = False
+                record.save()
+
+    def _cleanup(self, user, target):
+        """Delete the rows of the user on the other shards, without the
+        signals of a regular delete, the images are still in use
+        """
+        deleted = 0
+        for alias in settings.DATABASE_SHARDS:
+            if alias == target:
+                continue
+            for model in reversed(sharded_models()):
+                deleted += owned_rows(model, user, alias)._raw_delete(alias)
+        return deleted
@@ -0,0 +1,39 @@
+import datetime
+
+from core.db.shards import on_each_shard
+from core.models import ChangeEvent
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """Django command to delete the old change events of every shard
+
+    A batch at a time, the feed and the dispatcher keep reading while it
+    runs. The readers further behind than the retention miss events.
+    """
+    help = 'Delete the change events older than the retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--retention', type=int,
+                            default=settings.CHANGE_EVENT_RETENTION,
+                            help='Keep the events of the last seconds')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=options['retention'])
+        deleted = 0
+        for events in on_each_shard(ChangeEvent.objects.filter(
+                created__lt=cutoff)):
+            while True:
+                batch = list(events.order_by('created', 'id')
+                             .values_list('pk', flat=True)
+                             [:options['batch_size']])
+                if not batch:
+                    break
+                deleted += events.filter(pk__in=batch)._raw_delete(
+                    events.db)
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} EVENTS DELETED'))
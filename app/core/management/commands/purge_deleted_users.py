@@ -0,0 +1,24 @@
+from core.deletion import claimable, purge_user
+from core.jobs import enqueue
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to queue again the purges of the deleted users
+
+    For the purges whose job ran out of attempts or was deleted, and the
+    ones stalled. A purge queued twice runs once, the other job finds it
+    taken.
+    """
+    help = 'Queue the purges of the deleted users left behind'
+
+    def handle(self, *args, **options):
+        queued = 0
+        for deletion in claimable().order_by('created'):
+            enqueue(purge_user, str(deletion.pk))
+            self.stdout.write(
+                f'USER {deletion.user_id}: {deletion.status.upper()}, '
+                f'{deletion.rows_deleted} ROWS DELETED')
+            queued += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{queued} PURGES QUEUED'))
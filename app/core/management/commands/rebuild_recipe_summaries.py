@@ -0,0 +1,28 @@
+from core.summaries import rebuild_summaries
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Django command to make the recipe summaries again from the recipes
+
+    Needed after writes that skip the signals like bulk updates or raw
+    SQL, the migration creating the table summarizes the recipes already
+    there. Every shard is rebuilt a transaction per batch.
+    """
+    help = 'Rebuild the recipe summaries the recipe lists read'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--database', action='append',
+                            help='Only this shard, can be repeated')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or settings.DATABASE_SHARDS
+        for alias in aliases:
+            if alias not in settings.DATABASE_SHARDS:
+                raise CommandError(f'Unknown shard {alias}')
+            count = rebuild_summaries(alias, options['batch_size'])
+            self.stdout.write(f'{alias}: {count} SUMMARIES')
+
+        self.stdout.write(self.style.SUCCESS('SUMMARIES REBUILT'))
@@ -0,0 +1,81 @@
+import multiprocessing
+import signal
+
+from core.jobs import Worker
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_process(threads, burst, report_interval):
+    """Run a worker in a forked process until it is sent SIGTERM
+    """
+    worker = Worker(threads, burst)
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    signal.signal(signal.SIGINT, lambda *args: worker.stop())
+    worker.run(report=lambda stats: print(
+        f'{worker.name}: {format_stats(stats)}', flush=True),
+        report_interval=report_interval)
+
+
+def format_stats(stats):
+    return (f'{stats["done"]} DONE, {stats["retried"]} RETRIED, '
+            f'{stats["failed"]} FAILED, {stats["per_second"]:.2f} JOBS/S, '
+            f'{stats["average_seconds"]:.3f} S/JOB')
+
+
+class Command(BaseCommand):
+    """Django command to run the background jobs of core.jobs
+
+    Every process runs --threads threads claiming jobs from the database,
+    the threads suit the jobs waiting on the database or the disk, the
+    processes the ones using the CPU. SIGTERM or SIGINT let the jobs being
+    run finish before exiting.
+    """
+    help = 'Run the workers of the background job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due')
+        parser.add_argument('--stats-interval', type=int, default=60,
+                            help='Seconds between the throughput reports')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        burst = options['burst']
+        interval = options['stats_interval']
+        if options['processes'] <= 1:
+            worker = Worker(threads, burst)
+            previous = {signum: signal.signal(signum, lambda *args:
+                                              worker.stop())
+                        for signum in (signal.SIGTERM, signal.SIGINT)}
+            try:
+                worker.run(report=lambda stats: self.stdout.write(
+                    f'{worker.name}: {format_stats(stats)}'),
+                    report_interval=interval)
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+            self.stdout.write(self.style.SUCCESS('WORKER STOPPED'))
+            return
+
+        # the children would share the sockets of the parent
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_process,
+                                    args=(threads, burst, interval))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('WORKERS STOPPED'))
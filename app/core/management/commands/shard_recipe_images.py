@@ -0,0 +1,99 @@
+import os
+import shutil
+
+from core.models import RECIPE_IMAGE_DIR, ChangeEvent, Recipe, sharded_path
+from core.outbox import record_changes
+from core.summaries import refresh_summaries
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    """Django command to move the flat recipe uploads to the sharded layout
+
+    Runs shard by shard in batches ordered by primary key, so memory stays
+    bounded and an interrupted run picks up where it stopped: the recipes
+    already moved no longer match the flat layout. The new path is hard
+    linked before the database is updated and the old one is only removed
+    after the commit, so both names resolve while the command runs.
+    """
+    help = 'Move recipe images into the sharded directory layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--after', type=int, default=0,
+                            help='Only process recipes with a greater id')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Leave the old paths in place')
+
+    def handle(self, *args, **options):
+        self.moved = self.missing = 0
+        for alias in settings.DATABASE_SHARDS:
+            self._move_images(alias, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'DONE, {self.moved} MOVED AND {self.missing} MISSING'))
+
+    def _move_images(self, alias, options):
+        """Move the images of the recipes on the shard alias
+        """
+        last_pk = options['after']
+        flat = Recipe.objects.using(alias).filter(
+            image__regex=rf'^{RECIPE_IMAGE_DIR}[^/]+$')
+
+        while True:
+            batch = list(
+                flat.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'user_id', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            updated, old_paths = [], []
+            for recipe in batch:
+                old_name = recipe.image.name
+                new_name = sharded_path(RECIPE_IMAGE_DIR,
+                                        os.path.basename(old_name))
+                if not self._link(default_storage.path(old_name),
+                                  default_storage.path(new_name)):
+                    self.missing += 1
+                    self.stderr.write(f'MISSING FILE {old_name}')
+                    continue
+                recipe.image.name = new_name
+                updated.append(recipe)
+                old_paths.append(default_storage.path(old_name))
+
+            with transaction.atomic(using=alias):
+                Recipe.objects.using(alias).bulk_update(updated, ['image'])
+                # bulk_update sends no post_save
+                refresh_summaries([recipe.pk for recipe in updated], alias)
+                record_changes(Recipe, [(recipe.pk, recipe.user_id)
+                                        for recipe in updated],
+                               ChangeEvent.UPDATED, alias)
+            if not options['keep_old']:
+                for path in old_paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.moved += len(updated)
+            self.stdout.write(
+                f'MOVED {self.moved} UP TO RECIPE {last_pk} ON {alias}')
+
+    def _link(self, old_path, new_path):
+        """Make the file reachable from new_path, False if it is gone
+        """
+        # or linked by a previous run that did not commit
+        if not os.path.exists(new_path):
+            if not os.path.exists(old_path):
+                return False
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            try:
+                os.link(old_path, new_path)
+            except OSError:
+                # no hard links on this file system
+                shutil.copy2(old_path, new_path)
+        # the link and the copy keep the mtime of the old file, gc_media
+        # would take the new path for an old orphan until the commit
+        os.utime(new_path)
+        return True
@@ -0,0 +1,57 @@
+"""Browser middleware that steps aside on the token authenticated routes
+
+The API and media views authenticate with tokens on every request, the
+session, CSRF, auth and messages middleware only cost time there. The
+subclasses below run as usual for everything else, admin included.
+"""
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+
+
+def is_api_request(request):
+    return request.path_info.startswith(settings.API_PATH_PREFIXES)
+
+
+class APIExemptMixin:
+    """Pass API requests straight to the next middleware
+    """
+
+    def __call__(self, request):
+        if is_api_request(request):
+            self.process_api_request(request)
+            return self.get_response(request)
+        return super().__call__(request)
+
+    def process_api_request(self, request):
+        pass
+
+
+class SessionMiddleware(APIExemptMixin,
+                        sessions_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(APIExemptMixin, csrf.CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(APIExemptMixin,
+                               auth_middleware.AuthenticationMiddleware):
+
+    def process_api_request(self, request):
+        # the API views set the user from the token
+        request.user = AnonymousUser()
+
+
+class MessageMiddleware(APIExemptMixin,
+                        messages_middleware.MessageMiddleware):
+    pass
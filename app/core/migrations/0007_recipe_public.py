@@ -0,0 +1,18 @@
+# Generated by Django 3.1.1 on 2026-10-19 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_merge_20200925_0202'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='public',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.1 on 2026-10-19 18:07
+
+import core.db.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # the index is built concurrently on PostgreSQL, out of a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_imageblob'),
+    ]
+
+    operations = [
+        core.db.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='core_recipe_image_idx'),
+        ),
+    ]
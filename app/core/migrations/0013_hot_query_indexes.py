@@ -0,0 +1,64 @@
+# Generated by Django 3.1.1 on 2026-10-19 18:56
+
+import core.db.operations
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # the indexes are built concurrently on PostgreSQL, out of a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_user_shard'),
+    ]
+
+    operations = [
+        core.db.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_tag_user_name_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_ingr_user_name_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'public', 'time_minutes'], name='core_recipe_user_stats_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(public=True), fields=['id'], name='core_recipe_public_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='imageupload',
+            index=models.Index(fields=['created'], name='core_upload_created_idx'),
+        ),
+        core.db.operations.AddThroughIndexConcurrently(
+            model_name='recipe',
+            field_name='tags',
+            index=models.Index(fields=['tag', 'recipe'], name='core_recipe_tags_tag_idx'),
+        ),
+        core.db.operations.AddThroughIndexConcurrently(
+            model_name='recipe',
+            field_name='ingredients',
+            index=models.Index(fields=['ingredient', 'recipe'], name='core_recipe_ingr_ingr_idx'),
+        ),
+        # the user indexes of the keys are covered by the ones above
+        migrations.AlterField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 3.1.1 on 2026-10-19 19:00
+
+import core.db.fields
+import core.db.operations
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def _related_ids(through, field, recipe_ids, using):
+    related = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = through.objects.using(using).filter(recipe_id__in=recipe_ids) \
+        .order_by(field).values_list('recipe_id', field)
+    for recipe_id, related_id in rows:
+        related[recipe_id].append(related_id)
+    return related
+
+
+def backfill_summaries(apps, schema_editor):
+    """Summarize the recipes there already, a transaction per batch
+
+    The lists read only the summaries, they must not come up empty. Runs
+    on every database migrated, so on each shard, the summaries the signals
+    write meanwhile are kept.
+    """
+    using = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeSummary = apps.get_model('core', 'RecipeSummary')
+    recipes = Recipe._base_manager.using(using).order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(recipes.filter(pk__gt=last_pk).values(
+            'id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+            'public', 'image')[:BACKFILL_BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1]['id']
+        recipe_ids = [row['id'] for row in rows]
+        tags = _related_ids(Recipe.tags.through, 'tag_id', recipe_ids,
+                            using)
+        ingredients = _related_ids(Recipe.ingredients.through,
+                                   'ingredient_id', recipe_ids, using)
+        with transaction.atomic(using=using):
+            RecipeSummary.objects.using(using).bulk_create([
+                RecipeSummary(
+                    recipe_id=row['id'],
+                    user_id=row['user_id'],
+                    title=row['title'],
+                    time_minutes=row['time_minutes'],
+                    price=row['price'],
+                    link=row['link'],
+                    public=row['public'],
+                    tag_ids=tags[row['id']],
+                    ingredient_ids=ingredients[row['id']],
+                    tag_count=len(tags[row['id']]),
+                    ingredient_count=len(ingredients[row['id']]),
+                    thumbnail=row['image'] or '',
+                )
+                for row in rows
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    # the GIN indexes are only made on PostgreSQL, out of a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.recipe')),
+                ('title', models.CharField(max_length=255)),
+                ('time_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('link', models.CharField(blank=True, max_length=255)),
+                ('public', models.BooleanField(default=False)),
+                ('tag_ids', core.db.fields.IdArrayField()),
+                ('ingredient_ids', core.db.fields.IdArrayField()),
+                ('tag_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+                ('thumbnail', models.CharField(blank=True, max_length=100)),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_summaries,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['user', 'recipe'], name='core_summary_user_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='recipesummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='core_summary_tags_gin', opclasses=['jsonb_path_ops']),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='recipesummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='core_summary_ingr_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
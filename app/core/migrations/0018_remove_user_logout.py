@@ -0,0 +1,20 @@
+# Generated by Django 3.1.1 on 2026-10-19 20:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # User.logout was taken out of the model without a migration, nothing
+    # reads it and its column, NOT NULL without a default in the database
+    # once 0002 ran, makes the inserts of new users fail
+
+    dependencies = [
+        ('core', '0017_change_events'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='logout',
+        ),
+    ]
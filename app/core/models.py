@@ -1,16 +1,33 @@
+import hashlib
 import os
 import uuid
 
+from core.db.fields import IdArrayField
 from django.conf import settings  # this is how we can retrive variables
 # for the settings file
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.utils import timezone
 
 # Maneger User class is the class that provides the creation
 # of user or admin and all methods out of the box
 
 
+RECIPE_IMAGE_DIR = 'uploads/recipe/'
+
+
+def sharded_path(directory, filename):
+    """Return the fan-out path of a file, like directory/ab/cd/filename
+
+    Two levels of 256 directories keep every directory small enough to
+    list and stat quickly even with millions of files
+    """
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return os.path.join(directory, digest[:2], digest[2:4], filename)
+
+
 def recipe_image_file_path(instance, file_name):
     """Generate file path for new recipe image
 
@@ -20,24 +37,30 @@ def recipe_image_file_path(instance, file_name):
     """
     ext = file_name.split('.')[-1]  # the last item
     filename = f'{uuid.uuid4()}.{ext}'
-    return os.path.join('uploads/recipe/', filename)
+    return sharded_path(RECIPE_IMAGE_DIR, filename)
 
 
 class UserManager(BaseUserManager):
 
-    def create_user(self, email, password=None, **kargs):
+    def create_user(self, email, password=None, set_password=None, **kargs):
         """Creates and saves a new user
 
         Args:
             email ([type]): [description]
             password ([type], optional): [description]. Defaults to None.
+            set_password (callable, optional): called with the user and the
+                password instead of user.set_password, e.g. to hash it
+                somewhere else
         """
         if not email:
             raise ValueError('User Must Have An Email Address')
         new_email = self.normalize_email(email)
         user = self.model(email=new_email, **kargs)
         # this is the same as creating a user model
-        user.set_password(password)  # this incrypt the password
+        if set_password:
+            set_password(user, password)
+        else:
+            user.set_password(password)  # this incrypt the password
         user.save(using=self._db)
         return user
 
@@ -57,16 +80,40 @@ class User(AbstractBaseUser, PermissionsMixin):  # this classes provides
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # signed access tokens carry it, bumping it revokes them all
+    token_version = models.PositiveIntegerField(default=0)
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
 
+class RecipePartQuerySet(models.QuerySet):
+
+    def assigned(self):
+        """Return the rows used by at least one recipe
+        """
+        # a semi join, a plain join repeats the rows and needs a DISTINCT
+        through = self.model.recipe_set.through
+        return self.filter(models.Exists(through.objects.filter(
+            **{self.model._meta.model_name: models.OuterRef('pk')})))
+
+
 class Tag(models.Model):
     """Tag to be used for a recipie
     """
     name = models.CharField(max_length=255)
+    # users live on the default database, these rows on a shard, the index
+    # below starts with the user so the one of the key is left out
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_constraint=False,
+                             db_index=False)
+    objects = RecipePartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the listing of a user by name, read from the index alone
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_tag_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -77,18 +124,53 @@ class Ingredient(models.Model):
     """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_constraint=False,
+                             db_index=False)
+    objects = RecipePartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_ingr_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ImageBlob(models.Model):
+    """Content addressed image file shared by every recipe using it
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)  # storage name
+    size = models.PositiveIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # 64 bit difference hash in hex, only set when perceptual hashing is on
+    phash = models.CharField(max_length=16, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def visible_to(self, user):
+        """Return the recipes of the user plus the public ones
+        """
+        if not user.is_authenticated:
+            return self.filter(public=True)
+        return self.filter(models.Q(public=True) | models.Q(user=user))
+
+
 class Recipe(models.Model):
     """Recipe object
     """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_index=False
     )
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
@@ -99,6 +181,244 @@ class Recipe(models.Model):
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
     # pass the reference to the function so when its saved this will call and retrieve
     # the path, this pass the instance as well
+    public = models.BooleanField(default=False)
+    # public recipes and their images are visible to everybody
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the recipes sharing a file, looked up by the image cleanup
+            models.Index(fields=['image'], name='core_recipe_image_idx'),
+            # the recipes of a user and their stats from the index alone
+            models.Index(fields=['user', 'public', 'time_minutes'],
+                         name='core_recipe_user_stats_idx'),
+            # the public side of visible_to
+            models.Index(fields=['id'], condition=models.Q(public=True),
+                         name='core_recipe_public_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeSummary(models.Model):
+    """What the recipe lists show of a recipe, in one row
+
+    Kept up to date by the signals of core.signals, rebuilt from the
+    recipes with the rebuild_recipe_summaries command.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_index=False
+    )
+    title = models.CharField(max_length=255)
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    link = models.CharField(max_length=255, blank=True)
+    public = models.BooleanField(default=False)
+    tag_ids = IdArrayField()
+    ingredient_ids = IdArrayField()
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+    thumbnail = models.CharField(max_length=100, blank=True)
+    # storage name of the recipe image
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='core_summary_user_idx'),
+            # only built on PostgreSQL
+            GinIndex(fields=['tag_ids'], opclasses=['jsonb_path_ops'],
+                     name='core_summary_tags_gin'),
+            GinIndex(fields=['ingredient_ids'],
+                     opclasses=['jsonb_path_ops'],
+                     name='core_summary_ingr_gin'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ChangeEvent(models.Model):
+    """A recipe, tag or ingredient created, updated or deleted, appended
+    by the signals of core.signals in the transaction of the change, see
+    core.outbox
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = [(CREATED, 'Created'), (UPDATED, 'Updated'),
+               (DELETED, 'Deleted')]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+'
+    )
+    # kept after the user, pruned with the other old events
+    model = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # the feed of a user and the dispatch, in the order of the
+            # cursors
+            models.Index(fields=['user', 'created', 'id'],
+                         name='core_change_user_idx'),
+            models.Index(fields=['created', 'id'],
+                         name='core_change_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} {self.action}'
+
+
+class ImageUpload(models.Model):
+    """Resumable upload of a recipe image, received in chunks
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # bytes received so far, the next chunk has to start here
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the expired uploads gc_media deletes
+            models.Index(fields=['created'], name='core_upload_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.length})'
+
+
+class UserShard(models.Model):
+    """Shard holding the data of a user, when it is not the one of the
+    hash ring, see core.db.shards
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    shard = models.CharField(max_length=64)
+    moving_to = models.CharField(max_length=64, blank=True)
+    # writes are refused while move_user copies the last changes
+    locked = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id} on {self.shard}'
+
+
+class AccountDeletion(models.Model):
+    """Progress of the purge of a deactivated user, see core.deletion
+
+    Outlives the user, its id is only kept as a number.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'),
+                (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user_id = models.PositiveIntegerField(unique=True)
+    status = models.CharField(max_length=16, choices=STATUSES,
+                              default=PENDING)
+    step = models.CharField(max_length=100, blank=True)
+    # the table and database being purged
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    images_released = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    # a running purge not updated for long stopped with its process
+    finished = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.user_id} {self.status}'
+
+
+class Job(models.Model):
+    """Call of a function in the background, run by the workers of
+    core.jobs
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'),
+                (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=255)
+    # dotted path of the function
+    args = models.JSONField(default=list)
+    priority = models.SmallIntegerField(default=0)
+    # the highest first, then the oldest
+    status = models.CharField(max_length=16, choices=STATUSES,
+                              default=QUEUED)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    claimed_by = models.CharField(max_length=255, blank=True)
+    claimed_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # the next jobs to claim, without the ones done
+            models.Index(fields=['-priority', 'run_at', 'id'],
+                         condition=models.Q(status='queued'),
+                         name='core_job_queue_idx'),
+            # the running ones to take back from dead workers
+            models.Index(fields=['claimed_at'],
+                         condition=models.Q(status='running'),
+                         name='core_job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} {self.status}'
+
+
+class ChangeCursor(models.Model):
+    """How far a handler of the dispatcher of core.outbox got in the
+    events of a shard
+    """
+    handler = models.CharField(max_length=255)
+    shard = models.CharField(max_length=64)
+    created = models.DateTimeField(null=True)
+    event_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['handler', 'shard'],
+                                    name='core_change_cursor_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.handler} on {self.shard}'
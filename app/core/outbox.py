@@ -0,0 +1,168 @@
+"""The changes of the recipes, tags and ingredients, for the services
+deriving data from them
+
+The signals of core.signals append a ChangeEvent to the shard of the
+changed row within the transaction writing it, the viewsets save in one
+transaction (see AtomicWritesMixin), a change is never seen without its
+event or the other way round. Bulk writes skip the signals and record
+their events with record_changes.
+
+The events are read in the order of (created, id), which survives
+move_user copying them to another shard, from a cursor naming the last
+one read. The id order alone would not, every shard counts in its own
+block. Only the events older than CHANGE_FEED_DELAY seconds are read,
+a transaction appending one has to commit within that delay or a reader
+may get past it.
+
+The users read theirs from /changes/, the dispatcher hands those of
+everybody to the functions of CHANGE_HANDLERS, in batches, every handler
+from its own ChangeCursor.
+"""
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .async_api import call_in_worker
+from .db.shards import current_shard
+from .jobs import task_name
+from .models import ChangeCursor, ChangeEvent, Recipe
+
+logger = logging.getLogger(__name__)
+
+
+def record_change(instance, action, using):
+    ChangeEvent.objects.using(using).create(
+        user_id=instance.user_id, model=instance._meta.model_name,
+        object_id=instance.pk, action=action)
+
+
+def record_changes(model, owners, action, using):
+    """Append one event per object
+
+    Args:
+        owners: (object id, user id) pairs
+    """
+    ChangeEvent.objects.using(using).bulk_create([
+        ChangeEvent(user_id=user_id, model=model._meta.model_name,
+                    object_id=object_id, action=action)
+        for object_id, user_id in owners
+    ])
+
+
+def record_recipe_updates(recipe_ids, using):
+    """Append the updates of recipes, whoever owns them
+    """
+    if recipe_ids:
+        record_changes(Recipe, Recipe._base_manager.using(using).filter(
+            pk__in=recipe_ids).values_list('pk', 'user_id'),
+            ChangeEvent.UPDATED, using)
+
+
+def encode_cursor(event):
+    return f'{int(event.created.timestamp() * 1000000)}.{event.id}'
+
+
+def decode_cursor(cursor):
+    """The (created, id) of a cursor, ValueError when it is not one
+    """
+    micros, event_id = cursor.split('.')
+    created = datetime.datetime.fromtimestamp(
+        int(micros) / 1000000, datetime.timezone.utc)
+    return created, int(event_id)
+
+
+def events_after(events, created=None, event_id=0, limit=None):
+    """The events of the queryset after the position, the settled ones
+    """
+    events = events.filter(created__lte=timezone.now() - datetime.timedelta(
+        seconds=settings.CHANGE_FEED_DELAY))
+    if created is not None:
+        events = events.filter(Q(created__gt=created) |
+                               Q(created=created, id__gt=event_id))
+    return list(events.order_by('created', 'id')[:limit])
+
+
+class AtomicWritesMixin:
+    """Save and delete in one transaction on the shard of the user, along
+    with what the signals write, the change events and the summaries
+    """
+
+    def _atomic(self):
+        return transaction.atomic(using=current_shard() or DEFAULT_DB_ALIAS)
+
+    def create(self, request, *args, **kwargs):
+        with self._atomic():
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        with self._atomic():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with self._atomic():
+            return super().destroy(request, *args, **kwargs)
+
+
+class Dispatcher:
+    """Hands the events of every shard to the handlers, oldest first
+
+    A handler is called with lists of up to CHANGE_DISPATCH_BATCH_SIZE
+    events and its cursor moves past them once it returns. One raising is
+    called with the same events on the next round, the others go on, so
+    a handler may see an event twice.
+    """
+
+    def __init__(self, handlers=None, batch_size=None):
+        if handlers is None:
+            handlers = [import_string(path)
+                        for path in settings.CHANGE_HANDLERS]
+        self.handlers = {task_name(handler): handler for handler in handlers}
+        self.batch_size = batch_size or settings.CHANGE_DISPATCH_BATCH_SIZE
+        self.handed = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, interval=1):
+        """Dispatch until stopped, waiting interval seconds whenever the
+        handlers are caught up
+        """
+        while not self._stopping.is_set():
+            if not call_in_worker(self.dispatch):
+                self._stopping.wait(interval)
+
+    def dispatch(self):
+        """Hand every handler a batch of each shard, return how many
+        events were handed
+        """
+        handed = 0
+        for name, handler in self.handlers.items():
+            for alias in settings.DATABASE_SHARDS:
+                handed += self._dispatch(name, handler, alias)
+        self.handed += handed
+        return handed
+
+    def _dispatch(self, name, handler, alias):
+        cursor, _ = ChangeCursor.objects.using(DEFAULT_DB_ALIAS) \
+            .get_or_create(handler=name, shard=alias)
+        events = events_after(ChangeEvent.objects.using(alias),
+                              cursor.created, cursor.event_id,
+                              self.batch_size)
+        if not events:
+            return 0
+        try:
+            handler(events)
+        except Exception:
+            logger.exception('Change handler %s failed on %s', name, alias)
+            return 0
+        cursor.created = events[-1].created
+        cursor.event_id = events[-1].id
+        cursor.save(update_fields=['created', 'event_id'])
+        return len(events)
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .db.shards import reserve_id_block
+from .models import ChangeEvent, ImageUpload, Ingredient, Recipe, Tag
+from .outbox import record_change, record_recipe_updates
+from .summaries import refresh_summaries
+
+
+def reserve_shard_ids(sender, using, **kwargs):
+    """Keep the ids of every shard apart once it is migrated
+    """
+    if using in settings.DATABASE_SHARDS:
+        reserve_id_block(using)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def delete_sharded_data(sender, instance, using, **kwargs):
+    """The cascade only reaches the rows on the database of the user,
+    the ones on the other shards go with the ORM to keep their signals
+    """
+    for alias in settings.DATABASE_SHARDS:
+        if alias == using:
+            continue
+        for model in (ImageUpload, Recipe, Tag, Ingredient):
+            model._base_manager.using(alias).filter(user=instance).delete()
+
+
+@receiver(post_save, sender=Recipe)
+def summarize_saved_recipe(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        refresh_summaries([instance.pk], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def summarize_relinked_recipes(sender, instance, action, reverse, pk_set,
+                               using, **kwargs):
+    """Refresh the recipes gaining or losing tags or ingredients, from
+    either side of the relation, and record their update
+    """
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # pk_set is None on clear, the recipes are only known before
+        instance._cleared_recipes = _linked_recipes(sender, instance, using)
+        return
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipes', [])
+    else:
+        recipe_ids = pk_set
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        refresh_summaries(recipe_ids, using)
+        record_recipe_updates(recipe_ids, using)
+
+
+def _linked_recipes(through, instance, using):
+    return list(through.objects.using(using).filter(
+        **{instance._meta.model_name: instance})
+        .values_list('recipe_id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_linked_recipes(sender, instance, using, **kwargs):
+    """The cascade deletes the links without m2m_changed
+    """
+    instance._linked_recipes = _linked_recipes(
+        sender.recipe_set.through, instance, using)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def summarize_unlinked_recipes(sender, instance, using, **kwargs):
+    recipe_ids = instance.__dict__.pop('_linked_recipes', [])
+    refresh_summaries(recipe_ids, using)
+    record_recipe_updates(recipe_ids, using)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def record_saved(sender, instance, created, using, raw=False, **kwargs):
+    if not raw:
+        record_change(instance, ChangeEvent.CREATED if created
+                      else ChangeEvent.UPDATED, using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_deleted(sender, instance, using, **kwargs):
+    record_change(instance, ChangeEvent.DELETED, using)
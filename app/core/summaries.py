@@ -0,0 +1,105 @@
+"""The RecipeSummary rows, one per recipe with what the lists show
+
+The signals of core.signals write the summary of a recipe again in the
+transaction changing it. Bulk writes skip the signals: refresh the
+summaries of the recipes they touch, or rebuild them all.
+"""
+from collections import defaultdict
+
+from core.models import Recipe, RecipeSummary
+from django.db import transaction
+
+RECIPE_FIELDS = ('id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+                 'public', 'image')
+SUMMARY_FIELDS = ('user', 'title', 'time_minutes', 'price', 'link', 'public',
+                  'tag_ids', 'ingredient_ids', 'tag_count',
+                  'ingredient_count', 'thumbnail')
+
+
+def _related_ids(through, field, recipe_ids, using):
+    related = defaultdict(list)
+    rows = through.objects.using(using).filter(recipe_id__in=recipe_ids) \
+        .order_by(field).values_list('recipe_id', field)
+    for recipe_id, related_id in rows:
+        related[recipe_id].append(related_id)
+    return related
+
+
+def build_summaries(recipes):
+    """Unsaved summaries of the recipes of a queryset
+    """
+    rows = list(recipes.values(*RECIPE_FIELDS))
+    recipe_ids = [row['id'] for row in rows]
+    tags = _related_ids(Recipe.tags.through, 'tag_id', recipe_ids,
+                        recipes.db)
+    ingredients = _related_ids(Recipe.ingredients.through, 'ingredient_id',
+                               recipe_ids, recipes.db)
+    return [
+        RecipeSummary(
+            recipe_id=row['id'],
+            user_id=row['user_id'],
+            title=row['title'],
+            time_minutes=row['time_minutes'],
+            price=row['price'],
+            link=row['link'],
+            public=row['public'],
+            tag_ids=tags[row['id']],
+            ingredient_ids=ingredients[row['id']],
+            tag_count=len(tags[row['id']]),
+            ingredient_count=len(ingredients[row['id']]),
+            thumbnail=row['image'] or '',
+        )
+        for row in rows
+    ]
+
+
+def refresh_summaries(recipe_ids, using):
+    """Write the summaries of the recipes again, deleting the ones of the
+    recipes gone, return how many were written
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return 0
+    with transaction.atomic(using=using):
+        # the recipe rows lock out a concurrent refresh of the same ones
+        summaries = build_summaries(
+            Recipe._base_manager.using(using).select_for_update()
+            .filter(pk__in=recipe_ids))
+        manager = RecipeSummary.objects.using(using)
+        existing = set(manager.filter(pk__in=recipe_ids)
+                       .values_list('pk', flat=True))
+        manager.bulk_create([summary for summary in summaries
+                             if summary.pk not in existing],
+                            ignore_conflicts=True)
+        manager.bulk_update([summary for summary in summaries
+                             if summary.pk in existing], SUMMARY_FIELDS)
+        gone = recipe_ids - {summary.pk for summary in summaries}
+        if gone:
+            manager.filter(pk__in=gone).delete()
+    return len(summaries)
+
+
+def rebuild_summaries(using, batch_size=500):
+    """Write the summaries of every recipe of the database again, return
+    how many
+
+    A transaction per batch of recipes, written over the summaries there
+    like the signals do, so the readers and the signals running meanwhile
+    always find one summary per recipe. The summaries left of no recipe are
+    deleted.
+    """
+    recipes = Recipe._base_manager.using(using).order_by('pk')
+    summaries = RecipeSummary.objects.using(using)
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        count += refresh_summaries(batch, using)
+        summaries.filter(pk__gt=last_pk, pk__lt=batch[-1]) \
+            .exclude(pk__in=batch).delete()
+        last_pk = batch[-1]
+    summaries.filter(pk__gt=last_pk).delete()
+    return count
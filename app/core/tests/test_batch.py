@@ -0,0 +1,172 @@
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from core import batch
+from core.models import Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user.authentication import get_token_cache
+
+BATCH_URL = reverse('batch')
+RECIPES_URL = reverse('exercise:recipe-list')
+TAGS_URL = reverse('exercise:tag-list')
+ME_URL = reverse('user:me')
+ASYNC_ME_URL = reverse('user:async-me')
+
+
+class PublicBatchApiTests(TestCase):
+
+    def test_login_required(self):
+        res = APIClient().post(BATCH_URL, [{'path': ME_URL}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateBatchApiTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123',
+            name='name'
+        )
+        self.client.force_authenticate(self.user)
+
+    def batch(self, items, **params):
+        url = BATCH_URL
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return self.client.post(url, items, format='json')
+
+    def test_batch_runs_items_in_order(self):
+        """Test every item answers with its own status and body
+        """
+        res = self.batch([
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'method': 'GET', 'path': TAGS_URL},
+            {'method': 'GET', 'path': ME_URL},
+            {'method': 'GET', 'path': '/api/exercise/nothing/'},
+        ])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        created, tags, me, missing = res.data
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(tags['status'], status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in tags['body']], ['Vegan'])
+        self.assertEqual(me['body'], {'email': 'test@test.com',
+                                      'name': 'name'})
+        self.assertEqual(missing['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_items_skip_authentication(self):
+        """Test items run as the batch user without authenticating again
+        """
+        with patch('user.authentication.CachedTokenAuthentication'
+                   '.authenticate') as authenticate:
+            res = self.batch([{'path': RECIPES_URL}])
+
+        authenticate.assert_not_called()
+        self.assertEqual(res.data[0]['status'], status.HTTP_200_OK)
+
+    def test_validation_errors_per_item(self):
+        res = self.batch([
+            {'method': 'POST', 'path': RECIPES_URL, 'body': {'title': 'x'}},
+            {'method': 'GET', 'path': '/admin/'},
+            'nonsense',
+        ])
+
+        self.assertEqual([item['status'] for item in res.data],
+                         [400, 400, 400])
+        self.assertIn('time_minutes', res.data[0]['body'])
+
+    def test_async_views(self):
+        res = self.batch([
+            {'path': ASYNC_ME_URL},
+            {'path': reverse('exercise:async-recipe-detail', args=[1])},
+        ])
+
+        me, missing = res.data
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['email'], 'test@test.com')
+        self.assertEqual(missing['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_unreadable_response_answers_alone(self):
+        broken = SimpleNamespace(
+            func=lambda request: HttpResponse(
+                b'{', content_type='application/json'),
+            args=(), kwargs={})
+        with patch('core.batch.resolve', return_value=broken), \
+                self.assertLogs('core.batch', 'ERROR'):
+            res = self.batch([{'path': ME_URL}])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['status'],
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_no_nested_batches(self):
+        res = self.batch([{'method': 'POST', 'path': BATCH_URL, 'body': []}])
+
+        self.assertEqual(res.data[0]['status'], status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_size_limit(self):
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            res = self.batch([{'path': ME_URL}] * 3)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_string(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=5, price=5)
+        recipe.tags.add(tag)
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5)
+
+        res = self.batch([{'path': f'{RECIPES_URL}?tags={tag.id}'}])
+
+        self.assertEqual([r['title'] for r in res.data[0]['body']], ['Cake'])
+
+
+class ParallelBatchApiTests(TransactionTestCase):
+    """Parallel reads use their own connections, the data is committed"""
+
+    def setUp(self):
+        caches['default'].clear()
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_reads_run_in_parallel(self):
+        """Test consecutive reads are dispatched at the same time
+        """
+        barrier = threading.Barrier(2, timeout=5)
+        dispatch = batch.dispatch
+
+        def dispatch_together(request, item):
+            if item['method'] == 'GET':
+                barrier.wait()
+            return dispatch(request, item)
+
+        with patch.object(batch, 'dispatch', dispatch_together):
+            res = self.client.post(BATCH_URL + '?parallel=1', [
+                {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'A'}},
+                {'method': 'GET', 'path': TAGS_URL},
+                {'method': 'GET', 'path': RECIPES_URL},
+            ], format='json')
+
+        self.assertEqual([item['status'] for item in res.data],
+                         [201, 200, 200])
+        self.assertEqual(res.data[1]['body'][0]['name'], 'A')
@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest.mock import patch
+
+from core import cache as single_flight
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+
+@override_settings(SINGLE_FLIGHT_LEASE=10, SINGLE_FLIGHT_WAIT=2,
+                   SINGLE_FLIGHT_STALE_TTL=60)
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.calls = []
+
+    def compute(self, value='value', delay=0):
+        def compute():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_computed_once(self):
+        first = single_flight.get_or_compute('key', self.compute(), 60)
+        second = single_flight.get_or_compute('key', self.compute(), 60)
+
+        self.assertEqual((first, second), ('value', 'value'))
+        self.assertEqual(self.calls, ['value'])
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            single_flight.get_or_compute(
+                'key', self.compute(delay=0.2), 60)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, ['value'])
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_none_not_kept(self):
+        for _ in range(2):
+            self.assertIsNone(single_flight.get_or_compute(
+                'key', self.compute(None), 60))
+
+        self.assertEqual(self.calls, [None, None])
+        self.assertIsNone(caches['default'].get('key:lock'))
+
+    def test_stale_value_served_while_refreshed(self):
+        single_flight.get_or_compute('key', self.compute('old'), -1)
+        caches['default'].add('key:lock', 'other worker', 10)
+
+        value = single_flight.get_or_compute('key', self.compute('new'), 60)
+
+        self.assertEqual(value, 'old')
+        self.assertEqual(self.calls, ['old'])
+
+    def test_expired_value_refreshed(self):
+        single_flight.get_or_compute('key', self.compute('old'), -1)
+
+        value = single_flight.get_or_compute('key', self.compute('new'), 60)
+
+        self.assertEqual(value, 'new')
+        self.assertIsNone(caches['default'].get('key:lock'))
+
+    def test_refreshed_early_near_expiry(self):
+        caches['default'].set('key', ('old', time.time() + 1, 5.0), 60)
+
+        with patch('core.cache.random.random', return_value=0.9):
+            early = single_flight.get_or_compute(
+                'key', self.compute('new'), 60)
+        self.assertEqual(early, 'new')
+
+        caches['default'].set('key', ('old', time.time() + 1, 5.0), 60)
+        value = single_flight.get_or_compute(
+            'key', self.compute('new'), 60, beta=0)
+        self.assertEqual(value, 'old')
+
+    def test_lock_of_other_worker_kept(self):
+        """Test a lock taken again after the lease ran out is not released
+        by the worker it ran out on
+        """
+        def compute():
+            caches['default'].set('key:lock', 'other worker', 10)
+            return 'value'
+
+        single_flight.get_or_compute('key', compute, 60)
+
+        self.assertEqual(caches['default'].get('key:lock'), 'other worker')
+
+    def test_versions(self):
+        version = single_flight.get_version('version')
+        self.assertEqual(single_flight.get_version('version'), version)
+
+        single_flight.bump_versions(['version'])
+
+        self.assertNotEqual(single_flight.get_version('version'), version)
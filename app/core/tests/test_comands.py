@@ -1,8 +1,18 @@
+import io
+import os
+import shutil
+import tempfile
+import time
 from unittest.mock import patch
 
+from core.management.commands import gc_media
+from core.management.commands.shard_recipe_images import Command
+from core.models import ImageBlob, Recipe, sharded_path
+from django.db.models import F
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 
 class CommandTests(TestCase):
@@ -24,3 +34,162 @@ class CommandTests(TestCase):
             # the operational error
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class ShardRecipeImagesCommandTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def flat_recipe(self, name, content=b'image'):
+        """Create a recipe whose image is stored in the old flat layout
+        """
+        path = os.path.join(self.media_root, 'uploads/recipe', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5, price=5,
+            image=f'uploads/recipe/{name}'
+        )
+
+    def test_shard_recipe_images(self):
+        """Test the flat files are moved and the recipes updated
+        """
+        recipes = [self.flat_recipe(f'{i}.jpg') for i in range(5)]
+        missing = self.flat_recipe('missing.jpg')
+        os.remove(missing.image.path)
+
+        # none per recipe for its user, the change events need it
+        with self.assertNumQueries(37):
+            call_command('shard_recipe_images', batch_size=2,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+
+        for recipe in recipes:
+            old_path = recipe.image.path
+            recipe.refresh_from_db()
+            expected = sharded_path('uploads/recipe/',
+                                    os.path.basename(old_path))
+            self.assertEqual(recipe.image.name, expected)
+            self.assertTrue(os.path.exists(recipe.image.path))
+            self.assertFalse(os.path.exists(old_path))
+        missing.refresh_from_db()
+        self.assertEqual(missing.image.name, 'uploads/recipe/missing.jpg')
+
+    def test_sharded_path_kept_from_gc_media(self):
+        """Test the new path is not taken for an old orphan before the
+        recipe points at it
+        """
+        recipe = self.flat_recipe('a.jpg')
+        old = time.time() - 7200
+        os.utime(recipe.image.path, (old, old))
+
+        self.assertTrue(Command()._link(
+            recipe.image.path,
+            os.path.join(self.media_root,
+                         sharded_path('uploads/recipe/', 'a.jpg'))))
+        call_command('gc_media', stdout=io.StringIO())
+
+        self.assertTrue(os.path.exists(os.path.join(
+            self.media_root, sharded_path('uploads/recipe/', 'a.jpg'))))
+
+    def test_shard_recipe_images_resume(self):
+        """Test a run interrupted after linking finishes on the next run
+        """
+        recipe = self.flat_recipe('a.jpg')
+        new_name = sharded_path('uploads/recipe/', 'a.jpg')
+        new_path = os.path.join(self.media_root, new_name)
+        os.makedirs(os.path.dirname(new_path))
+        os.link(recipe.image.path, new_path)
+
+        call_command('shard_recipe_images', keep_old=True,
+                     stdout=io.StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, new_name)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.media_root, 'uploads/recipe/a.jpg')))
+
+
+class GcMediaCommandTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def media_file(self, name, age=7200):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'image')
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_gc_media(self):
+        """Test only old unreferenced files are deleted
+        """
+        used = self.media_file('uploads/recipe/aa/bb/used.jpg')
+        Recipe.objects.create(user=self.user, title='Salad', time_minutes=5,
+                              price=5, image='uploads/recipe/aa/bb/used.jpg')
+        orphans = [self.media_file(f'uploads/recipe/cc/dd/{i}.jpg')
+                   for i in range(5)]
+        fresh = self.media_file('uploads/recipe/cc/dd/new.jpg', age=0)
+
+        out = io.StringIO()
+        call_command('gc_media', batch_size=2, stdout=out)
+
+        self.assertTrue(os.path.exists(used))
+        self.assertTrue(os.path.exists(fresh))
+        for path in orphans:
+            self.assertFalse(os.path.exists(path))
+        self.assertIn('DELETED 5', out.getvalue())
+
+    def test_gc_media_upload_committing(self):
+        """Test a file referenced once the batch was read is kept
+        """
+        name = 'uploads/recipe/cc/dd/' + 'a' * 64 + '.jpg'
+        path = self.media_file(name)
+        ImageBlob.objects.create(sha256='a' * 64, name=name, size=5,
+                                 ref_count=0)
+        used = gc_media.Command._used
+
+        def upload_commits(command, names):
+            ImageBlob.objects.filter(name=name).update(
+                ref_count=F('ref_count') + 1)
+            return used(command, names)
+
+        with patch.object(gc_media.Command, '_used', upload_commits):
+            call_command('gc_media', stdout=io.StringIO())
+
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(ImageBlob.objects.filter(name=name).exists())
+
+    def test_gc_media_dry_run(self):
+        orphan = self.media_file('uploads/recipe/cc/dd/orphan.jpg')
+
+        out = io.StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+
+        self.assertTrue(os.path.exists(orphan))
+        self.assertIn('ORPHAN uploads/recipe/cc/dd/orphan.jpg',
+                      out.getvalue())
@@ -0,0 +1,252 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from core.db import pool
+from core.db.backends.sqlite3.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, PoolTimeout
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+DB_POOL_URL = reverse('db-pool')
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.usable = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+
+        kwargs.setdefault('timeout', 0.05)
+        return ConnectionPool(connect, lambda conn: conn.usable, **kwargs)
+
+    def test_connections_reused(self):
+        """Test a connection given back is handed out again
+        """
+        conn_pool = self.make_pool()
+
+        first = conn_pool.acquire()
+        conn_pool.release(first)
+        second = conn_pool.acquire()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+        stats = conn_pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['idle']),
+                         (1, 1, 0))
+        self.assertEqual(stats['created_per_minute'], 1)
+
+    def test_timeout_when_full(self):
+        conn_pool = self.make_pool(max_size=1)
+        conn_pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            conn_pool.acquire()
+        self.assertEqual(conn_pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        conn_pool = self.make_pool(max_size=1, timeout=5)
+        conn = conn_pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(
+            conn_pool.acquire()))
+        waiter.start()
+        while conn_pool.stats()['waiting'] == 0:
+            time.sleep(0.001)
+
+        conn_pool.release(conn)
+        waiter.join()
+
+        self.assertEqual(got, [conn])
+        self.assertEqual(conn_pool.stats()['waiting'], 0)
+
+    def test_broken_idle_connection_replaced(self):
+        conn_pool = self.make_pool(max_size=1, check_after=0)
+        broken = conn_pool.acquire()
+        conn_pool.release(broken)
+        broken.usable = False
+
+        conn = conn_pool.acquire()
+
+        self.assertIsNot(conn, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(conn_pool.stats()['size'], 1)
+
+    def test_recent_idle_connection_not_checked(self):
+        conn_pool = self.make_pool(check_after=30)
+        conn = conn_pool.acquire()
+        conn_pool.release(conn)
+        conn.usable = False
+
+        self.assertIs(conn_pool.acquire(), conn)
+
+    def test_discard_frees_slot(self):
+        conn_pool = self.make_pool(max_size=1)
+        conn = conn_pool.acquire()
+
+        conn_pool.release(conn, discard=True)
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(conn_pool.acquire(), conn)
+
+    def test_failed_connect_frees_slot(self):
+        conn_pool = ConnectionPool(
+            lambda: 1 / 0, lambda conn: True, max_size=1, timeout=0.05)
+
+        for _ in range(2):
+            with self.assertRaises(ZeroDivisionError):
+                conn_pool.acquire()
+        self.assertEqual(conn_pool.stats()['size'], 0)
+
+    def test_fill_min_size(self):
+        conn_pool = self.make_pool(min_size=2)
+
+        conn_pool.fill()
+
+        self.assertEqual(conn_pool.stats()['idle'], 2)
+
+    def test_idle_connections_expire_down_to_min_size(self):
+        conn_pool = self.make_pool(min_size=1, max_idle=0)
+        conns = [conn_pool.acquire() for _ in range(3)]
+
+        for conn in conns:
+            conn_pool.release(conn)
+
+        self.assertEqual(conn_pool.stats()['size'], 1)
+        self.assertEqual([conn.closed for conn in conns],
+                         [True, True, False])
+
+
+class PooledBackendTests(SimpleTestCase):
+    """The pooled SQLite backend against a throwaway database file"""
+
+    def setUp(self):
+        patcher = patch.object(pool, '_pools', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        handle, self.name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.name)
+        self.wrappers = []
+        self.addCleanup(self.close_wrappers)
+
+    def close_wrappers(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        pool.close_pools()
+
+    def make_wrapper(self, **settings):
+        settings_dict = {**connections['default'].settings_dict,
+                         'ENGINE': 'core.db.backends.sqlite3',
+                         'NAME': self.name,
+                         'HEALTH_CHECKS': False,
+                         'POOL': None,
+                         **settings}
+        wrapper = DatabaseWrapper(settings_dict, alias='pooled')
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def test_close_gives_connection_back(self):
+        """Test the connection of a closed wrapper goes to the next one
+        """
+        first = self.make_wrapper(POOL={'MAX_SIZE': 2})
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+
+        second = self.make_wrapper(POOL={'MAX_SIZE': 2})
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIs(second.connection, raw)
+        self.assertEqual(pool.pool_stats()['pooled']['created'], 1)
+
+    def test_without_pool_connections_are_closed(self):
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+
+        wrapper.close()
+
+        self.assertEqual(pool.pool_stats(), {})
+
+    def test_changed_connection_discarded(self):
+        wrapper = self.make_wrapper(POOL={'MAX_SIZE': 1})
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        wrapper.close()
+
+        stats = pool.pool_stats()['pooled']
+        self.assertEqual((stats['size'], stats['idle']), (0, 0))
+
+    def test_health_check_reconnects(self):
+        """Test a dead persistent connection is replaced on next request
+        """
+        wrapper = self.make_wrapper(CONN_MAX_AGE=None, HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        dead = wrapper.connection
+        dead.close()
+
+        wrapper.close_if_unusable_or_obsolete()  # request started
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIsNot(wrapper.connection, dead)
+
+    def test_health_check_once_per_request(self):
+        wrapper = self.make_wrapper(CONN_MAX_AGE=None, HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        wrapper.close_if_unusable_or_obsolete()
+
+        with patch.object(wrapper, 'check_connection',
+                          return_value=True) as check:
+            wrapper.cursor().close()
+            wrapper.cursor().close()
+
+        check.assert_called_once()
+
+
+class DatabasePoolApiTests(TestCase):
+
+    def test_admin_only(self):
+        client = APIClient()
+        user = get_user_model().objects.create_user('test@test.com', 'pass')
+        client.force_authenticate(user)
+
+        res = client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_pool_stats(self):
+        client = APIClient()
+        admin = get_user_model().objects.create_superuser(
+            'admin@test.com', 'pass')
+        client.force_authenticate(admin)
+        conn_pool = ConnectionPool(FakeConnection, lambda conn: True)
+        conn_pool.acquire()
+
+        with patch.object(pool, '_pools', {}):
+            pool.get_pool('default', (), lambda: conn_pool)
+            res = client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['default']['in_use'], 1)
+        self.assertEqual(res.data['default']['created'], 1)
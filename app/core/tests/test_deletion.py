@@ -0,0 +1,155 @@
+import io
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from core import deletion
+from core.models import (AccountDeletion, ChangeEvent, ImageBlob,
+                         Ingredient, Job, Recipe, RecipeSummary, Tag)
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from images.storage import store_recipe_image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+ME_URL = reverse('user:me')
+
+
+def sample_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def sample_file(content=b'image bytes'):
+    buf = io.BytesIO(content)
+    buf.name = 'photo.jpg'
+    buf.size = len(content)
+    return buf
+
+
+class AccountDeletionTests(TransactionTestCase):
+    """The images are deleted on commit, so the tests need real
+    transactions
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            recipe = sample_recipe(self.user, title=f'Recipe {i}')
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(Ingredient.objects.create(
+                user=self.user, name=f'Ingredient {i}'))
+        self.recipe = Recipe.objects.filter(user=self.user).first()
+        store_recipe_image(self.recipe, sample_file())
+        self.path = self.recipe.image.path
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_delete_deactivates_and_queues(self):
+        Token.objects.create(user=self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], AccountDeletion.PENDING)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'core.deletion.purge_user')
+        self.assertEqual(job.args, [res.data['id']])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+        res = APIClient().get(reverse('user:deletion',
+                                      args=[res.data['id']]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], AccountDeletion.PENDING)
+
+    def test_purge_in_batches(self):
+        started = deletion.start_deletion(self.user)
+
+        purged = deletion.purge_user(started.pk, batch_size=2)
+
+        self.assertEqual(purged.status, AccountDeletion.DONE)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+        for model in (Recipe, Tag, Ingredient, RecipeSummary):
+            self.assertFalse(model.objects.filter(user=self.user).exists())
+        self.assertFalse(Recipe.tags.through.objects.exists())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(ImageBlob.objects.exists())
+        # summaries, ingredient and tag links, recipes, ingredients, tag
+        self.assertEqual(purged.rows_deleted, 5 + 5 + 5 + 5 + 5 + 1)
+        self.assertEqual(purged.images_released, 1)
+        self.assertEqual(ChangeEvent.objects.filter(
+            user_id=self.user.pk, action=ChangeEvent.DELETED).count(), 11)
+
+    def test_links_of_other_users_removed(self):
+        """Test the recipes of other users lose the tags of the user
+        """
+        recipe = sample_recipe(self.other)
+        recipe.tags.add(self.tag)
+
+        started = deletion.start_deletion(self.user)
+        deletion.purge_user(started.pk)
+
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertEqual(RecipeSummary.objects.get(pk=recipe.pk).tag_ids, [])
+
+    def test_purge_runs_once(self):
+        started = deletion.start_deletion(self.user)
+        AccountDeletion.objects.filter(pk=started.pk).update(
+            status=AccountDeletion.RUNNING)
+
+        self.assertIsNone(deletion.purge_user(started.pk))
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+
+    def test_command_queues_failed(self):
+        started = deletion.start_deletion(self.user)
+        purge_table = deletion._purge_table
+
+        def fail_on_tags(progress, model, alias, batch_size):
+            if model is Tag:
+                raise OSError('disk')
+            purge_table(progress, model, alias, batch_size)
+
+        with patch.object(deletion, '_purge_table', fail_on_tags), \
+                self.assertRaises(OSError):
+            deletion.purge_user(started.pk)
+        started.refresh_from_db()
+        self.assertEqual(started.status, AccountDeletion.FAILED)
+        self.assertEqual(started.error, 'disk')
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        Job.objects.all().delete()
+
+        call_command('purge_deleted_users', stdout=StringIO())
+        call_command('run_workers', '--burst', '--threads', '1',
+                     stdout=StringIO())
+
+        started.refresh_from_db()
+        self.assertEqual(started.status, AccountDeletion.DONE)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
@@ -0,0 +1,167 @@
+import datetime
+from io import StringIO
+
+from core import jobs
+from core.models import Job
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+JOBS_URL = reverse('jobs')
+
+calls = []
+
+
+def record(*args):
+    calls.append(args)
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_DELAY=10,
+                   JOB_RETRY_MAX_DELAY=60, JOB_LEASE=600)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_rolled_back(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                jobs.enqueue(record, 1)
+                raise ValueError('rollback')
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_by_priority_then_age(self):
+        low = jobs.enqueue(record, 'low')
+        high = jobs.enqueue(record, 'high', priority=5)
+        later = jobs.enqueue(record, 'later', priority=5)
+        jobs.enqueue(record, 'not due', priority=9, delay=60)
+
+        claimed = [jobs.claim('test').pk for _ in range(3)]
+
+        self.assertEqual(claimed, [high.pk, later.pk, low.pk])
+        self.assertIsNone(jobs.claim('test'))
+        self.assertEqual(Job.objects.get(pk=low.pk).status, Job.RUNNING)
+
+    def test_done_job_deleted(self):
+        jobs.enqueue(record, 1, 'two')
+
+        self.assertEqual(jobs.run_job(jobs.claim('test')), 'done')
+
+        self.assertEqual(calls, [(1, 'two')])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_retried_later(self):
+        job = jobs.enqueue(fail, 'broken')
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_job(jobs.claim('test')), 'retried')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('ValueError: broken', job.last_error)
+        self.assertGreaterEqual(job.run_at, timezone.now() +
+                                datetime.timedelta(seconds=4))
+        self.assertIsNone(jobs.claim('test'))
+
+    def test_failed_after_max_attempts(self):
+        job = jobs.enqueue(fail, 'broken', max_attempts=2)
+        for outcome in ('retried', 'failed'):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            with self.assertLogs('core.jobs', 'ERROR'):
+                self.assertEqual(jobs.run_job(jobs.claim('test')), outcome)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished)
+
+    def test_retry_delay_doubles_up_to_max(self):
+        self.assertTrue(5 <= jobs.retry_delay(1) <= 10)
+        self.assertTrue(10 <= jobs.retry_delay(2) <= 20)
+        self.assertTrue(30 <= jobs.retry_delay(10) <= 60)
+
+    def test_lost_jobs_requeued(self):
+        lost = jobs.enqueue(record, 'lost')
+        spent = jobs.enqueue(record, 'spent', max_attempts=1)
+        jobs.claim('dead')
+        jobs.claim('dead')
+        Job.objects.update(claimed_at=timezone.now() -
+                           datetime.timedelta(seconds=601))
+
+        self.assertEqual(jobs.requeue_lost(), 2)
+
+        self.assertEqual(Job.objects.get(pk=lost.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=spent.pk).status, Job.FAILED)
+
+    def test_requeued_job_kept_for_new_worker(self):
+        """Test the worker the lease ran out on does not finish the job
+        another one claimed since
+        """
+        jobs.enqueue(record, 'slow')
+        slow = jobs.claim('slow')
+        Job.objects.update(status=Job.QUEUED)
+        again = jobs.claim('fast')
+
+        jobs.run_job(slow)
+
+        self.assertEqual(Job.objects.get().claimed_by, again.claimed_by)
+
+    def test_queue_stats(self):
+        jobs.enqueue(record, 1)
+        jobs.enqueue(record, 2)
+        jobs.run_job(jobs.claim('test'))
+        jobs.enqueue(record, 3, delay=60)
+
+        stats = jobs.queue_stats()
+
+        self.assertEqual(stats['queued'], 2)
+        self.assertEqual(stats['running'], 0)
+        self.assertGreaterEqual(stats['lag'], 0)
+
+    def test_queue_stats_admin_only(self):
+        user = get_user_model().objects.create_user('test@test.com',
+                                                    'test123')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.assertEqual(client.get(JOBS_URL).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        res = client.get(JOBS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['queued'], 0)
+
+
+class RunWorkersTests(TransactionTestCase):
+    """The worker threads have their own connections, the jobs have to be
+    committed for them
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_runs_due_jobs(self):
+        for i in range(3):
+            jobs.enqueue(record, i)
+        jobs.enqueue(fail, 'broken')
+        out = StringIO()
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            call_command('run_workers', '--burst', '--threads', '1',
+                         stdout=out)
+
+        self.assertEqual(sorted(calls), [(0,), (1,), (2,)])
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+        self.assertIn('3 DONE, 1 RETRIED, 0 FAILED', out.getvalue())
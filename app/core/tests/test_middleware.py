@@ -0,0 +1,64 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse('exercise:recipe-list')
+ADMIN_LOGIN_URL = reverse('admin:login')
+
+
+class APIMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+
+    def test_api_skips_browser_middleware(self):
+        """Test API requests get no session, messages or csrf cookie
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+        self.assertFalse(hasattr(res.wsgi_request, '_messages'))
+        self.assertNotIn('csrftoken', res.cookies)
+
+    def test_api_post_without_csrf(self):
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_authenticate(self.user)
+
+        res = client.post(RECIPES_URL, {
+            'title': 'Salad', 'time_minutes': 5, 'price': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_admin_keeps_browser_middleware(self):
+        res = self.client.get(ADMIN_LOGIN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(res.wsgi_request, 'session'))
+        self.assertIn('csrftoken', res.cookies)
+
+    def test_admin_post_checks_csrf(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+        res = self.client.post(ADMIN_LOGIN_URL, {
+            'username': 'test@test.com', 'password': 'test123'})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bench_middleware(self):
+        out = io.StringIO()
+
+        call_command('bench_middleware', requests=10, stdout=out)
+
+        self.assertIn('SAVED', out.getvalue())
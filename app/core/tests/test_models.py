@@ -1,3 +1,4 @@
+import hashlib
 from unittest.mock import patch
 
 from core.models import Ingredient, Recipe, Tag, recipe_image_file_path
@@ -80,6 +81,7 @@ class ModelTest(TestCase):
 
         file_path = recipe_image_file_path(None, 'myimage.jpg')
 
-        exp_path = f'uploads/recipe/{uuid}.jpg'
+        digest = hashlib.md5(f'{uuid}.jpg'.encode()).hexdigest()
+        exp_path = f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{uuid}.jpg'
 
         self.assertEqual(file_path, exp_path)
@@ -0,0 +1,183 @@
+import datetime
+from io import StringIO
+
+from core.models import ChangeCursor, ChangeEvent, Ingredient, Recipe, Tag
+from core.outbox import Dispatcher
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse('exercise:recipe-list')
+CHANGES_URL = reverse('exercise:changes')
+
+
+def changes(**filters):
+    return list(ChangeEvent.objects.filter(**filters).order_by('id')
+                .values_list('model', 'object_id', 'action'))
+
+
+@override_settings(CHANGE_FEED_DELAY=0)
+class ChangeEventTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_recipe_changes_recorded(self):
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Cake',
+            'time_minutes': 30,
+            'price': 7.5,
+            'tags': [self.tag.pk],
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe_id = res.data['id']
+
+        self.client.delete(reverse('exercise:recipe-detail',
+                                   args=[recipe_id]))
+
+        self.assertEqual(changes(model='recipe'), [
+            ('recipe', recipe_id, ChangeEvent.CREATED),
+            ('recipe', recipe_id, ChangeEvent.UPDATED),
+            ('recipe', recipe_id, ChangeEvent.DELETED),
+        ])
+
+    def test_deleted_tag_updates_recipes(self):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=30, price=7.5)
+        recipe.tags.add(self.tag)
+        ChangeEvent.objects.all().delete()
+        tag_id = self.tag.pk
+
+        self.tag.delete()
+
+        self.assertEqual(changes(), [
+            ('recipe', recipe.pk, ChangeEvent.UPDATED),
+            ('tag', tag_id, ChangeEvent.DELETED),
+        ])
+
+    def test_rolled_back_change_leaves_no_event(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Ingredient.objects.create(user=self.user, name='Salt')
+                raise ValueError('rollback')
+
+        self.assertEqual(changes(model='ingredient'), [])
+
+    def test_feed_pages_with_cursor(self):
+        for name in ('Dessert', 'Salad'):
+            Tag.objects.create(user=self.user, name=name)
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        Tag.objects.create(user=other, name='Hidden')
+
+        res = self.client.get(CHANGES_URL, {'limit': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['object_id'] for event in
+                          res.data['results']],
+                         [self.tag.pk, self.tag.pk + 1])
+
+        res = self.client.get(CHANGES_URL, {'after': res.data['cursor']})
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['action'],
+                         ChangeEvent.CREATED)
+
+        cursor = res.data['cursor']
+        res = self.client.get(CHANGES_URL, {'after': cursor})
+        self.assertEqual(res.data, {'results': [], 'cursor': cursor})
+
+    def test_feed_waits_for_settled_events(self):
+        with self.settings(CHANGE_FEED_DELAY=60):
+            res = self.client.get(CHANGES_URL)
+
+        self.assertEqual(res.data['results'], [])
+        self.assertIsNone(res.data['cursor'])
+
+    def test_feed_invalid_cursor(self):
+        res = self.client.get(CHANGES_URL, {'after': 'nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_command(self):
+        ChangeEvent.objects.update(
+            created=timezone.now() - datetime.timedelta(days=8))
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        call_command('prune_change_events', stdout=StringIO())
+
+        self.assertEqual(changes(), [
+            ('tag', self.tag.pk + 1, ChangeEvent.CREATED)])
+
+
+@override_settings(CHANGE_FEED_DELAY=0)
+class DispatcherTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.batches = []
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+    def collect(self, events):
+        self.batches.append([event.object_id for event in events])
+
+    def test_batches_from_cursor(self):
+        dispatcher = Dispatcher([self.collect], batch_size=2)
+
+        while dispatcher.dispatch():
+            pass
+        Tag.objects.create(user=self.user, name='Tag 5')
+        Dispatcher([self.collect]).dispatch()
+
+        self.assertEqual([len(batch) for batch in self.batches],
+                         [2, 2, 1, 1])
+        self.assertEqual(dispatcher.handed, 5)
+        self.assertEqual(ChangeCursor.objects.get().event_id,
+                         ChangeEvent.objects.latest('id').id)
+
+    def test_failing_handler_retried_alone(self):
+        calls = []
+
+        def broken(events):
+            calls.append(len(events))
+            raise ValueError('down')
+
+        dispatcher = Dispatcher([broken, self.collect])
+        with self.assertLogs('core.outbox', 'ERROR'):
+            dispatcher.dispatch()
+            dispatcher.dispatch()
+
+        self.assertEqual(calls, [5, 5])
+        self.assertEqual([len(batch) for batch in self.batches], [5])
+
+    def test_command(self):
+        with self.settings(CHANGE_HANDLERS=[
+                'core.tests.test_outbox.collect_events']):
+            out = StringIO()
+            call_command('dispatch_changes', '--burst', stdout=out)
+
+        self.assertEqual(collected, 5)
+        self.assertIn('1 HANDLERS, 5 EVENTS HANDED', out.getvalue())
+
+
+collected = 0
+
+
+def collect_events(events):
+    global collected
+    collected += len(events)
@@ -0,0 +1,164 @@
+from unittest.mock import patch
+
+from core.db import replicas
+from core.db.replicas import ReplicaRouter, RoutingState
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+TAGS_URL = reverse('exercise:tag-list')
+RECIPES_URL = reverse('exercise:recipe-list')
+
+REPLICAS = {'replica_1': 1, 'replica_2': 3}
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_MAX_LAG=5)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.lags = {'replica_1': 0, 'replica_2': 0}
+        patcher = patch.object(replicas.replica_lag, 'get', self.lags.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, state=None):
+        token = replicas._state.set(state)
+        try:
+            return self.router.db_for_read(Tag)
+        finally:
+            replicas._state.reset(token)
+
+    def replica_state(self):
+        state = RoutingState()
+        state.replica_reads = True
+        return state
+
+    def test_primary_outside_replica_views(self):
+        self.assertEqual(self.route(), 'default')
+        self.assertEqual(self.route(RoutingState()), 'default')
+
+    def test_replica_kept_for_the_request(self):
+        state = self.replica_state()
+
+        picked = {self.route(state) for _ in range(10)}
+
+        self.assertEqual(len(picked), 1)
+        self.assertIn(picked.pop(), REPLICAS)
+
+    def test_weighted_choice(self):
+        with self.settings(DATABASE_REPLICAS={'replica_1': 0,
+                                              'replica_2': 1}):
+            picked = {self.route(self.replica_state()) for _ in range(20)}
+
+        self.assertEqual(picked, {'replica_2'})
+
+    def test_lagging_replicas_skipped(self):
+        """Test replicas behind or down are skipped, then the primary
+        """
+        self.lags.update(replica_1=30)
+        picked = {self.route(self.replica_state()) for _ in range(20)}
+        self.assertEqual(picked, {'replica_2'})
+
+        self.lags.update(replica_2=None)
+        self.assertEqual(self.route(self.replica_state()), 'default')
+
+    def test_primary_after_write(self):
+        state = self.replica_state()
+        token = replicas._state.set(state)
+        try:
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+        finally:
+            replicas._state.reset(token)
+
+        self.assertTrue(state.wrote)
+        self.assertEqual(self.route(state), 'default')
+
+    def test_primary_reads_block(self):
+        token = replicas._state.set(self.replica_state())
+        try:
+            with replicas.primary_reads():
+                self.assertEqual(self.router.db_for_read(Tag), 'default')
+            self.assertIn(self.router.db_for_read(Tag), REPLICAS)
+        finally:
+            replicas._state.reset(token)
+
+    def test_no_migrations_on_replicas(self):
+        self.assertIs(self.router.allow_migrate('replica_1', 'core'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaLagTests(SimpleTestCase):
+
+    def test_lag_measured_once_per_interval(self):
+        lag = replicas.ReplicaLag()
+        with patch.object(lag, 'measure', return_value=1.5) as measure:
+            self.assertEqual(lag.get('replica_1'), 1.5)
+            self.assertEqual(lag.get('replica_1'), 1.5)
+
+        measure.assert_called_once_with('replica_1')
+
+
+@override_settings(DATABASE_REPLICAS={'replica_1': 1})
+class ReplicaReadsApiTests(TransactionTestCase):
+    """The test database stands in for the replica, reads in a transaction
+    go to the primary so the tests do not run in one
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        patcher = patch('core.db.replicas.choose_replica',
+                        return_value='default')
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_from_replica(self):
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.choose_replica.assert_called_once()
+
+    def test_no_replicas_configured(self):
+        with self.settings(DATABASE_REPLICAS={}):
+            self.client.get(RECIPES_URL)
+
+        self.choose_replica.assert_not_called()
+
+    def test_writes_pin_user_to_primary(self):
+        """Test the user reads their writes from the primary for a while
+        """
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.choose_replica.assert_not_called()
+        self.assertTrue(replicas.is_pinned(self.user.pk))
+
+        caches['default'].clear()  # the pin and the cached list
+        self.client.get(TAGS_URL)
+        self.choose_replica.assert_called_once()
+
+    def test_other_users_keep_reading_replicas(self):
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        client2 = APIClient()
+        client2.force_authenticate(user2)
+
+        client2.get(TAGS_URL)
+
+        self.choose_replica.assert_called_once()
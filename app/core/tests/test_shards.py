@@ -0,0 +1,313 @@
+import io
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from core.db import shards
+from core.db.shards import SHARD_ID_BLOCK, ShardMap, ShardRouter, \
+    pinned_shard, user_shard
+from core.models import Ingredient, Recipe, Tag, UserShard, sharded_path
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+from images.storage import store_recipe_image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+SHARD = 'shard_test'
+TAGS_URL = reverse('exercise:tag-list')
+ASYNC_TAGS_URL = reverse('exercise:async-tag-list')
+
+
+class ShardMapTests(SimpleTestCase):
+
+    def test_users_spread_over_shards(self):
+        shard_map = ShardMap(['default', 'shard_1', 'shard_2'], 64)
+
+        counts = {}
+        for user_id in range(3000):
+            shard = shard_map.shard_for(user_id)
+            counts[shard] = counts.get(shard, 0) + 1
+
+        self.assertEqual(set(counts), {'default', 'shard_1', 'shard_2'})
+        for count in counts.values():
+            self.assertGreater(count, 600)
+
+    def test_new_shard_only_takes_users(self):
+        """Test adding a shard moves users to it and nowhere else
+        """
+        before = ShardMap(['default', 'shard_1', 'shard_2'], 64)
+        after = ShardMap(['default', 'shard_1', 'shard_2', 'shard_3'], 64)
+
+        moved = [user_id for user_id in range(3000)
+                 if before.shard_for(user_id) != after.shard_for(user_id)]
+
+        self.assertTrue(all(after.shard_for(user_id) == 'shard_3'
+                            for user_id in moved))
+        self.assertLess(len(moved), 3000 * 0.4)
+
+    def test_single_shard(self):
+        with self.settings(DATABASE_SHARDS=['default']):
+            self.assertEqual(user_shard(42), ('default', False))
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard_1'])
+class ShardRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ShardRouter()
+
+    def test_pinned_shard(self):
+        self.assertIsNone(self.router.db_for_read(Tag))
+        with pinned_shard('shard_1'):
+            self.assertEqual(self.router.db_for_read(Tag), 'shard_1')
+            self.assertEqual(self.router.db_for_write(Recipe), 'shard_1')
+            self.assertIsNone(self.router.db_for_read(get_user_model()))
+        with pinned_shard('default'):
+            self.assertIsNone(self.router.db_for_write(Tag))
+
+    def test_instance_shard(self):
+        """Test rows follow the instance they relate to, sharded or not
+        """
+        tag = Tag()
+        tag._state.db = 'shard_1'
+        user = get_user_model()()
+        user._state.db = 'default'
+
+        with pinned_shard('default'):
+            self.assertEqual(
+                self.router.db_for_read(Recipe, instance=tag), 'shard_1')
+        with pinned_shard('shard_1'):
+            self.assertEqual(
+                self.router.db_for_read(Recipe, instance=user), 'shard_1')
+            self.assertIsNone(
+                self.router.db_for_read(get_user_model(), instance=tag))
+
+
+@override_settings(DATABASE_SHARDS=['default', SHARD])
+class ShardedTestCase(TransactionTestCase):
+    """Runs against a second test database standing in for a shard, made
+    here as the test runner only sets up the ones in the settings
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = {'default', SHARD}
+        connections.databases[SHARD] = dict(connections.databases['default'])
+        connections.ensure_defaults(SHARD)
+        connections.prepare_test_settings(SHARD)
+        super().setUpClass()
+        cls.old_name = connections[SHARD].settings_dict['NAME']
+        connections[SHARD].creation.create_test_db(verbosity=0,
+                                                   serialize=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[SHARD].creation.destroy_test_db(cls.old_name, verbosity=0)
+        del connections[SHARD]
+        del connections.databases[SHARD]
+        super().tearDownClass()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+
+    def move(self, shard):
+        call_command('move_user', str(self.user.pk), shard, settle=0,
+                     stdout=StringIO())
+
+
+class ShardedApiTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_requests_pinned_to_user_shard(self):
+        UserShard.objects.create(user=self.user, shard=SHARD)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Tag.objects.using(SHARD).filter(name='Vegan')
+                        .exists())
+        self.assertFalse(Tag.objects.filter(name='Vegan').exists())
+        res = self.client.get(TAGS_URL)
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+
+    def test_async_views_pinned(self):
+        UserShard.objects.create(user=self.user, shard=SHARD)
+        Tag.objects.using(SHARD).create(user=self.user, name='Vegan')
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(ASYNC_TAGS_URL)
+
+        self.assertEqual([tag['name'] for tag in res.json()], ['Vegan'])
+
+    def test_writes_refused_while_locked(self):
+        UserShard.objects.create(user=self.user, shard=SHARD, locked=True)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', res)
+        self.assertEqual(self.client.get(TAGS_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_ids_apart_on_each_shard(self):
+        tag = Tag.objects.using(SHARD).create(user=self.user, name='Vegan')
+
+        self.assertGreater(tag.pk, SHARD_ID_BLOCK)
+
+    def test_user_deletion_reaches_shards(self):
+        Tag.objects.using(SHARD).create(user=self.user, name='Vegan')
+
+        self.user.delete()
+
+        self.assertFalse(Tag.objects.using(SHARD).exists())
+
+
+class MoveUserTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=2)
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.salt)
+
+    def assert_on(self, shard):
+        recipe = Recipe.objects.using(shard).get(pk=self.recipe.pk)
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(list(recipe.tags.values_list('pk', 'name')),
+                         [(self.tag.pk, 'Vegan')])
+        self.assertEqual(list(recipe.ingredients.values_list('pk')),
+                         [(self.salt.pk,)])
+        self.assertEqual(recipe.summary.tag_ids, [self.tag.pk])
+        self.assertEqual(user_shard(self.user.pk), (shard, False))
+
+    def test_move_and_back(self):
+        """Test the rows keep their ids and leave the old shard
+        """
+        self.move(SHARD)
+
+        self.assert_on(SHARD)
+        self.assertFalse(Recipe.objects.using('default').exists())
+        self.assertFalse(Tag.objects.using('default').exists())
+
+        self.move('default')
+
+        self.assert_on('default')
+        self.assertFalse(Recipe.objects.using(SHARD).exists())
+        self.assertFalse(Recipe.tags.through.objects.using(SHARD).exists())
+
+    def test_interrupted_move_resumes(self):
+        """Test stale and leftover copies on the target are fixed
+        """
+        UserShard.objects.create(user=self.user, shard='default',
+                                 moving_to=SHARD)
+        Tag.objects.using(SHARD).create(pk=self.tag.pk, user=self.user,
+                                        name='Old')
+        Tag.objects.using(SHARD).create(user=self.user, name='Gone')
+
+        self.move(SHARD)
+
+        self.assert_on(SHARD)
+        self.assertEqual(list(Tag.objects.using(SHARD)
+                              .values_list('name', flat=True)), ['Vegan'])
+
+    def test_synced_a_page_at_a_time(self):
+        UserShard.objects.create(user=self.user, shard='default',
+                                 moving_to=SHARD)
+        for name in ('Old', 'Gone'):
+            Tag.objects.using(SHARD).create(user=self.user, name=name)
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        call_command('move_user', str(self.user.pk), SHARD, settle=0,
+                     batch_size=1, stdout=StringIO())
+
+        self.assert_on(SHARD)
+        self.assertEqual(sorted(Tag.objects.using(SHARD)
+                                .values_list('name', flat=True)),
+                         ['Dessert', 'Vegan'])
+
+    def test_move_called_off(self):
+        UserShard.objects.create(user=self.user, shard='default',
+                                 moving_to=SHARD, locked=True)
+        Tag.objects.using(SHARD).create(user=self.user, name='Partial')
+
+        self.move('default')
+
+        self.assert_on('default')
+        self.assertFalse(Tag.objects.using(SHARD).exists())
+
+    def test_unknown_shard(self):
+        with self.assertRaises(Exception):
+            self.move('nowhere')
+
+    def test_ring_shard_drops_override(self):
+        ring = shards.get_shard_map().shard_for(self.user.pk)
+        other = SHARD if ring == 'default' else 'default'
+        UserShard.objects.create(user=self.user, shard=other)
+        if other == SHARD:
+            self.move(other)  # nothing on the shard yet, copy there first
+
+        self.move(ring)
+
+        self.assertFalse(UserShard.objects.filter(user=self.user).exists())
+        self.assertEqual(user_shard(self.user.pk), (ring, False))
+
+
+class ShardedImageTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_settings.enable()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(self.media_settings.disable)
+        self.recipe = Recipe.objects.using(SHARD).create(
+            user=self.user, title='Soup', time_minutes=5, price=2)
+
+    def test_shard_recipe_images_on_shards(self):
+        path = os.path.join(self.media_root, 'uploads/recipe/a.jpg')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'image')
+        Recipe.objects.using(SHARD).filter(pk=self.recipe.pk).update(
+            image='uploads/recipe/a.jpg')
+
+        call_command('shard_recipe_images', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name,
+                         sharded_path('uploads/recipe/', 'a.jpg'))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_image_released_on_shard_commit(self):
+        image = io.BytesIO(b'image bytes')
+        image.name, image.size = 'photo.jpg', 11
+        name = store_recipe_image(self.recipe, image).name
+
+        with transaction.atomic(using=SHARD):
+            self.recipe.delete()
+            self.assertTrue(default_storage.exists(name))
+
+        self.assertFalse(default_storage.exists(name))
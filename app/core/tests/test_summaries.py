@@ -0,0 +1,128 @@
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+
+from core.models import Ingredient, Recipe, RecipeSummary, Tag
+from django.contrib.auth import get_user_model
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+summary_migration = import_module('core.migrations.0014_recipe_summary')
+
+
+class RecipeSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=30, price=7.5)
+
+    def summary(self):
+        return RecipeSummary.objects.get(pk=self.recipe.pk)
+
+    def test_summary_follows_recipe(self):
+        summary = self.summary()
+        self.assertEqual(summary.title, 'Cake')
+        self.assertEqual(summary.user, self.user)
+        self.assertEqual(summary.tag_ids, [])
+
+        self.recipe.title = 'Cheesecake'
+        self.recipe.save()
+
+        self.assertEqual(self.summary().title, 'Cheesecake')
+
+    def test_summary_follows_links(self):
+        self.recipe.tags.add(self.dessert, self.vegan)
+        self.recipe.ingredients.add(self.salt)
+
+        summary = self.summary()
+        self.assertEqual(summary.tag_ids, sorted([self.vegan.pk,
+                                                  self.dessert.pk]))
+        self.assertEqual(summary.tag_count, 2)
+        self.assertEqual(summary.ingredient_ids, [self.salt.pk])
+
+        self.recipe.tags.remove(self.vegan)
+        self.assertEqual(self.summary().tag_ids, [self.dessert.pk])
+        self.recipe.tags.clear()
+        self.assertEqual(self.summary().tag_count, 0)
+
+    def test_summary_follows_reverse_links(self):
+        """Test links changed from the tag side refresh the recipes
+        """
+        self.vegan.recipe_set.add(self.recipe)
+        self.assertEqual(self.summary().tag_ids, [self.vegan.pk])
+
+        self.vegan.recipe_set.clear()
+        self.assertEqual(self.summary().tag_ids, [])
+
+    def test_deleted_tag_leaves_summaries(self):
+        self.recipe.tags.add(self.vegan, self.dessert)
+
+        self.vegan.delete()
+
+        self.assertEqual(self.summary().tag_ids, [self.dessert.pk])
+
+    def test_deleted_recipe_takes_summary(self):
+        self.recipe.delete()
+
+        self.assertFalse(RecipeSummary.objects.exists())
+
+    def test_overlap_lookup(self):
+        self.recipe.tags.add(self.vegan)
+        other = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=3)
+        other.tags.add(self.dessert)
+
+        found = RecipeSummary.objects.filter(
+            tag_ids__overlap=[self.vegan.pk, 0])
+        self.assertEqual([summary.title for summary in found], ['Cake'])
+        self.assertFalse(RecipeSummary.objects.filter(tag_ids__overlap=[]))
+
+    def test_rebuild_command(self):
+        """Test the summaries are made again after writes without signals
+        """
+        Recipe.objects.filter(pk=self.recipe.pk).update(title='Pie')
+        Recipe.tags.through.objects.create(recipe=self.recipe, tag=self.vegan)
+        RecipeSummary.objects.all().delete()
+
+        call_command('rebuild_recipe_summaries', stdout=StringIO())
+
+        summary = self.summary()
+        self.assertEqual(summary.title, 'Pie')
+        self.assertEqual(summary.tag_ids, [self.vegan.pk])
+
+    def test_rebuild_over_summaries(self):
+        """Test a rebuild writes over the summaries there, batch by batch"""
+        cake = self.recipe
+        Recipe.objects.create(user=self.user, title='Pie', time_minutes=5,
+                              price=2)
+        Recipe.objects.filter(pk=cake.pk).update(title='Tart')
+
+        call_command('rebuild_recipe_summaries', '--batch-size', '1',
+                     stdout=StringIO())
+
+        self.assertEqual(
+            sorted(RecipeSummary.objects.values_list('title', flat=True)),
+            ['Pie', 'Tart'])
+
+    def test_migration_backfills(self):
+        """Test the migration summarizes the recipes already there"""
+        self.recipe.tags.add(self.vegan)
+        RecipeSummary.objects.all().delete()
+        pie = Recipe.objects.create(user=self.user, title='Pie',
+                                    time_minutes=5, price=2)
+
+        summary_migration.backfill_summaries(
+            apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(self.summary().tag_ids, [self.vegan.pk])
+        self.assertEqual(self.summary().tag_count, 1)
+        self.assertEqual(RecipeSummary.objects.get(pk=pie.pk).title, 'Pie')
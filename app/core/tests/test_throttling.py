@@ -0,0 +1,150 @@
+from unittest.mock import patch
+
+from core import throttling
+from core.throttling import BucketThrottle
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse('exercise:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+RATES = {
+    'anon': '100/min',
+    'user': '3/min',
+    'auth': '2/min',
+    'recipe_search': '1/min',
+    'image_upload': '100/min',
+}
+
+
+@patch.object(BucketThrottle, 'THROTTLE_RATES', RATES)
+class BucketThrottleTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        throttling._denied.clear()
+        throttling._expires.clear()
+        throttling._fallback.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        caches['default'].clear()
+        throttling._denied.clear()
+        throttling._expires.clear()
+
+    def test_user_budget(self):
+        """Test a user past its budget gets 429 with Retry-After
+        """
+        for _ in range(3):
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_users_counted_apart(self):
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        for _ in range(3):
+            self.client.get(RECIPES_URL)
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_search_budget(self):
+        """Test filtered listings use the stricter search budget
+        """
+        res = self.client.get(RECIPES_URL, {'tags': '1'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL, {'tags': '1'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_login_budget_per_ip(self):
+        client = APIClient()
+        payload = {'email': 'test@test.com', 'password': 'wrong'}
+        for _ in range(2):
+            res = client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_denied_without_round_trip(self):
+        """Test clients that ran out are rejected without the cache
+        """
+        for _ in range(4):
+            self.client.get(RECIPES_URL)
+
+        with patch('core.throttling.caches') as mock_caches:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        mock_caches.__getitem__.assert_not_called()
+
+    def test_refill(self):
+        """Test a token comes back every period / num, with no second
+        budget at the start of the next minute
+        """
+        clock = [119.9]
+        with patch.object(BucketThrottle, 'timer', lambda self: clock[0]):
+            for _ in range(3):
+                self.client.get(RECIPES_URL)
+            clock[0] = 120.1
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(res['Retry-After'], '20')
+
+            clock[0] = 139.9
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_idle_bucket_full(self):
+        """Test an idle client gets its whole budget back, not more
+        """
+        clock = [0.0]
+        with patch.object(BucketThrottle, 'timer', lambda self: clock[0]):
+            self.client.get(RECIPES_URL)
+            clock[0] = 100.0
+            codes = [self.client.get(RECIPES_URL).status_code
+                     for _ in range(4)]
+
+        self.assertEqual(codes, [status.HTTP_200_OK] * 3 +
+                         [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_cache_down(self):
+        """Test the counters fall back to the process when the cache fails
+        """
+        with patch('core.throttling.caches') as mock_caches:
+            mock_caches.__getitem__.return_value.incr.side_effect = \
+                ConnectionError
+            for _ in range(3):
+                res = self.client.get(RECIPES_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
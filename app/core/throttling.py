@@ -0,0 +1,141 @@
+"""Token buckets per client and scope, kept as atomic counters in the
+shared cache
+
+Each client gets a bucket per scope of `num` tokens refilled at `num` per
+period, a request takes one: a client may burst `num` requests at once,
+then one every period / `num`. The bucket is stored as the time it is
+full again (GCRA, the theoretical arrival time). A request adds one
+token's worth of time with a single incr and goes through while that
+time stays within one period from now. Once a client was idle the time
+lags behind now, the first request to see it brings it forward under a
+short lock taken with add.
+
+Times are integers in 1/num milliseconds, so one token is the period in
+milliseconds whatever the rate.
+
+Clients that ran out are remembered in process until their next token,
+so rejecting them costs no round trip at all. When the shared cache is
+down the buckets fall back to a cache in this process.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.throttling import SimpleRateThrottle
+
+SYNC_LEASE = 1
+MEMO_ENTRIES = 10000
+
+_fallback = LocMemCache('throttle-fallback',
+                        {'OPTIONS': {'MAX_ENTRIES': MEMO_ENTRIES}})
+_denied = {}  # key -> time of the next token of a client that ran out
+_expires = {}  # key -> expiry of the bucket last set by this process
+_memo_lock = threading.Lock()
+
+
+def _remember(memo, key, until, now):
+    with _memo_lock:
+        memo[key] = until
+        if len(memo) > MEMO_ENTRIES:
+            for old in [k for k, end in memo.items() if end <= now]:
+                del memo[old]
+
+
+def _recall(memo, key):
+    with _memo_lock:
+        return memo.get(key)
+
+
+def view_scope(view):
+    """Return the throttle scope of a view
+
+    Views can decide per request with get_throttle_scope(), map actions to
+    scopes with throttle_scopes or set a single throttle_scope.
+    """
+    get_scope = getattr(view, 'get_throttle_scope', None)
+    if get_scope is not None:
+        return get_scope()
+    scopes = getattr(view, 'throttle_scopes', {})
+    return scopes.get(getattr(view, 'action', None),
+                      getattr(view, 'throttle_scope', None))
+
+
+class BucketThrottle(SimpleRateThrottle):
+    """Throttle per user, or per IP for anonymous requests, and scope, with
+    token buckets
+
+    Views without a scope use the "user" or "anon" budgets.
+    """
+
+    def __init__(self):
+        # the rate depends on the view, it is read in allow_request
+        pass
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        self.scope = view_scope(view) or (
+            'user' if request.user and request.user.is_authenticated
+            else 'anon')
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        now = self.timer()
+        self.key = self.get_cache_key(request, view)
+        self.next_token = _recall(_denied, self.key)
+        if self.next_token is not None and self.next_token > now:
+            return False
+
+        try:
+            self.next_token = self._take(
+                caches[settings.THROTTLE_CACHE], now)
+        except Exception:
+            self.next_token = self._take(_fallback, now)
+        if self.next_token is None:
+            return True
+        _remember(_denied, self.key, self.next_token, now)
+        return False
+
+    def _take(self, cache, now):
+        """Take a token from the bucket, return None or, when it is empty,
+        the time of the next token
+        """
+        unit = self.num_requests * 1000  # per second
+        cost = self.duration * 1000
+        burst = self.num_requests * cost
+        # the bucket outlives its full time, an expired one was full
+        ttl = 2 * self.duration
+        moment = int(now * unit)
+
+        try:
+            full_at = cache.incr(self.key, cost)
+        except ValueError:
+            if cache.add(self.key, moment + cost, ttl):
+                _remember(_expires, self.key, now + ttl, now)
+                return None
+            full_at = cache.incr(self.key, cost)
+
+        if full_at - cost < moment:
+            # idle client, its bucket is full
+            if cache.add(f'{self.key}:sync', 1, SYNC_LEASE):
+                cache.incr(self.key, moment - (full_at - cost))
+            full_at = moment + cost
+        elif full_at - moment > burst:
+            cache.decr(self.key, cost)
+            return (full_at - burst) / unit
+
+        if full_at / unit > (_recall(_expires, self.key) or 0):
+            cache.touch(self.key, ttl)
+            _remember(_expires, self.key, now + ttl, now)
+        return None
+
+    def wait(self):
+        return max(self.next_token - self.timer(), 0)
@@ -0,0 +1,31 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from user.authentication import (AccessTokenAuthentication,
+                                 CachedTokenAuthentication)
+
+from .db.pool import pool_stats
+from .jobs import queue_stats
+
+
+class DatabasePoolView(APIView):
+    """Connection pool metrics of the process serving the request
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+class JobQueueView(APIView):
+    """Background job counts per status and how late the oldest due one
+    is, for every worker
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(queue_stats())
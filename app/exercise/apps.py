@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ExerciseConfig(AppConfig):
     name = 'exercise'
+
+    def ready(self):
+        from . import signals  # noqa: F401
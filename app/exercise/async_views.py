@@ -0,0 +1,126 @@
+"""Async versions of the read endpoints, for ASGI servers
+
+They answer with the same payloads as the viewsets in views.py, the
+queries that do not depend on each other run concurrently.
+"""
+from core.async_api import async_api_view, run_queries, run_query
+from core.models import Ingredient, Recipe, RecipeSummary, Tag
+from django.db.models import Avg, Count, F, Q
+from django.http import JsonResponse
+from user.authentication import (AccessTokenAuthentication,
+                                 CachedTokenAuthentication)
+
+from .caching import RenderedJSONResponse, cached_detail, cached_for_user
+
+AUTHENTICATION_CLASSES = (AccessTokenAuthentication,
+                          CachedTokenAuthentication)
+RECIPE_FIELDS = ('id', 'title', 'time_minutes', 'link', 'price', 'public')
+
+
+def _params_to_ints(qs):
+    return [int(str_id) for str_id in qs.split(',')]
+
+
+def _recipe_summaries(request):
+    """Same filtering as RecipeViewSet.get_queryset for the list, from the
+    summaries with the tag and ingredient ids in one query
+    """
+    queryset = RecipeSummary.objects.filter(user=request.user)
+    tags = request.GET.get('tags')
+    ingredients = request.GET.get('ingredients')
+    if tags:
+        queryset = queryset.filter(tag_ids__overlap=_params_to_ints(tags))
+    if ingredients:
+        queryset = queryset.filter(
+            ingredient_ids__overlap=_params_to_ints(ingredients))
+    rows = queryset.order_by('-recipe').values(
+        *RECIPE_FIELDS[1:], 'tag_ids', 'ingredient_ids', id=F('recipe_id'))
+    return [_recipe_data(row, row['ingredient_ids'], row['tag_ids'])
+            for row in rows]
+
+
+def _recipe_data(recipe, ingredients, tags):
+    return {
+        'id': recipe['id'],
+        'title': recipe['title'],
+        'time_minutes': recipe['time_minutes'],
+        'ingredients': ingredients,
+        'link': recipe['link'],
+        'tags': tags,
+        'price': str(recipe['price']),
+        'public': recipe['public'],
+    }
+
+
+@async_api_view(AUTHENTICATION_CLASSES)
+async def recipe_list(request):
+    """List the recipes of the user
+    """
+    return JsonResponse(await run_query(_recipe_summaries, request),
+                        safe=False)
+
+
+@async_api_view(AUTHENTICATION_CLASSES)
+async def recipe_detail(request, pk):
+    detail = await run_query(cached_detail, pk, request.user.pk)
+    if detail is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return RenderedJSONResponse(detail)
+
+
+def _named_list(model, request):
+    """Same filtering and cache as BaseViewSet.list
+    """
+    assigned_only = int(request.GET.get('assigned_only', 0))
+    queryset = model.objects.all()
+    if assigned_only:
+        queryset = queryset.assigned()
+    return cached_for_user(
+        request.user.pk, f'{model._meta.model_name}-list:{assigned_only}',
+        lambda: list(queryset.filter(user=request.user).order_by('-name')
+                     .values('id', 'name')))
+
+
+@async_api_view(AUTHENTICATION_CLASSES)
+async def tag_list(request):
+    return JsonResponse(await run_query(_named_list, Tag, request),
+                        safe=False)
+
+
+@async_api_view(AUTHENTICATION_CLASSES)
+async def ingredient_list(request):
+    return JsonResponse(await run_query(_named_list, Ingredient, request),
+                        safe=False)
+
+
+def _recipe_stats(user):
+    return cached_for_user(user.pk, 'stats', lambda: Recipe.objects.filter(
+        user=user).aggregate(
+            recipes=Count('id'),
+            public_recipes=Count('id', filter=Q(public=True)),
+            average_time_minutes=Avg('time_minutes'),
+    ))
+
+
+@async_api_view(AUTHENTICATION_CLASSES)
+async def dashboard(request):
+    """Everything the home screen shows in one response
+
+    The user comes with the authentication, the tags, ingredients, recipes
+    and stats are independent queries sent at the same time, the response
+    takes as long as the slowest one.
+    """
+    tags, ingredients, stats, recipes = await run_queries(
+        lambda: _named_list(Tag, request),
+        lambda: _named_list(Ingredient, request),
+        lambda: _recipe_stats(request.user),
+        lambda: _recipe_summaries(request),
+    )
+    stats.update(tags=len(tags), ingredients=len(ingredients))
+    return JsonResponse({
+        'user': {'email': request.user.email, 'name': request.user.name},
+        'tags': tags,
+        'ingredients': ingredients,
+        'recipes': recipes,
+        'stats': stats,
+    })
@@ -0,0 +1,87 @@
+"""Cached renderings of the recipe data, see core.cache
+
+The detail of a recipe is kept as its JSON, under a version of the recipe,
+the lists and stats of a user under a version of their data. The signals
+of exercise.signals set new versions once the changes are committed, the
+values of the old ones are never served again, even one computed from
+the data before a change and stored after it.
+
+The values are kept per user and rendered from what the user owns, read
+from the primary (see core.db.replicas) on the shard the user is pinned
+to, never from a replica behind the last change.
+"""
+import json
+
+from core.cache import bump_versions, get_or_compute, get_version
+from core.db.replicas import primary_reads
+from core.models import Recipe
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.functional import cached_property
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import RecipeDetailSerializer
+
+DETAIL_PREFIX = 'recipe-detail:'
+DETAIL_VERSION_PREFIX = 'recipe-detail-version:'
+USER_DATA_PREFIX = 'recipe-user-data:'
+USER_VERSION_PREFIX = 'recipe-user-version:'
+
+
+class RenderedJSONResponse(HttpResponse):
+    """JSON rendered beforehand, sent as it is
+
+    data decodes it again for the callers reading it like on the
+    responses of DRF.
+    """
+
+    def __init__(self, content, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content, **kwargs)
+
+    @cached_property
+    def data(self):
+        return json.loads(self.content)
+
+
+def invalidate_details(recipe_ids):
+    bump_versions([f'{DETAIL_VERSION_PREFIX}{recipe_id}'
+                   for recipe_id in recipe_ids],
+                  settings.RECIPE_DETAIL_CACHE)
+
+
+def render_detail(recipe_id, user_id):
+    """JSON bytes of the detail of a recipe of the user, None when they
+    have no such recipe
+    """
+    with primary_reads():
+        recipe = Recipe.objects.filter(pk=recipe_id, user=user_id).first()
+        if recipe is None:
+            return None
+        return JSONRenderer().render(RecipeDetailSerializer(recipe).data)
+
+
+def cached_detail(recipe_id, user_id):
+    """JSON bytes of the detail of a recipe of the user, None when they
+    have no such recipe
+    """
+    alias = settings.RECIPE_DETAIL_CACHE
+    version = get_version(f'{DETAIL_VERSION_PREFIX}{recipe_id}', alias)
+    return get_or_compute(f'{DETAIL_PREFIX}{user_id}:{recipe_id}:{version}',
+                          lambda: render_detail(recipe_id, user_id),
+                          settings.RECIPE_DETAIL_CACHE_TTL, alias)
+
+
+def invalidate_user_data(user_ids):
+    bump_versions([f'{USER_VERSION_PREFIX}{user_id}' for user_id in user_ids],
+                  settings.RECIPE_USER_CACHE)
+
+
+def cached_for_user(user_id, name, compute):
+    """The value computed by compute() from the data of the user, kept
+    until it changes
+    """
+    alias = settings.RECIPE_USER_CACHE
+    version = get_version(f'{USER_VERSION_PREFIX}{user_id}', alias)
+    return get_or_compute(f'{USER_DATA_PREFIX}{user_id}:{name}:{version}',
+                          compute, settings.RECIPE_USER_CACHE_TTL, alias)
@@ -1,4 +1,7 @@
-from core.models import Ingredient, Recipe, Tag
+from core.models import ChangeEvent, Ingredient, Recipe, RecipeSummary, Tag
+from core.outbox import encode_cursor
+from images.storage import similar_recipes, store_recipe_image
+from images.validation import RecipeImageField
 from rest_framework import serializers
 
 
@@ -31,10 +34,30 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'time_minutes',
-                  'ingredients', 'link', 'tags', 'price',)
+                  'ingredients', 'link', 'tags', 'price', 'public',)
         read_only_fields = ('id',)
 
 
+class RecipeSummarySerializer(serializers.ModelSerializer):
+    """Serialize a recipe summary like RecipeSerializer does its recipe
+    """
+    id = serializers.IntegerField(source='recipe_id', read_only=True)
+    ingredients = serializers.ListField(
+        source='ingredient_ids',
+        child=serializers.IntegerField(),
+        read_only=True
+    )
+    tags = serializers.ListField(
+        source='tag_ids',
+        child=serializers.IntegerField(),
+        read_only=True
+    )
+
+    class Meta:
+        model = RecipeSummary
+        fields = RecipeSerializer.Meta.fields
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail
     """
@@ -49,7 +72,35 @@ class RecipeDetailSerializer(RecipeSerializer):
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer to uploading images to recipes
     """
+    image = RecipeImageField()
+    # checked from the header and stripped of its metadata, never decoded
+    similar_recipes = serializers.SerializerMethodField()
+    # recipes of the user with a near duplicate image
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'similar_recipes')
         read_only_fields = ('id',)
+
+    def update(self, instance, validated_data):
+        """Attach the image sharing the file with identical uploads
+        """
+        blob = store_recipe_image(instance, validated_data['image'])
+        instance.similar_recipes = similar_recipes(instance, blob)
+        return instance
+
+    def get_similar_recipes(self, obj):
+        return getattr(obj, 'similar_recipes', [])
+
+
+class ChangeEventSerializer(serializers.ModelSerializer):
+    """Serializer for the change feed, the cursor resumes after the event
+    """
+    cursor = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChangeEvent
+        fields = ('cursor', 'model', 'object_id', 'action', 'created')
+
+    def get_cursor(self, event):
+        return encode_cursor(event)
@@ -0,0 +1,77 @@
+from core.models import Ingredient, Recipe, Tag
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from .caching import invalidate_details, invalidate_user_data
+
+
+def _invalidate_on_commit(using, recipe_ids=(), user_id=None):
+    """New versions now, for the reads later in the transaction, and after
+    the commit, for the values other workers computed meanwhile from the
+    data before it
+    """
+    recipe_ids = list(recipe_ids)
+
+    def invalidate():
+        if recipe_ids:
+            invalidate_details(recipe_ids)
+        if user_id is not None:
+            invalidate_user_data([user_id])
+    invalidate()
+    transaction.on_commit(invalidate, using=using)
+
+
+def _linked_recipes(instance, using):
+    through = type(instance).recipe_set.through
+    return through.objects.using(using).filter(
+        **{instance._meta.model_name: instance}) \
+        .values_list('recipe_id', flat=True)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, using, **kwargs):
+    _invalidate_on_commit(using, [instance.pk], instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_relinked_recipes(sender, instance, action, reverse, pk_set,
+                                using, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            _invalidate_on_commit(using, [instance.pk], instance.user_id)
+    elif action == 'pre_clear':
+        # pk_set is None on clear, the recipes are only known before
+        _invalidate_on_commit(using, _linked_recipes(instance, using),
+                              instance.user_id)
+    elif action in ('post_add', 'post_remove'):
+        _invalidate_on_commit(using, pk_set, instance.user_id)
+
+
+@receiver(post_init, sender=Tag)
+@receiver(post_init, sender=Ingredient)
+def remember_name(sender, instance, **kwargs):
+    instance._loaded_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def invalidate_saved(sender, instance, created, using, **kwargs):
+    """The details show the names of the tags and ingredients, the lists
+    of the user all of them
+    """
+    renamed = not created and instance.name != instance._loaded_name
+    _invalidate_on_commit(
+        using, _linked_recipes(instance, using) if renamed else (),
+        instance.user_id)
+    instance._loaded_name = instance.name
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_unlinked(sender, instance, using, **kwargs):
+    _invalidate_on_commit(using, _linked_recipes(instance, using),
+                          instance.user_id)
@@ -0,0 +1,170 @@
+import threading
+from unittest.mock import patch
+
+from core.models import Ingredient, Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TransactionTestCase
+from django.urls import reverse
+from exercise import async_views
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user.authentication import get_token_cache
+
+ASYNC_RECIPES_URL = reverse('exercise:async-recipe-list')
+ASYNC_TAGS_URL = reverse('exercise:async-tag-list')
+ASYNC_INGREDIENTS_URL = reverse('exercise:async-ingredient-list')
+ASYNC_ME_URL = reverse('user:async-me')
+DASHBOARD_URL = reverse('exercise:dashboard')
+RECIPES_URL = reverse('exercise:recipe-list')
+TAGS_URL = reverse('exercise:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('exercise:recipe-detail', args=[recipe_id])
+
+
+def async_detail_url(recipe_id):
+    return reverse('exercise:async-recipe-detail', args=[recipe_id])
+
+
+class AsyncReadApiTests(TransactionTestCase):
+    """Test the async read endpoints against the sync viewsets
+
+    The queries run in worker threads on their own connections, the data
+    has to be committed for them to see it.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123',
+            name='name'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=30, price=7.5)
+        self.recipe.tags.add(self.vegan, self.dessert)
+        self.recipe.ingredients.add(self.salt)
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=3)
+
+    def tearDown(self):
+        get_token_cache().clear()
+
+    def test_recipe_list_matches_viewset(self):
+        res = self.client.get(ASYNC_RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = self.client.get(RECIPES_URL).json()
+        key = lambda recipe: recipe['id']  # noqa: E731
+        for recipe in expected:
+            recipe['tags'].sort()
+        got = res.json()
+        for recipe in got:
+            recipe['tags'].sort()
+        self.assertEqual(sorted(got, key=key), sorted(expected, key=key))
+
+    def test_recipe_list_filter(self):
+        res = self.client.get(ASYNC_RECIPES_URL,
+                              {'tags': f'{self.vegan.id}'})
+
+        self.assertEqual([r['title'] for r in res.json()], ['Cake'])
+
+    def test_recipe_detail_matches_viewset(self):
+        res = self.client.get(async_detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = self.client.get(detail_url(self.recipe.id)).json()
+        got = res.json()
+        for data in (got, expected):
+            data['tags'].sort(key=lambda tag: tag['id'])
+        self.assertEqual(got, expected)
+
+    def test_recipe_detail_other_user(self):
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        recipe = Recipe.objects.create(
+            user=user2, title='Other', time_minutes=1, price=1)
+
+        res = self.client.get(async_detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_list_matches_viewset(self):
+        res = self.client.get(ASYNC_TAGS_URL)
+
+        self.assertEqual(res.json(), self.client.get(TAGS_URL).json())
+
+    def test_ingredient_list(self):
+        res = self.client.get(ASYNC_INGREDIENTS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.json(), [{'id': self.salt.id, 'name': 'Salt'}])
+
+    def test_me(self):
+        res = self.client.get(ASYNC_ME_URL)
+
+        self.assertEqual(res.json(), {'email': 'test@test.com',
+                                      'name': 'name'})
+
+    def test_authentication_required(self):
+        res = APIClient().get(ASYNC_RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', res)
+
+    def test_read_only(self):
+        res = self.client.post(ASYNC_RECIPES_URL, {'title': 'New'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_dashboard(self):
+        """Test the dashboard bundles the home screen reads
+        """
+        res = self.client.get(DASHBOARD_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        data = res.json()
+        self.assertEqual(data['user'], self.client.get(ASYNC_ME_URL).json())
+        self.assertEqual(data['tags'], self.client.get(TAGS_URL).json())
+        self.assertEqual(data['ingredients'],
+                         self.client.get(ASYNC_INGREDIENTS_URL).json())
+        self.assertEqual(len(data['recipes']), 2)
+        self.assertEqual(data['stats'], {
+            'recipes': 2,
+            'public_recipes': 0,
+            'average_time_minutes': 20.0,
+            'tags': 2,
+            'ingredients': 1,
+        })
+
+    def test_dashboard_queries_concurrent(self):
+        """Test the parts of the dashboard are fetched at the same time
+        """
+        # only passes when the three parts wait on it together
+        barrier = threading.Barrier(3, timeout=5)
+
+        def wait_for_others(original):
+            def wrapper(*args):
+                barrier.wait()
+                return original(*args)
+            return wrapper
+
+        with patch.object(async_views, '_named_list',
+                          wait_for_others(async_views._named_list)), \
+                patch.object(async_views, '_recipe_stats',
+                             wait_for_others(async_views._recipe_stats)):
+            res = self.client.get(DASHBOARD_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
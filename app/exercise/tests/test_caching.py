@@ -0,0 +1,171 @@
+import threading
+import time
+from unittest.mock import patch
+
+from core.models import Ingredient, Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TransactionTestCase
+from django.urls import reverse
+from exercise import async_views, caching
+from rest_framework import status
+from rest_framework.test import APIClient
+
+TAGS_URL = reverse('exercise:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('exercise:recipe-detail', args=[recipe_id])
+
+
+class RecipeDetailCacheTests(TransactionTestCase):
+    """The details are made stale after the commit of a change, the tests
+    do not run in a transaction
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=30, price=7.5)
+        self.recipe.tags.add(self.vegan)
+        self.recipe.ingredients.add(self.salt)
+
+    def get(self):
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json()
+
+    def test_served_from_cache(self):
+        data = self.get()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(), data)
+        self.assertEqual(data['tags'], [{'id': self.vegan.id,
+                                         'name': 'Vegan'}])
+
+    def test_other_users_not_served(self):
+        self.get()
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_other_user_miss_not_kept_for_owner(self):
+        """Test a request of another user on a cold cache leaves nothing
+        the owner would be served
+        """
+        owner = self.user
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        ))
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(owner)
+        self.assertEqual(self.get()['title'], 'Cake')
+
+    def test_recipe_change_invalidates(self):
+        self.get()
+
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Pie'})
+
+        self.assertEqual(self.get()['title'], 'Pie')
+
+    def test_link_changes_invalidate(self):
+        self.get()
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+
+        dessert.recipe_set.add(self.recipe)
+        self.assertEqual(len(self.get()['tags']), 2)
+
+        self.recipe.ingredients.clear()
+        self.assertEqual(self.get()['ingredients'], [])
+
+        dessert.recipe_set.clear()
+        self.assertEqual(len(self.get()['tags']), 1)
+
+    def test_tag_changes_invalidate(self):
+        self.get()
+
+        self.vegan.name = 'Plant based'
+        self.vegan.save()
+        self.assertEqual(self.get()['tags'][0]['name'], 'Plant based')
+
+        self.vegan.delete()
+        self.assertEqual(self.get()['tags'], [])
+
+    def test_deleted_recipe(self):
+        self.get()
+
+        self.recipe.delete()
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrent_misses_render_once(self):
+        """Test the requests missing together wait for one render
+        """
+        render = caching.render_detail
+        calls = []
+
+        def slow_render(recipe_id, user_id):
+            calls.append(recipe_id)
+            time.sleep(0.2)
+            return render(recipe_id, user_id)
+
+        results = []
+        with patch.object(caching, 'render_detail', slow_render):
+            threads = [threading.Thread(target=lambda: results.append(
+                caching.cached_detail(self.recipe.id, self.user.id)))
+                for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(calls, [self.recipe.id])
+        self.assertEqual(len(set(results)), 1)
+
+
+class UserDataCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_tag_list_cached_until_change(self):
+        res = self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(TAGS_URL).data, res.data)
+
+        Tag.objects.create(user=self.user, name='Dessert')
+        self.assertEqual(len(self.client.get(TAGS_URL).data), 2)
+
+    def test_stats_follow_recipes(self):
+        self.assertEqual(async_views._recipe_stats(self.user)['recipes'], 0)
+
+        Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=30, price=7.5)
+
+        self.assertEqual(async_views._recipe_stats(self.user)['recipes'], 1)
@@ -0,0 +1,142 @@
+import re
+from decimal import Decimal
+from types import SimpleNamespace
+
+from core.models import Ingredient, Recipe, Tag
+from core.summaries import rebuild_summaries
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from exercise import async_views
+from rest_framework import status
+from rest_framework.test import APIClient
+
+TAGS_URL = reverse('exercise:tag-list')
+INGREDIENTS_URL = reverse('exercise:ingredient-list')
+RECIPES_URL = reverse('exercise:recipe-list')
+
+USERS = 20
+PER_USER = 100  # tags and ingredients, half as many recipes
+SEEDED_TABLES = {'core_tag', 'core_ingredient', 'core_recipe',
+                 'core_recipe_tags', 'core_recipe_ingredients',
+                 'core_recipesummary'}
+SEEDED_SQL = re.compile(r'\bFROM "?core_(tag|ingredient|recipe)')
+
+# a whole table read or a sort of the rows, in the words of each planner
+FULL_SCANS = {
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+SORTS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE'),
+    'postgresql': re.compile(r'(?:^|-> +)(?:Incremental )?Sort +\('),
+}
+
+
+class QueryPlanTests(TestCase):
+    """Test the queries of the endpoints are served by the indexes
+
+    Every query an endpoint makes on the recipe tables goes through
+    EXPLAIN, a full scan of one of them or a sort fails the test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [get_user_model().objects.create_user(
+            f'user{i}@test.com', 'test123') for i in range(USERS)]
+        Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}')
+            for user in users for i in range(PER_USER))
+        Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for user in users for i in range(PER_USER))
+        Recipe.objects.bulk_create(
+            Recipe(user=user, title=f'Recipe {i}', time_minutes=i,
+                   price=Decimal('5.00'), public=i % 10 == 0)
+            for user in users for i in range(PER_USER // 2))
+        tags = {user.pk: list(Tag.objects.filter(user=user)[:3])
+                for user in users}
+        ingredients = {user.pk: list(Ingredient.objects.filter(user=user)[:3])
+                       for user in users}
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in Recipe.objects.all()
+            for tag in tags[recipe.user_id])
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(recipe=recipe, ingredient=ingredient)
+            for recipe in Recipe.objects.all()
+            for ingredient in ingredients[recipe.user_id])
+        rebuild_summaries('default')  # the bulk writes send no signals
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[USERS // 2]
+        cls.tag = tags[cls.user.pk][0]
+        cls.ingredient = ingredients[cls.user.pk][0]
+        cls.recipe = Recipe.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        if connection.vendor not in FULL_SCANS:
+            self.skipTest(f'no plan checks for {connection.vendor}')
+        caches['default'].clear()  # the rendered details
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def assert_indexed(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not SEEDED_SQL.search(sql):
+                continue
+            checked += 1
+            for line in self.plan(sql):
+                scan = FULL_SCANS[connection.vendor].search(line.strip())
+                if scan and scan.group(1) in SEEDED_TABLES:
+                    self.fail(f'Full scan of {scan.group(1)}: {line}\n{sql}')
+                if SORTS[connection.vendor].search(line.strip()):
+                    self.fail(f'Sort: {line}\n{sql}')
+        self.assertGreater(checked, 0)
+
+    def assert_endpoint_indexed(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assert_indexed(queries.captured_queries)
+
+    def test_tag_list(self):
+        self.assert_endpoint_indexed(TAGS_URL)
+        self.assert_endpoint_indexed(TAGS_URL, {'assigned_only': 1})
+
+    def test_ingredient_list(self):
+        self.assert_endpoint_indexed(INGREDIENTS_URL)
+        self.assert_endpoint_indexed(INGREDIENTS_URL, {'assigned_only': 1})
+
+    def test_recipe_list(self):
+        self.assert_endpoint_indexed(RECIPES_URL)
+        self.assert_endpoint_indexed(RECIPES_URL, {'tags': self.tag.pk})
+        self.assert_endpoint_indexed(
+            RECIPES_URL, {'ingredients': self.ingredient.pk})
+
+    def test_recipe_detail(self):
+        self.assert_endpoint_indexed(
+            reverse('exercise:recipe-detail', args=[self.recipe.pk]))
+
+    def test_dashboard_queries(self):
+        """Test the queries of the async endpoints, run here in the test
+        thread where they can be captured
+        """
+        request = SimpleNamespace(user=self.user, GET={'assigned_only': '1'})
+        with CaptureQueriesContext(connection) as queries:
+            async_views._named_list(Tag, request)
+            async_views._recipe_stats(self.user)
+            async_views._recipe_summaries(request)
+
+        self.assert_indexed(queries.captured_queries)
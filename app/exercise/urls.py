@@ -1,7 +1,9 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from . import async_views
+from .views import (ChangeFeedView, IngredientViewSet, RecipeViewSet,
+                    TagViewSet)
 
 router = DefaultRouter()  # automatic generate urls
 router.register('tags', TagViewSet)
@@ -10,5 +12,17 @@ router.register('recipes', RecipeViewSet)
 
 app_name = 'exercise'
 
-urlpatterns = [path('', include(router.urls))]
-# all the generated url are registered
+urlpatterns = [
+    path('', include(router.urls)),
+    # all the generated url are registered
+    path('async/recipes/', async_views.recipe_list,
+         name='async-recipe-list'),
+    path('async/recipes/<int:pk>/', async_views.recipe_detail,
+         name='async-recipe-detail'),
+    path('async/tags/', async_views.tag_list, name='async-tag-list'),
+    path('async/ingredient/', async_views.ingredient_list,
+         name='async-ingredient-list'),
+    # same payloads as the viewsets, for ASGI servers
+    path('dashboard/', async_views.dashboard, name='dashboard'),
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
+]
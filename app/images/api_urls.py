@@ -0,0 +1,11 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import ImageUploadViewSet
+
+router = DefaultRouter()
+router.register('uploads', ImageUploadViewSet, basename='upload')
+
+app_name = 'uploads'
+
+urlpatterns = [path('', include(router.urls))]
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class ImagesConfig(AppConfig):
+    name = 'images'
+
+    def ready(self):
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # the uploads are checked against the cap from their header, Pillow
+        # raises on the decodes past twice the cap and only warns below
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
@@ -0,0 +1,195 @@
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# a hit only rewrites the mtime on disk when it is older than this
+TOUCH_INTERVAL = 60
+# past the limit the oldest files are evicted down to this share of it, the
+# disk is then not scanned again on every write
+EVICT_TO = 0.9
+LOCK_NAME = '.lock'
+SIZE_NAME = '.size'
+
+
+class ResizeCache:
+    """Size bounded on-disk cache of resized images with LRU eviction
+
+    The files on disk are the index, shared by every process using the
+    root: a hit stats its file and renders it again when it is gone, the
+    mtimes give the LRU order. Files are added under a lock on the root
+    keeping the total size in a file next to them, once over the limit the
+    oldest ones are evicted from a scan of the disk.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> [lock, waiters]
+
+    def path_for(self, key):
+        """Return the absolute path of a cache key
+        """
+        return os.path.join(self.root, key)
+
+    def get_or_create(self, key, render):
+        """Return the path of the cached file, rendering it on a miss
+
+        Args:
+            key (str): relative path of the variant inside the cache
+            render (callable): writes the variant into the file object
+                it receives
+        """
+        path = self.path_for(key)
+        if self._hit(path):
+            return path
+
+        with self._flight(key):
+            # somebody else may have rendered it while we were waiting
+            if self._hit(path):
+                return path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'wb') as tmp:
+                    render(tmp)
+                self._add(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return path
+
+    @property
+    def size(self):
+        with self._disk_lock():
+            return self._read_size()
+
+    def _hit(self, path):
+        """Mark the file as recently used, return False when missing
+        """
+        try:
+            touched = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        if time.time() - touched > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return False  # evicted meanwhile
+        return True
+
+    @contextmanager
+    def _disk_lock(self):
+        """Hold the lock of the root, against the other processes too
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_NAME), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """Return (mtime, path, size) of the files on disk, oldest first
+        """
+        found = []
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif not (entry.name.startswith('.')
+                                  or entry.name.endswith('.tmp')):
+                            stat = entry.stat(follow_symlinks=False)
+                            found.append((stat.st_mtime, entry.path,
+                                          stat.st_size))
+            except FileNotFoundError:
+                continue
+        found.sort()  # the mtime is bumped on hits so this is the LRU order
+        return found
+
+    def _read_size(self):
+        """Return the total size of the files (lock held)
+        """
+        try:
+            with open(os.path.join(self.root, SIZE_NAME)) as size_file:
+                return int(size_file.read())
+        except (FileNotFoundError, ValueError):
+            # first use of the root or a write cut short, count again
+            return sum(size for _, _, size in self._scan())
+
+    def _write_size(self, size):
+        with open(os.path.join(self.root, SIZE_NAME), 'w') as size_file:
+            size_file.write(str(size))
+
+    def _add(self, tmp_path, path):
+        """Move a rendered file in place and evict down to the size limit
+        """
+        size = os.path.getsize(tmp_path)
+        with self._disk_lock():
+            total = self._read_size()
+            try:
+                total -= os.path.getsize(path)  # rendered again
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)  # readers never see half a file
+            total += size
+            if total > self.max_bytes:
+                total = self._evict(keep=path)
+            self._write_size(total)
+
+    def _evict(self, keep):
+        """Remove the oldest files on disk down to EVICT_TO of the limit,
+        return the size left (lock held)
+        """
+        found = self._scan()
+        total = sum(size for _, _, size in found)
+        for _, victim, size in found:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if victim == keep:
+                continue
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+    @contextmanager
+    def _flight(self, key):
+        """Serialize the renders of the same key so Pillow runs only once
+        """
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_resize_cache():
+    """Return the process wide cache for the configured root and size
+    """
+    key = (settings.IMAGE_CACHE_ROOT, settings.IMAGE_CACHE_MAX_BYTES)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ResizeCache(*key)
+        return _caches[key]
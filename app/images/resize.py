@@ -0,0 +1,53 @@
+import hashlib
+
+from PIL import Image
+
+from .strip import exif_orientation
+
+# url extension -> (Pillow format, content type)
+FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+# exif orientation -> transpose that undoes it
+ORIENTATION_TRANSPOSES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+def variant_key(recipe, width, height, ext):
+    """Return the cache key of a resized variant of the recipe image
+
+    The original file name is part of the key, so replacing the image
+    never serves a stale variant
+    """
+    digest = hashlib.sha1(recipe.image.name.encode()).hexdigest()[:16]
+    return f'recipe/{recipe.pk}/{digest}/{width}x{height}.{ext}'
+
+
+def resize_image(source, out, width, height, ext):
+    """Write the source image scaled to fit in width x height into out
+    """
+    image_format = FORMATS[ext][0]
+    with Image.open(source) as img:
+        # the photos keep their Exif orientation, turned upright here
+        orientation = exif_orientation(img.info.get('exif', b''))
+        transpose = ORIENTATION_TRANSPOSES.get(orientation)
+        if 5 <= orientation <= 8:  # sideways
+            width, height = height, width
+        # lets the JPEG decoder skip most of the pixels of big photos
+        img.draft(img.mode, (width, height))
+        img.thumbnail((width, height), Image.LANCZOS)
+        if transpose is not None:
+            img = img.transpose(transpose)
+        if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(out, image_format, quality=85, optimize=True)
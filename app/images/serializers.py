@@ -0,0 +1,24 @@
+from core.models import ImageUpload
+from django.conf import settings
+from rest_framework import serializers
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer to start resumable uploads of recipe images
+    """
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'recipe', 'filename', 'length', 'offset')
+        read_only_fields = ('id', 'offset')
+
+    def validate_recipe(self, recipe):
+        if recipe.user != self.context['request'].user:
+            raise serializers.ValidationError('Recipe not found')
+        return recipe
+
+    def validate_length(self, length):
+        if not 0 < length <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                'Images must have between 1 and '
+                f'{settings.IMAGE_UPLOAD_MAX_BYTES} bytes')
+        return length
@@ -0,0 +1,159 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import quote_etag
+
+# uuid4 names and hex digests never change content once written
+CONTENT_ADDRESSED_RE = re.compile(
+    r'^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+    r'|[0-9a-f]{32,64})$'
+)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ONE_YEAR = 365 * 24 * 60 * 60
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """File object limited to a byte range
+
+    Keeps the file descriptor reachable so a WSGI server file wrapper can
+    still hand the range to os.sendfile
+    """
+
+    def __init__(self, fileobj, start, length):
+        fileobj.seek(start)
+        self._file = fileobj
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def is_content_addressed(path):
+    """Return True when the file name identifies its content
+    """
+    stem = os.path.basename(path).split('.')[0]
+    return bool(CONTENT_ADDRESSED_RE.match(stem))
+
+
+def file_etag(path, stat):
+    """Return a strong ETag for the file
+    """
+    # files are written to a temporary name and moved in place, so a
+    # name, size and mtime triple always belongs to the same bytes
+    raw = f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()
+    return quote_etag(hashlib.sha1(raw).hexdigest())
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single byte range, None for the whole file
+
+    Raises ValueError when the range can not be satisfied
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None  # missing, malformed or multiple ranges
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 are the last 500 bytes
+        length = int(end)
+        if not length:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def cache_control(path, public, immutable=False):
+    """Return the Cache-Control value for a file
+    """
+    scope = 'public' if public else 'private'
+    if immutable or is_content_addressed(path):
+        return f'{scope}, max-age={ONE_YEAR}, immutable'
+    return f'{scope}, no-cache'
+
+
+def serve_file(request, path, content_type=None, public=False,
+               immutable=False):
+    """Return a response for the file honouring conditional and range
+    requests, offloading the transfer to the web server when configured
+
+    Args:
+        path (str): absolute path of the file
+        public (bool): whether shared caches may store the response
+        immutable (bool): force immutable caching for files whose name is
+            not content addressed but whose content never changes
+    """
+    stat = os.stat(path)
+    etag = file_etag(path, stat)
+    content_type = (content_type or mimetypes.guess_type(path)[0]
+                    or 'application/octet-stream')
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': cache_control(path, public, immutable),
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return _with_headers(HttpResponseNotModified(), headers)
+
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend:
+        # the web server takes care of ranges and of moving the bytes
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + \
+                os.path.relpath(path, settings.MEDIA_ACCEL_ROOT)
+        else:
+            response['X-Sendfile'] = path
+        return _with_headers(response, headers)
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'),
+                                     stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return _with_headers(response, headers)
+
+    fileobj = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(FileRange(fileobj, start, length),
+                                status=206, content_type=content_type)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response.block_size = BLOCK_SIZE
+    return _with_headers(response, headers)
+
+
+def _with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
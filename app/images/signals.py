@@ -0,0 +1,36 @@
+from core.models import Recipe
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .storage import release_image
+
+
+def _image_name(instance):
+    # read the raw value, a deferred image field must not cost a query
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    instance._loaded_image = _image_name(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, using, **kwargs):
+    """Release the previous image once a recipe points to a new one
+    """
+    current = _image_name(instance)
+    previous = getattr(instance, '_loaded_image', '')
+    if previous and previous != current:
+        release_image(previous, using)
+    instance._loaded_image = current
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, using, **kwargs):
+    """Release the image of deleted recipes, also on user cascades
+    """
+    name = _image_name(instance)
+    if name:
+        release_image(name, using)
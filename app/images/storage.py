@@ -0,0 +1,163 @@
+import hashlib
+import os
+
+from core.db.shards import on_each_shard
+from core.models import RECIPE_IMAGE_DIR, ImageBlob, Recipe, sharded_path
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler)
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream image uploads to disk, giving up past the byte limit
+
+    Nothing is kept in memory and an oversized upload stops being read as
+    soon as it crosses IMAGE_UPLOAD_MAX_BYTES
+    """
+    too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def hash_file(fileobj):
+    """Return the sha256 of a file object read in chunks
+    """
+    sha256 = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    fileobj.seek(0)
+    return sha256.hexdigest()
+
+
+def perceptual_hash(path):
+    """Return the 64 bit difference hash of an image as hex
+    """
+    with Image.open(path) as img:
+        img.draft('L', (64, 64))
+        small = img.convert('L').resize((9, 8), Image.LANCZOS)
+        pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = (bits << 1) | (left > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+def hamming_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def _write_blob(name, fileobj):
+    """Put the bytes of fileobj under the storage name
+    """
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if hasattr(fileobj, 'temporary_file_path'):
+        # already on disk, move it instead of copying the bytes again
+        file_move_safe(fileobj.temporary_file_path(), path,
+                       allow_overwrite=True)
+        fileobj.close()  # knows the file is gone, no unlink on collection
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fileobj.seek(0)
+    with open(tmp_path, 'wb') as out:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+            out.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def store_recipe_image(recipe, fileobj):
+    """Attach the image to the recipe storing its bytes only once
+
+    Identical uploads share one content addressed file, the blob keeps
+    count of the recipes pointing at it
+    """
+    digest = getattr(fileobj, 'sha256', None) or hash_file(fileobj)
+    ext = os.path.splitext(fileobj.name)[1].lstrip('.').lower() or 'jpg'
+    # the blobs stay on the default database, the recipe may be on a shard
+    using = router.db_for_write(Recipe, instance=recipe)
+
+    with transaction.atomic(using=using), \
+            transaction.atomic(using=DEFAULT_DB_ALIAS):
+        blob, created = ImageBlob.objects.select_for_update().get_or_create(
+            sha256=digest,
+            defaults={
+                'name': sharded_path(RECIPE_IMAGE_DIR, f'{digest}.{ext}'),
+                'size': fileobj.size,
+            }
+        )
+        if created or not default_storage.exists(blob.name):
+            _write_blob(blob.name, fileobj)
+            if settings.IMAGE_PERCEPTUAL_HASH:
+                blob.phash = perceptual_hash(default_storage.path(blob.name))
+                blob.save(update_fields=['phash'])
+
+        if recipe.image.name != blob.name:
+            ImageBlob.objects.filter(pk=blob.pk).update(
+                ref_count=F('ref_count') + 1)
+            recipe.image.name = blob.name
+            recipe.save(update_fields=['image'])
+            # the old image is released by the post_save signal
+    return blob
+
+
+def release_image(name, using=DEFAULT_DB_ALIAS):
+    """Drop one reference to the file, removing it once the transaction on
+    using, which unlinked it from a recipe, commits and nothing uses it
+    anymore
+
+    On another database than the blobs, a rollback of using leaves the
+    count one short, the file is still checked against the recipes.
+    """
+    ImageBlob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: delete_if_unreferenced(name), using=using)
+
+
+def delete_if_unreferenced(name):
+    """Delete the file and its blob when no recipe points at it
+    """
+    with transaction.atomic():
+        # the row lock makes a concurrent upload of the same bytes wait,
+        # it writes the file again once the blob is gone
+        blob = ImageBlob.objects.select_for_update().filter(
+            name=name).first()
+        if blob is not None and blob.ref_count > 0:
+            return False
+        if any(recipes.exists() for recipes in
+               on_each_shard(Recipe.objects.filter(image=name))):
+            return False
+        default_storage.delete(name)
+        if blob is not None:
+            blob.delete()
+    return True
+
+
+def similar_recipes(recipe, blob):
+    """Return the ids of the user recipes whose image looks like the blob
+    """
+    if not blob.phash:
+        return []
+    names = Recipe.objects.filter(user=recipe.user_id).exclude(
+        pk=recipe.pk).exclude(image='').values_list('image', flat=True)
+    close = [
+        name for name, phash in ImageBlob.objects.filter(name__in=names)
+        .exclude(phash='').values_list('name', 'phash')
+        if hamming_distance(phash, blob.phash) <=
+        settings.IMAGE_PERCEPTUAL_HASH_DISTANCE
+    ]
+    return list(Recipe.objects.filter(user=recipe.user_id, image__in=close)
+                .exclude(pk=recipe.pk).values_list('pk', flat=True))
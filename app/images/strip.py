@@ -0,0 +1,165 @@
+"""Copy images dropping their metadata without decoding the pixels
+
+Every writer walks the container segment by segment, only the current
+segment header is kept in memory and the image data is copied in blocks.
+The Exif orientation of a JPEG is the one tag kept, in an Exif of its
+own, the photos are turned upright when displayed or resized.
+"""
+import struct
+
+CHUNK_SIZE = 64 * 1024
+
+# APP1 holds Exif and XMP, APP13 the Photoshop/IPTC block, 0xFE comments
+JPEG_DROPPED = {0xE1, 0xED, 0xFE}
+JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+PNG_DROPPED = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+WEBP_DROPPED = {b'EXIF', b'XMP '}
+EXIF_ORIENTATION = 0x0112
+
+
+def _read(src, size):
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated image')
+    return data
+
+
+def _copy(src, out, size=None):
+    """Copy size bytes, or everything left when size is None
+    """
+    while size is None or size > 0:
+        block = src.read(CHUNK_SIZE if size is None
+                         else min(CHUNK_SIZE, size))
+        if not block:
+            if size is not None:
+                raise ValueError('Truncated image')
+            return
+        out.write(block)
+        if size is not None:
+            size -= len(block)
+
+
+def exif_orientation(payload):
+    """Return the orientation stored in an APP1 Exif payload, 1 if none
+    """
+    if not payload.startswith(b'Exif\x00\x00'):
+        return 1
+    tiff = payload[6:]
+    try:
+        order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+        ifd = struct.unpack(order + 'I', tiff[4:8])[0]
+        count = struct.unpack(order + 'H', tiff[ifd:ifd + 2])[0]
+        for i in range(count):
+            entry = tiff[ifd + 2 + i * 12:ifd + 14 + i * 12]
+            tag, _, _ = struct.unpack(order + 'HHI', entry[:8])
+            if tag == EXIF_ORIENTATION:
+                return struct.unpack(order + 'H', entry[8:10])[0]
+    except (KeyError, struct.error):
+        pass
+    return 1
+
+
+def orientation_segment(orientation):
+    """APP1 segment of an Exif holding the orientation alone
+    """
+    tiff = struct.pack('>2sHIHHHIHHI', b'MM', 42, 8, 1,
+                       EXIF_ORIENTATION, 3, 1, orientation, 0, 0)
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def strip_jpeg(src, out):
+    """Copy a JPEG without its Exif, XMP, IPTC and comment segments,
+    keeping the Exif orientation
+    """
+    oriented = False
+    if _read(src, 2) != b'\xff\xd8':
+        raise ValueError('Not a JPEG file')
+    out.write(b'\xff\xd8')
+    while True:
+        prefix, code = _read(src, 2)
+        if prefix != 0xFF:
+            raise ValueError('Invalid JPEG marker')
+        while code == 0xFF:  # fill bytes
+            code = _read(src, 1)[0]
+        marker = bytes((0xFF, code))
+        if code == 0xDA:
+            # start of scan, the rest is entropy coded data up to EOI
+            out.write(marker)
+            _copy(src, out)
+            return
+        if code in JPEG_STANDALONE:
+            out.write(marker)
+            continue
+        length_bytes = _read(src, 2)
+        payload = _read(src, struct.unpack('>H', length_bytes)[0] - 2)
+        if code in JPEG_DROPPED:
+            orientation = exif_orientation(payload) if code == 0xE1 else 1
+            if 1 < orientation <= 8 and not oriented:
+                out.write(orientation_segment(orientation))
+                oriented = True
+            continue
+        out.write(marker + length_bytes + payload)
+
+
+def strip_png(src, out):
+    """Copy a PNG without its text, time and Exif chunks
+    """
+    signature = _read(src, 8)
+    if signature != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG file')
+    out.write(signature)
+    while True:
+        header = _read(src, 8)
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type in PNG_DROPPED:
+            src.seek(length + 4, 1)  # data and crc
+            continue
+        out.write(header)
+        _copy(src, out, length + 4)
+        if chunk_type == b'IEND':
+            return
+
+
+def strip_webp(src, out):
+    """Copy a WebP without its EXIF and XMP chunks
+    """
+    riff, _, webp = struct.unpack('<4sI4s', _read(src, 12))
+    if riff != b'RIFF' or webp != b'WEBP':
+        raise ValueError('Not a WebP file')
+    # first pass over the chunk headers to know the size of the result
+    chunks = []
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            break
+        fourcc, size = struct.unpack('<4sI', header)
+        padded = size + (size & 1)
+        if fourcc not in WEBP_DROPPED:
+            chunks.append((src.tell(), fourcc, size, padded))
+        src.seek(padded, 1)
+
+    out.write(struct.pack('<4sI4s', b'RIFF',
+                          4 + sum(8 + padded for *_, padded in chunks),
+                          b'WEBP'))
+    for offset, fourcc, size, padded in chunks:
+        src.seek(offset)
+        out.write(struct.pack('<4sI', fourcc, size))
+        if fourcc == b'VP8X':
+            # clear the "has Exif" and "has XMP" flags
+            out.write(bytes((_read(src, 1)[0] & ~0x0C,)))
+            _copy(src, out, padded - 1)
+        else:
+            _copy(src, out, padded)
+
+
+def strip_gif(src, out):
+    _copy(src, out)
+
+
+STRIPPERS = {
+    'JPEG': strip_jpeg,
+    'PNG': strip_png,
+    'WEBP': strip_webp,
+    'GIF': strip_gif,
+}
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+
+from core.models import Recipe
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+
+def sample_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class MediaTestMixin:
+    """Run the tests as an authenticated user with the media files in
+    temporary directories
+
+    temp_dirs maps the attribute holding each directory to the setting
+    pointed at it, the directories are removed after every test.
+    """
+    temp_dirs = {'media_root': 'MEDIA_ROOT'}
+
+    def setUp(self):
+        super().setUp()
+        overrides = {}
+        for attribute, setting in self.temp_dirs.items():
+            path = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, path)
+            setattr(self, attribute, path)
+            overrides[setting] = path
+        media_settings = override_settings(**overrides)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class MediaTestCase(MediaTestMixin, TestCase):
+    pass
+
+
+class MediaTransactionTestCase(MediaTestMixin, TransactionTestCase):
+    pass
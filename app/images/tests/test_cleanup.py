@@ -0,0 +1,56 @@
+import io
+import os
+
+from core.models import ImageBlob
+from images.storage import store_recipe_image
+
+from .base import MediaTransactionTestCase, sample_recipe
+
+
+def sample_file(content=b'image bytes'):
+    buf = io.BytesIO(content)
+    buf.name = 'photo.jpg'
+    buf.size = len(content)
+    return buf
+
+
+class ImageCleanupTests(MediaTransactionTestCase):
+    """The cleanup runs on commit, so the tests need real transactions
+    """
+
+    def test_replaced_image_deleted(self):
+        recipe = sample_recipe(user=self.user)
+        store_recipe_image(recipe, sample_file(b'first'))
+        old_path = recipe.image.path
+
+        store_recipe_image(recipe, sample_file(b'second'))
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+
+    def test_shared_image_kept_until_last_reference(self):
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        store_recipe_image(recipe1, sample_file())
+        store_recipe_image(recipe2, sample_file())
+        path = recipe1.image.path
+
+        recipe1.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+        recipe2.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_user_cascade_deletes_images(self):
+        """Test deleting a user removes the images of their recipes
+        """
+        recipe = sample_recipe(user=self.user)
+        store_recipe_image(recipe, sample_file())
+        path = recipe.image.path
+
+        self.user.delete()
+
+        self.assertFalse(os.path.exists(path))
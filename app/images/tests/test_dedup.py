@@ -0,0 +1,101 @@
+import io
+import os
+
+from core.models import ImageBlob
+from django.test import override_settings
+from django.urls import reverse
+from images.storage import hamming_distance, perceptual_hash
+from PIL import Image, ImageDraw
+from rest_framework import status
+
+from .base import MediaTestCase, sample_recipe
+
+
+def image_upload_url(recipe_id):
+    return reverse('exercise:recipe-upload-image', args=[recipe_id])
+
+
+def sample_image(quality=90, color='white'):
+    """Return a jpeg file with a simple drawing
+    """
+    img = Image.new('RGB', (64, 64), color=color)
+    ImageDraw.Draw(img).rectangle((10, 10, 40, 50), fill='black')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality)
+    buf.seek(0)
+    buf.name = 'photo.jpg'
+    return buf
+
+
+class ImageDeduplicationTests(MediaTestCase):
+
+    def upload(self, recipe, image):
+        return self.client.post(image_upload_url(recipe.id),
+                                {'image': image}, format='multipart')
+
+    def test_identical_uploads_share_one_file(self):
+        """Test the same bytes uploaded twice are stored once
+        """
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+
+        res1 = self.upload(recipe1, sample_image())
+        res2 = self.upload(recipe2, sample_image())
+
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.image.name, recipe2.image.name)
+        self.assertTrue(os.path.exists(recipe1.image.path))
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.name, recipe1.image.name)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertIn(blob.sha256, blob.name)
+
+    def test_replacing_image_releases_reference(self):
+        recipe = sample_recipe(user=self.user)
+        self.upload(recipe, sample_image())
+        self.upload(recipe, sample_image(quality=50))
+
+        counts = dict(ImageBlob.objects.values_list('name', 'ref_count'))
+        recipe.refresh_from_db()
+        self.assertEqual(counts.pop(recipe.image.name), 1)
+        self.assertEqual(list(counts.values()), [0])
+
+    def test_upload_same_image_again(self):
+        """Test uploading the current image again keeps one reference
+        """
+        recipe = sample_recipe(user=self.user)
+        self.upload(recipe, sample_image())
+        self.upload(recipe, sample_image())
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    @override_settings(IMAGE_PERCEPTUAL_HASH=True)
+    def test_near_duplicates_flagged(self):
+        """Test a re-encoded copy of an image is reported as similar
+        """
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        self.upload(recipe1, sample_image(quality=90))
+
+        res = self.upload(recipe2, sample_image(quality=40))
+
+        self.assertEqual(res.data['similar_recipes'], [recipe1.id])
+        self.assertEqual(ImageBlob.objects.count(), 2)
+
+    def test_perceptual_hash(self):
+        path = os.path.join(self.media_root, 'a.jpg')
+        with open(path, 'wb') as f:
+            f.write(sample_image().read())
+        other = os.path.join(self.media_root, 'b.jpg')
+        img = Image.new('RGB', (64, 64), color='white')
+        ImageDraw.Draw(img).ellipse((30, 0, 64, 20), fill='black')
+        img.save(other)
+
+        self.assertEqual(len(perceptual_hash(path)), 16)
+        self.assertGreater(
+            hamming_distance(perceptual_hash(path), perceptual_hash(other)),
+            6
+        )
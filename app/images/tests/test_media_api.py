@@ -0,0 +1,141 @@
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from images.serve import parse_range
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .base import MediaTestCase, sample_recipe
+
+CONTENT = bytes(range(256)) * 4
+
+
+def media_url(name):
+    return reverse('images:media', args=[name])
+
+
+class MediaApiTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = sample_recipe(user=self.user)
+        self.recipe.image.save('photo.jpg', ContentFile(CONTENT))
+        self.url = media_url(self.recipe.image.name)
+
+    def test_owner_can_read_image(self):
+        """Test the full file is served with validators and cache headers
+        """
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertTrue(res['ETag'].startswith('"'))
+        # uuid names are content addressed
+        self.assertEqual(res['Cache-Control'],
+                         'private, max-age=31536000, immutable')
+
+    def test_other_user_can_not_read_private_image(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        ))
+        self.assertEqual(client.get(self.url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(APIClient().get(self.url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_anonymous_can_read_public_image(self):
+        self.recipe.public = True
+        self.recipe.save()
+
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Cache-Control'].startswith('public'))
+
+    def test_unknown_file(self):
+        res = self.client.get(media_url('uploads/recipe/missing.jpg'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(media_url('uploads/recipe/../../etc/passwd'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_legacy_flat_url(self):
+        """Test urls from before the sharded layout still resolve
+        """
+        flat_name = f'uploads/recipe/{self.recipe.image.name.split("/")[-1]}'
+
+        res = self.client.get(media_url(flat_name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+
+    def test_range_request(self):
+        """Test a single byte range is answered with partial content
+        """
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(res['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+
+    def test_range_not_satisfiable(self):
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                              HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+
+    def test_if_none_match(self):
+        """Test a matching ETag is answered with not modified
+        """
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect',
+                       MEDIA_ACCEL_PREFIX='/protected/')
+    def test_x_accel_redirect(self):
+        """Test the transfer is handed to nginx when configured
+        """
+        with override_settings(MEDIA_ACCEL_ROOT=self.media_root):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected/{self.recipe.image.name}')
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-sendfile')
+    def test_x_sendfile(self):
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+
+
+class ParseRangeTests(TestCase):
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
@@ -0,0 +1,207 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.urls import reverse
+from images.cache import ResizeCache
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .base import MediaTestCase, sample_recipe
+
+
+def resize_url(recipe_id, width, height, ext='jpg'):
+    """Return the url of a resized recipe image
+    """
+    return reverse('images:recipe-resize',
+                   args=[recipe_id, width, height, ext])
+
+
+def sample_image(size=(100, 50), image_format='JPEG', **save_kwargs):
+    """Return the bytes of a generated image
+    """
+    buf = io.BytesIO()
+    Image.new('RGB', size, color='red').save(buf, format=image_format,
+                                             **save_kwargs)
+    return buf.getvalue()
+
+
+class RecipeImageResizeApiTests(MediaTestCase):
+    temp_dirs = {'media_root': 'MEDIA_ROOT', 'cache_root': 'IMAGE_CACHE_ROOT'}
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = sample_recipe(user=self.user)
+        self.recipe.image.save('photo.jpg', ContentFile(sample_image()))
+
+    def test_resize_image(self):
+        """Test the image is scaled to fit keeping the aspect ratio
+        """
+        res = self.client.get(resize_url(self.recipe.id, 40, 40, 'png'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        img = Image.open(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual(img.format, 'PNG')
+        self.assertEqual(img.size, (40, 20))
+
+    def test_resize_turns_photos_upright(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation, rotated a quarter turn
+        self.recipe.image.save('rotated.jpg', ContentFile(
+            sample_image(exif=exif.tobytes())))
+
+        res = self.client.get(resize_url(self.recipe.id, 40, 40, 'png'))
+
+        img = Image.open(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual(img.size, (20, 40))
+
+    def test_resize_served_from_cache(self):
+        """Test the second request does not resize again
+        """
+        url = resize_url(self.recipe.id, 30, 30)
+        with patch('images.views.resize_image') as resize:
+            resize.side_effect = lambda src, out, **kw: out.write(b'x')
+            self.client.get(url).close()
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(resize.call_count, 1)
+        self.assertEqual(b''.join(res.streaming_content), b'x')
+
+    def test_resize_other_user_recipe(self):
+        """Test the images of other users can not be resized
+        """
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        recipe = sample_recipe(user=user2)
+        recipe.image.save('photo.jpg', ContentFile(sample_image()))
+
+        res = self.client.get(resize_url(recipe.id, 30, 30))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resize_invalid_size(self):
+        """Test sizes outside of the limits are rejected
+        """
+        res = self.client.get(resize_url(self.recipe.id, 0, 30))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(resize_url(self.recipe.id, 30, 100000))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resize_unknown_format(self):
+        res = self.client.get(resize_url(self.recipe.id, 30, 30, 'gif'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resize_private_recipe_anonymous(self):
+        """Test anonymous users can not see private recipe images
+        """
+        res = APIClient().get(resize_url(self.recipe.id, 30, 30))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resize_public_recipe_anonymous(self):
+        """Test the images of public recipes are visible to everybody
+        """
+        self.recipe.public = True
+        self.recipe.save()
+
+        res = APIClient().get(resize_url(self.recipe.id, 30, 30))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('public', res['Cache-Control'])
+        self.assertIn('immutable', res['Cache-Control'])
+
+
+class ResizeCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache stays under its size evicting the oldest entry
+        """
+        cache = ResizeCache(self.root, max_bytes=25)
+        first = cache.get_or_create('a', lambda out: out.write(b'1' * 10))
+        second = cache.get_or_create('b', lambda out: out.write(b'2' * 10))
+        now = time.time()
+        os.utime(first, (now - 200, now - 200))
+        os.utime(second, (now - 100, now - 100))
+        cache.get_or_create('a', lambda out: out.write(b''))  # hit
+        cache.get_or_create('c', lambda out: out.write(b'3' * 10))
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual(cache.size, 20)
+
+    def test_index_rebuilt_from_disk(self):
+        """Test a new cache instance picks up the files already stored
+        """
+        ResizeCache(self.root, 100).get_or_create(
+            'a', lambda out: out.write(b'1' * 10))
+
+        cache = ResizeCache(self.root, 100)
+        path = cache.get_or_create('a', lambda out: self.fail('rendered'))
+
+        self.assertEqual(cache.size, 10)
+        self.assertTrue(os.path.exists(path))
+
+    def test_evicted_by_other_process(self):
+        """Test a file another process evicted is rendered again
+        """
+        cache = ResizeCache(self.root, 100)
+        path = cache.get_or_create('a', lambda out: out.write(b'1' * 10))
+        os.remove(path)
+
+        cache.get_or_create('a', lambda out: out.write(b'2' * 10))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'2' * 10)
+
+    def test_limit_shared_by_processes(self):
+        """Test the size limit holds across caches of the same root
+        """
+        caches = [ResizeCache(self.root, max_bytes=25) for _ in range(3)]
+        for number, cache in enumerate(caches):
+            cache.get_or_create(str(number),
+                                lambda out: out.write(b'x' * 10))
+
+        on_disk = sum(os.path.getsize(path) for _, path, _ in
+                      caches[0]._scan())
+        self.assertLessEqual(on_disk, 25)
+        self.assertEqual(caches[1].size, on_disk)
+
+    def test_concurrent_misses_render_once(self):
+        """Test concurrent requests for the same key are coalesced
+        """
+        cache = ResizeCache(self.root, 100)
+        calls = []
+
+        def render(out):
+            calls.append(1)
+            time.sleep(0.05)
+            out.write(b'data')
+
+        threads = [
+            threading.Thread(target=cache.get_or_create, args=('k', render))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,204 @@
+import io
+import os
+from unittest.mock import patch
+
+from core.models import ImageUpload
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from images.views import ImageUploadViewSet
+
+from .base import MediaTestCase, MediaTransactionTestCase, sample_recipe
+
+UPLOADS_URL = reverse('uploads:upload-list')
+
+
+def upload_url(upload_id):
+    return reverse('uploads:upload-detail', args=[upload_id])
+
+
+def finalize_url(upload_id):
+    return reverse('uploads:upload-finalize', args=[upload_id])
+
+
+def sample_image(size=(50, 40)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color='blue').save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class UploadTestMixin:
+    temp_dirs = {'media_root': 'MEDIA_ROOT',
+                 'temp_dir': 'IMAGE_UPLOAD_TEMP_DIR'}
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = sample_recipe(user=self.user)
+
+    def start(self, content, recipe=None):
+        return self.client.post(UPLOADS_URL, {
+            'recipe': (recipe or self.recipe).id,
+            'filename': 'photo.png',
+            'length': len(content),
+        })
+
+    def send(self, upload_id, chunk, offset):
+        return self.client.patch(
+            upload_url(upload_id), chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+
+class ResumableUploadApiTests(UploadTestMixin, MediaTestCase):
+
+    def test_chunked_upload(self):
+        """Test an image sent in chunks is attached to the recipe
+        """
+        content = sample_image()
+        res = self.start(content)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res['Upload-Offset'], '0')
+        upload_id = res.data['id']
+
+        offset = 0
+        for start in range(0, len(content), 40):
+            res = self.send(upload_id, content[start:start + 40], offset)
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+            offset = int(res['Upload-Offset'])
+        self.assertEqual(offset, len(content))
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_resume_reports_offset(self):
+        """Test HEAD tells the client where to resume
+        """
+        content = sample_image()
+        upload_id = self.start(content).data['id']
+        self.send(upload_id, content[:30], 0)
+
+        res = self.client.head(upload_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Upload-Offset'], '30')
+        self.assertEqual(res['Upload-Length'], str(len(content)))
+
+    def test_wrong_offset_conflict(self):
+        content = sample_image()
+        upload_id = self.start(content).data['id']
+        self.send(upload_id, content[:30], 0)
+
+        res = self.send(upload_id, content[30:], 10)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '30')
+
+    def test_same_offset_sent_twice(self):
+        """Test a chunk for an offset another chunk just moved is refused
+        """
+        content = sample_image()
+        upload_id = self.start(content).data['id']
+        stale = ImageUpload.objects.get(pk=upload_id)
+        self.send(upload_id, content[:30], 0)
+
+        with patch.object(ImageUploadViewSet, 'get_object',
+                          return_value=stale):
+            res = self.send(upload_id, b'x' * 30, 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '30')
+        with open(os.path.join(self.temp_dir, f'{upload_id}.part'),
+                  'rb') as part:
+            self.assertEqual(part.read(), content[:30])
+
+    def test_chunk_past_length(self):
+        upload_id = self.start(b'12345').data['id']
+
+        res = self.send(upload_id, b'1234567', 0)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(ImageUpload.objects.get().offset, 0)
+
+    def test_chunk_content_type(self):
+        upload_id = self.start(b'12345').data['id']
+
+        res = self.client.patch(upload_url(upload_id), b'12345',
+                                content_type='application/octet-stream',
+                                HTTP_UPLOAD_OFFSET='0')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_finalize_incomplete(self):
+        content = sample_image()
+        upload_id = self.start(content).data['id']
+        self.send(upload_id, content[:10], 0)
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_finalize_not_an_image(self):
+        upload_id = self.start(b'12345').data['id']
+        self.send(upload_id, b'12345', 0)
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_length_limit(self):
+        res = self.start(b'x' * 11)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_user_recipe(self):
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'test123'
+        )
+        res = self.start(b'12345', recipe=sample_recipe(user=user2))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FinalizeUploadTests(UploadTestMixin, MediaTransactionTestCase):
+
+    def upload(self, content):
+        upload_id = self.start(content).data['id']
+        self.send(upload_id, content, 0)
+        return upload_id
+
+    def test_part_removed_on_commit(self):
+        upload_id = self.upload(sample_image())
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_failed_finalize_retried(self):
+        """Test the part is kept when attaching the image fails"""
+        content = sample_image()
+        upload_id = self.upload(content)
+
+        with patch('images.views.store_recipe_image',
+                   side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.client.post(finalize_url(upload_id))
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as f:
+            self.assertEqual(f.read(), content)
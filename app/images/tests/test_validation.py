@@ -0,0 +1,158 @@
+import io
+from unittest.mock import patch
+
+from core.models import Recipe
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from images.validation import clean_image
+from PIL import Image, PngImagePlugin
+from rest_framework import serializers, status
+
+from .base import MediaTestCase
+
+
+def image_upload_url(recipe_id):
+    return reverse('exercise:recipe-upload-image', args=[recipe_id])
+
+
+def exif_bytes(orientation=1):
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # orientation
+    exif[0x010F] = 'Camera maker'
+    return exif.tobytes()
+
+
+def sample_file(image_format='JPEG', size=(60, 30), **save_kwargs):
+    buf = io.BytesIO()
+    img = Image.new('RGB', size, color='green')
+    img.putpixel((0, 0), (255, 0, 0))
+    img.save(buf, format=image_format, **save_kwargs)
+    ext = image_format.lower()
+    return SimpleUploadedFile(f'photo.{ext}', buf.getvalue())
+
+
+def read(cleaned):
+    cleaned.seek(0)
+    return cleaned.read()
+
+
+class CleanImageTests(TestCase):
+
+    def test_jpeg_exif_removed(self):
+        """Test the Exif segment is dropped and the pixels kept as they are
+        """
+        upload = sample_file(exif=exif_bytes())
+        self.assertIn(b'Camera maker', upload.read())
+
+        cleaned = clean_image(upload)
+
+        data = read(cleaned)
+        self.assertNotIn(b'Exif', data)
+        self.assertNotIn(b'Camera maker', data)
+        upload.seek(0)
+        self.assertEqual(list(Image.open(io.BytesIO(data)).getdata()),
+                         list(Image.open(upload).getdata()))
+        self.assertEqual(cleaned.size, len(data))
+        self.assertEqual(len(cleaned.sha256), 64)
+
+    def test_jpeg_not_decoded(self):
+        """Test validation and stripping never decode the pixels
+        """
+        upload = sample_file(exif=exif_bytes())
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            clean_image(upload)
+        load.assert_not_called()
+
+    def test_jpeg_orientation_kept(self):
+        """Test rotated photos keep their orientation, alone in the Exif,
+        without being decoded
+        """
+        upload = sample_file(exif=exif_bytes(orientation=6))
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            cleaned = clean_image(upload)
+        load.assert_not_called()
+
+        img = Image.open(io.BytesIO(read(cleaned)))
+        self.assertEqual(img.size, (60, 30))
+        self.assertEqual(dict(img.getexif()), {0x0112: 6})
+        self.assertNotIn(b'Camera maker', read(cleaned))
+
+    def test_png_text_removed(self):
+        info = PngImagePlugin.PngInfo()
+        info.add_text('Author', 'Secret location')
+
+        cleaned = clean_image(sample_file('PNG', pnginfo=info))
+
+        data = read(cleaned)
+        self.assertNotIn(b'Secret location', data)
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (60, 30))
+
+    def test_webp_exif_removed(self):
+        cleaned = clean_image(sample_file('WEBP', exif=exif_bytes()))
+
+        data = read(cleaned)
+        self.assertNotIn(b'Camera maker', data)
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        self.assertEqual(img.size, (60, 30))
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_pixel_limit(self):
+        with self.assertRaises(serializers.ValidationError):
+            clean_image(sample_file(size=(100, 100)))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_byte_limit(self):
+        with self.assertRaises(serializers.ValidationError):
+            clean_image(sample_file())
+
+    def test_truncated_image(self):
+        upload = sample_file()
+        broken = SimpleUploadedFile('photo.jpg', upload.read()[:20])
+
+        with self.assertRaises(serializers.ValidationError):
+            clean_image(broken)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(serializers.ValidationError):
+            clean_image(sample_file('BMP'))
+
+
+class ImageUploadLimitsApiTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5, price=5)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_upload_too_large(self):
+        """Test the upload stops being read past the byte limit
+        """
+        res = self.client.post(image_upload_url(self.recipe.id), {
+            'image': sample_file(size=(300, 300)),
+        }, format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_upload_too_many_pixels(self):
+        res = self.client.post(image_upload_url(self.recipe.id), {
+            'image': sample_file(size=(100, 100)),
+        }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_strips_exif(self):
+        res = self.client.post(image_upload_url(self.recipe.id), {
+            'image': sample_file(exif=exif_bytes()),
+        }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as f:
+            self.assertNotIn(b'Camera maker', f.read())
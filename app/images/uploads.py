@@ -0,0 +1,74 @@
+import fcntl
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadBusy(Exception):
+    """Another request is writing to the same upload"""
+
+
+def part_path(upload):
+    """Return the path of the file collecting the chunks of the upload
+    """
+    return os.path.join(settings.IMAGE_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def create_part(upload):
+    os.makedirs(settings.IMAGE_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+
+
+def remove_part(upload):
+    remove_part_file(part_path(upload))
+
+
+def remove_part_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def locked_part(upload):
+    """Open the part file for writing, one writer at a time
+    """
+    with open(part_path(upload), 'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy
+        yield part
+
+
+def append_chunk(part, offset, stream, limit):
+    """Append the request body to a locked part file at the offset
+
+    The body is copied in fixed size blocks, memory does not grow with the
+    chunk size. Returns the new offset.
+
+    Args:
+        part: part file opened with locked_part
+        stream: file-like request body
+        limit (int): most bytes accepted, the rest of the upload
+    """
+    # drop whatever a broken previous request wrote past the offset
+    part.truncate(offset)
+    part.seek(offset)
+    written = 0
+    while stream is not None:
+        block = stream.read(min(CHUNK_SIZE, limit - written + 1))
+        if not block:
+            break
+        written += len(block)
+        if written > limit:
+            part.truncate(offset)
+            raise ValueError('Chunk goes past the upload length')
+        part.write(block)
+    part.flush()
+    os.fsync(part.fileno())
+    return offset + written
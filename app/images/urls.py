@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .views import MediaView, RecipeImageResizeView
+
+app_name = 'images'
+
+urlpatterns = [
+    # /media/recipe/1/300x200.webp
+    path('recipe/<int:pk>/<int:width>x<int:height>.<str:ext>',
+         RecipeImageResizeView.as_view(), name='recipe-resize'),
+    path('<path:path>', MediaView.as_view(), name='media'),
+]
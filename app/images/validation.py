@@ -0,0 +1,93 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+from .strip import STRIPPERS
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+INVALID_IMAGE = ('Upload a valid image. The file you uploaded was either '
+                 'not an image or a corrupted image.')
+
+
+class HashingWriter:
+    """Write through to a file computing the sha256 and size on the way
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        self.out.write(data)
+
+
+def validate_image_header(fileobj):
+    """Check format and dimensions reading only the image header
+
+    Returns the Pillow format name, the pixel data is never decoded
+    """
+    fileobj.seek(0)
+    try:
+        # open is lazy, it parses the header and stops
+        with Image.open(fileobj) as img:
+            image_format = img.format
+            width, height = img.size
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise serializers.ValidationError(INVALID_IMAGE)
+    finally:
+        fileobj.seek(0)
+
+    if image_format not in ALLOWED_FORMATS:
+        raise serializers.ValidationError(
+            f'Unsupported image format {image_format}')
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f'Images can have at most {settings.IMAGE_MAX_PIXELS} pixels')
+    return image_format
+
+
+def clean_image(fileobj):
+    """Validate an uploaded image and return a copy without metadata
+
+    The byte and pixel limits are checked before anything is decoded and
+    the metadata is stripped by copying the container segments, so the cost
+    does not depend on the image size, the orientation of rotated photos
+    included. The result is a temporary file with
+    its sha256 computed while it was written.
+    """
+    if fileobj.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise serializers.ValidationError(
+            'Images can have at most '
+            f'{settings.IMAGE_UPLOAD_MAX_BYTES} bytes')
+    image_format = validate_image_header(fileobj)
+
+    cleaned = TemporaryUploadedFile(
+        fileobj.name, getattr(fileobj, 'content_type', None), 0, None)
+    writer = HashingWriter(cleaned.file)
+    try:
+        STRIPPERS[image_format](fileobj, writer)
+    except (ValueError, OSError):
+        cleaned.close()
+        raise serializers.ValidationError(INVALID_IMAGE)
+    finally:
+        fileobj.seek(0)
+
+    cleaned.file.flush()
+    cleaned.seek(0)
+    cleaned.size = writer.size
+    cleaned.sha256 = writer.sha256.hexdigest()
+    return cleaned
+
+
+class RecipeImageField(serializers.FileField):
+    """Image field that validates from the header and strips metadata
+    """
+
+    def to_internal_value(self, data):
+        return clean_image(super().to_internal_value(data))
@@ -0,0 +1,204 @@
+import os
+from functools import partial
+
+from core.db.shards import UserShardMixin, first_on_shards, on_each_shard
+from core.models import RECIPE_IMAGE_DIR, ImageUpload, Recipe, sharded_path
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import Http404
+from rest_framework import exceptions, mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from user.authentication import (AccessTokenAuthentication,
+                                 CachedTokenAuthentication)
+
+from .cache import get_resize_cache
+from .resize import FORMATS, resize_image, variant_key
+from .serializers import ImageUploadSerializer
+from .serve import serve_file
+from .storage import store_recipe_image
+from .uploads import (UploadBusy, append_chunk, create_part, locked_part,
+                      part_path, remove_part_file)
+from .validation import clean_image
+
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+
+
+class RecipeImageResizeView(APIView):
+    """Serve a recipe image resized on the fly to fit width x height
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (AllowAny,)
+    throttle_scope = 'image_resize'
+    # visibility is checked per recipe: owner or public
+
+    def get(self, request, pk, width, height, ext):
+        if ext not in FORMATS:
+            raise Http404
+        max_size = settings.IMAGE_RESIZE_MAX_DIMENSION
+        if not (0 < width <= max_size and 0 < height <= max_size):
+            raise exceptions.ValidationError(
+                f'Width and height must be between 1 and {max_size}')
+
+        # public recipes of other users may be on any shard
+        recipe = first_on_shards(
+            Recipe.objects.visible_to(request.user).filter(pk=pk))
+        if recipe is None or not recipe.image:
+            raise Http404
+
+        variant = partial(
+            get_resize_cache().get_or_create,
+            variant_key(recipe, width, height, ext),
+            partial(resize_image, recipe.image.path, width=width,
+                    height=height, ext=ext)
+        )
+        # the key changes with the original, a variant never changes
+        serve = partial(serve_file, request, content_type=FORMATS[ext][1],
+                        public=recipe.public, immutable=True)
+        try:
+            return serve(variant())
+        except FileNotFoundError:
+            # evicted by another process between the lookup and the open
+            return serve(variant())
+
+
+class MediaView(APIView):
+    """Serve uploaded media files to the users allowed to see them
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (AllowAny,)
+    throttle_scope = 'media'
+
+    def get(self, request, path):
+        name = os.path.normpath(path)  # no way out of the uploads
+        if not name.startswith(RECIPE_IMAGE_DIR):
+            raise Http404
+        names = [name]
+        if os.path.dirname(name) == RECIPE_IMAGE_DIR.rstrip('/'):
+            # urls from before the sharded layout keep working
+            names.append(sharded_path(RECIPE_IMAGE_DIR,
+                                      os.path.basename(name)))
+        # several recipes may share a file, public wins over private
+        found = [row for queryset in on_each_shard(
+            Recipe.objects.visible_to(request.user).filter(image__in=names)
+            .order_by('-public').values_list('image', 'public'))
+            for row in queryset[:1]]
+        if not found:
+            raise Http404
+        image, public = max(found, key=lambda row: row[1])
+        for candidate in (image, *names):
+            full_path = os.path.join(settings.MEDIA_ROOT, candidate)
+            if os.path.isfile(full_path):
+                return serve_file(request, full_path, public=public)
+        raise Http404
+
+
+class ImageUploadViewSet(UserShardMixin,
+                         mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Resumable recipe image uploads
+
+    POST creates the upload, PATCH appends a chunk at Upload-Offset,
+    HEAD tells how much was received and finalize attaches the image
+    """
+    serializer_class = ImageUploadSerializer
+    queryset = ImageUpload.objects.all()
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (IsAuthenticated,)
+    # starting uploads is limited, the chunks use the user budget
+    throttle_scopes = {'create': 'image_upload'}
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        upload = serializer.save(user=self.request.user)
+        create_part(upload)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response['Location'] = request.build_absolute_uri(
+            f'{response.data["id"]}/')
+        response['Upload-Offset'] = 0
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        return self._progress_headers(response, self.get_object())
+
+    def partial_update(self, request, pk=None):
+        """Append the body to the upload
+        """
+        upload = self.get_object()
+        if request.content_type != CHUNK_CONTENT_TYPE:
+            return Response(
+                {'detail': f'Chunks must be sent as {CHUNK_CONTENT_TYPE}'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        try:
+            with locked_part(upload) as part:
+                # the offset is read and stored again under the lock, a
+                # chunk sent for the same offset finds it moved
+                upload.refresh_from_db(fields=['offset'])
+                if request.META.get('HTTP_UPLOAD_OFFSET') != \
+                        str(upload.offset):
+                    return self._progress_headers(Response(
+                        {'detail': 'Upload-Offset does not match'},
+                        status=status.HTTP_409_CONFLICT
+                    ), upload)
+                offset = append_chunk(part, upload.offset, request.stream,
+                                      upload.length - upload.offset)
+                ImageUpload.objects.using(upload._state.db) \
+                    .filter(pk=upload.pk).update(offset=offset)
+        except UploadBusy:
+            return Response({'detail': 'Upload in progress'},
+                            status=status.HTTP_409_CONFLICT)
+        except ValueError as exc:
+            return Response({'detail': str(exc)},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        upload.offset = offset
+        return self._progress_headers(
+            Response(status=status.HTTP_204_NO_CONTENT), upload)
+
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Validate the complete upload and attach it to the recipe
+        """
+        upload = self.get_object()
+        if upload.offset != upload.length:
+            return self._progress_headers(Response(
+                {'detail': 'Upload is not complete'},
+                status=status.HTTP_409_CONFLICT
+            ), upload)
+
+        with open(part_path(upload), 'rb') as part:
+            image = clean_image(File(part, name=upload.filename))
+        using = upload._state.db
+        path = part_path(upload)
+        with transaction.atomic(using=using):
+            store_recipe_image(upload.recipe, image)
+            upload.delete()
+            # kept for a retry until the upload row is gone for good
+            transaction.on_commit(partial(remove_part_file, path),
+                                  using=using)
+        image.close()
+        recipe = upload.recipe
+        return Response({
+            'id': recipe.id,
+            'image': request.build_absolute_uri(recipe.image.url),
+        })
+
+    def _progress_headers(self, response, upload):
+        response['Upload-Offset'] = upload.offset
+        response['Upload-Length'] = upload.length
+        response['Cache-Control'] = 'no-store'
+        return response
@@ -1,18 +1,28 @@
-from core.models import Ingredient, Recipe, Tag
+from core.db.replicas import ReplicaReadsMixin
+from core.db.shards import UserShardMixin
+from core.models import Ingredient, Recipe, RecipeSummary, Tag
+from core.outbox import AtomicWritesMixin
+from exercise.caching import (RenderedJSONResponse, cached_detail,
+                              cached_for_user)
+from images.storage import ImageUploadHandler
 from rest_framework import mixins, status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from user.authentication import (AccessTokenAuthentication,
+                                 CachedTokenAuthentication)
 
 from .serializers import (IngredientSerializer, RecipeDetailSerializer,
                           RecipeImageSerializer, RecipeSerializer,
-                          TagSerializer)
+                          RecipeSummarySerializer, TagSerializer)
 
 
-class BaseViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
+class BaseViewSet(UserShardMixin, ReplicaReadsMixin, AtomicWritesMixin,
+                  viewsets.GenericViewSet, mixins.ListModelMixin,
                   mixins.CreateModelMixin):
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -24,10 +34,22 @@ class BaseViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
         # a boolean
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False).distinct()
+            queryset = queryset.assigned()
             # not return what is not assigned to a recipe
         return queryset.filter(user=self.request.user).order_by('-name')
 
+    def list(self, request, *args, **kwargs):
+        """List computed once per change of the data of the user
+        """
+        assigned_only = int(request.query_params.get('assigned_only', 0))
+        data = cached_for_user(
+            request.user.pk,
+            f'{self.queryset.model._meta.model_name}-list:{assigned_only}',
+            lambda: list(self.get_serializer(self.get_queryset(),
+                                             many=True).data)
+        )
+        return Response(data)
+
     def perform_create(self, serializer):  # before the serializer is saved
         serializer.save(user=self.request.user)
 
@@ -46,24 +68,38 @@ class IngredientViewSet(BaseViewSet):
     queryset = Ingredient.objects.all()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(UserShardMixin, ReplicaReadsMixin, AtomicWritesMixin,
+                    viewsets.ModelViewSet):
     """Manage recipes in the database
     """
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    throttle_scopes = {'upload_image': 'image_upload'}
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers
         """
         return [int(str_id) for str_id in qs.split(',')]
 
+    def get_throttle_scope(self):
+        """Filtered listings are searches with their own stricter budget
+        """
+        params = self.request.query_params
+        if self.action == 'list' and ('tags' in params or
+                                      'ingredients' in params):
+            return 'recipe_search'
+        return self.throttle_scopes.get(self.action)
+
     def get_queryset(self):
         """Retrive the recipes for the authenticated user
         """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        if self.action == 'list':
+            return self._summaries(tags, ingredients)
         query_set = self.queryset.filter(user=self.request.user)
 
         if tags:
@@ -76,6 +112,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return query_set
 
+    def retrieve(self, request, pk=None):
+        """Serve the detail rendered once and kept in the cache
+        """
+        detail = cached_detail(int(pk), request.user.pk) \
+            if pk.isdigit() else None
+        if detail is None:
+            raise NotFound()
+        return RenderedJSONResponse(detail)
+
+    def _summaries(self, tags, ingredients):
+        """The lists read the summaries, one table with the ids of the tags
+        and ingredients of each recipe, newest first
+        """
+        summaries = RecipeSummary.objects.filter(user=self.request.user)
+        if tags:
+            summaries = summaries.filter(
+                tag_ids__overlap=self._params_to_ints(tags))
+        if ingredients:
+            summaries = summaries.filter(
+                ingredient_ids__overlap=self._params_to_ints(ingredients))
+        return summaries.order_by('-recipe')
+
     def get_serializer_class(self):
         """Return apropiate serializer class
         """
@@ -84,6 +142,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         # depending of the action the serializer may change
         if self.action == 'retrieve':
             return RecipeDetailSerializer
+        if self.action == 'list':
+            return RecipeSummarySerializer
 
         if self.action == 'upload_image':  # the action if created another one
             return RecipeImageSerializer  # has the same name as the url path
@@ -103,10 +163,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         recipe = self.get_object()  # this will be you access to the
         # object that is access via the id
+        upload_handler = ImageUploadHandler(request)
+        request.upload_handlers = [upload_handler]
+        # stream the file to disk and stop reading past the size limit
         serializer = self.get_serializer(
             recipe,
             data=request.data
         )
+        if upload_handler.too_large:
+            return Response(
+                {'image': ['Image is too large']},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
 
         if serializer.is_valid():
             serializer.save()  # saves to the database
@@ -0,0 +1,13 @@
+from core.async_api import async_api_view
+from django.http import JsonResponse
+
+from .authentication import (AccessTokenAuthentication,
+                             CachedTokenAuthentication)
+
+
+@async_api_view((AccessTokenAuthentication, CachedTokenAuthentication))
+async def me(request):
+    """Return the authenticated user, already loaded by the authentication
+    """
+    return JsonResponse({'email': request.user.email,
+                         'name': request.user.name})
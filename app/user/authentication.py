@@ -0,0 +1,266 @@
+import threading
+import time
+from collections import OrderedDict
+
+from core.cache import bump_versions, get_version
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (BaseAuthentication,
+                                           TokenAuthentication,
+                                           get_authorization_header)
+
+SHARED_KEY_PREFIX = 'auth-token:'
+USER_VERSION_PREFIX = 'auth-user-version:'
+ACCESS_TOKEN_SALT = 'user.access-token'
+
+
+class TokenCache:
+    """Bounded LRU of authenticated users by token key with a TTL
+
+    Every entry keeps the version of its user read before the user was
+    loaded, a hit is only returned while it is still the current version.
+    The versions live in a cache shared by the processes, bumping one
+    revokes the entries of the user in all of them at once.
+    """
+
+    def __init__(self, max_entries, ttl, shared_alias=None,
+                 version_alias='default'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.version_alias = version_alias
+        self._lock = threading.Lock()
+        # key -> (user, version, expires), oldest first
+        self._entries = OrderedDict()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def user_version(self, user_id):
+        return get_version(f'{USER_VERSION_PREFIX}{user_id}',
+                           self.version_alias)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._entries[key]
+                entry = None
+        if entry is not None:
+            user, version, _ = entry
+            if version == self.user_version(user.pk):
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                return user
+            with self._lock:
+                self._entries.pop(key, None)
+
+        if self.shared is None:
+            return None
+        entry = self.shared.get(SHARED_KEY_PREFIX + key)
+        if entry is None:
+            return None
+        user, version = entry
+        if version != self.user_version(user.pk):
+            return None
+        self._store(key, user, version, now)
+        return user
+
+    def set(self, key, user, version=None):
+        """Cache the user for the token key
+
+        Args:
+            version: version of the user read before loading it, an entry
+                loaded before a revocation then never outlives it
+        """
+        if version is None:
+            version = self.user_version(user.pk)
+        self._store(key, user, version, time.monotonic())
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY_PREFIX + key, (user, version),
+                            self.ttl)
+
+    def _store(self, key, user, version, now):
+        with self._lock:
+            self._entries[key] = (user, version, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(SHARED_KEY_PREFIX + key)
+
+    def invalidate_user(self, user_id):
+        """Drop every entry of the user, in every process
+        """
+        bump_versions([f'{USER_VERSION_PREFIX}{user_id}'],
+                      self.version_alias)
+        with self._lock:
+            for key in [key for key, (user, _, _) in self._entries.items()
+                        if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def copy_user(user):
+    """Return a new instance of a cached user
+
+    Views may change request.user, the copy shares no state, not even
+    _state, with the cached instance.
+    """
+    fields = user._meta.concrete_fields
+    return type(user).from_db(user._state.db,
+                              [field.attname for field in fields],
+                              [getattr(user, field.attname)
+                               for field in fields])
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def access_cache_key(user_id):
+    """Key of the users authenticated by access token, next to the token
+    keys in the same cache
+    """
+    return f'access:{user_id}'
+
+
+def issue_access_token(user):
+    """Return a signed access token for the user
+
+    The signature covers the user id, the token version and the time it was
+    issued, the token expires ACCESS_TOKEN_LIFETIME seconds later.
+    """
+    return signing.dumps([user.pk, user.token_version],
+                         salt=ACCESS_TOKEN_SALT)
+
+
+def revoke_access_tokens(user):
+    """Invalidate every access token issued to the user so far
+    """
+    user.token_version = F('token_version') + 1
+    user.save(update_fields=['token_version'])
+    user.refresh_from_db(fields=['token_version'])
+
+
+def get_token_cache():
+    """Return the process wide token cache for the configured limits
+    """
+    key = (settings.TOKEN_AUTH_CACHE_MAX_ENTRIES,
+           settings.TOKEN_AUTH_CACHE_TTL,
+           settings.TOKEN_AUTH_SHARED_CACHE,
+           settings.TOKEN_AUTH_VERSION_CACHE)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = TokenCache(*key)
+        return _caches[key]
+
+
+class _CachedToken:
+    """Stand in for the Token row on cache hits, request.auth keeps the
+    key and user without loading the row
+    """
+
+    def __init__(self, key, user):
+        self.key = key
+        self.user = user
+        self.user_id = user.pk
+
+    def __str__(self):
+        return self.key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token query on cache hits
+
+    Only valid tokens of active users are cached, revocations are handled
+    by the signals in user.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        user = cache.get(key)
+        if user is not None:
+            user = copy_user(user)
+            return (user, _CachedToken(key, user))
+
+        model = self.get_model()
+        # the owner of a key never changes, its version is read before
+        # loading the user so a revocation racing the load wins
+        user_id = model.objects.filter(key=key) \
+            .values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        version = cache.user_version(user_id)
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        cache.set(key, copy_user(token.user), version)
+        return (token.user, token)
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """Authenticate signed access tokens sent as "Bearer <token>"
+
+    Checking the signature is pure CPU, the user and its current token
+    version come from the process cache and are only loaded on a miss.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid access token header.'))
+
+        try:
+            user_id, version = signing.loads(
+                auth[1].decode(), salt=ACCESS_TOKEN_SALT,
+                max_age=settings.ACCESS_TOKEN_LIFETIME)
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed(_('Access token expired.'))
+        except (signing.BadSignature, UnicodeError, ValueError, TypeError):
+            raise exceptions.AuthenticationFailed(_('Invalid access token.'))
+
+        user = self.get_user(user_id)
+        if user is None or user.token_version != version:
+            raise exceptions.AuthenticationFailed(_('Invalid access token.'))
+        return (copy_user(user), auth[1].decode())
+
+    def get_user(self, user_id):
+        cache = get_token_cache()
+        key = access_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            version = cache.user_version(user_id)
+            user = get_user_model().objects \
+                .filter(pk=user_id, is_active=True).first()
+            if user is not None:
+                cache.set(key, user, version)
+        return user
+
+    def authenticate_header(self, request):
+        return self.keyword
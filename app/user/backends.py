@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import hash_password, verify_password
+
+
+class PooledModelBackend(ModelBackend):
+    """Model backend checking passwords in the hashing pool
+
+    The user is looked up on the request thread, only the hasher runs in
+    the pool. Outdated hashes are replaced on a successful login.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash anyway, unknown emails must not answer faster
+            hash_password(password)
+            return None
+
+        valid, rehashed = verify_password(password, user.password)
+        if not valid:
+            return None
+        if rehashed:
+            user.password = rehashed
+            user.save(update_fields=['password'])
+        if self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+@register(Tags.caches)
+def check_token_version_cache(app_configs, **kwargs):
+    """The token versions revoke the cached users of every process, a
+    cache of each process would only revoke them in one
+    """
+    alias = settings.TOKEN_AUTH_VERSION_CACHE
+    if not isinstance(caches[alias], PROCESS_LOCAL_CACHES):
+        return []
+    return [Error(
+        f'TOKEN_AUTH_VERSION_CACHE points at the process local cache '
+        f'{alias!r}.',
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a cache shared by '
+             'the processes, e.g. memcached.',
+        id='user.E001',
+    )]
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with the iteration count taken from PASSWORD_HASH_ITERATIONS
+
+    The algorithm name is the stock one, existing hashes keep verifying and
+    are rehashed with the new cost on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,90 @@
+"""Password hashing off the request threads
+
+PBKDF2 runs in OpenSSL with the GIL released, so a small thread pool hashes
+in parallel while the request workers keep serving. The pool takes at most
+PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_QUEUE jobs, past that logins and
+signups are turned away with a 429 instead of queueing behind each other.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import exceptions
+
+
+class HashingPoolFull(exceptions.Throttled):
+    default_detail = 'Too many logins in progress, try again shortly.'
+
+    def __init__(self):
+        super().__init__(wait=settings.PASSWORD_HASHING_RETRY_AFTER)
+
+
+class HashingPool:
+    """Bounded pool running password hashers
+    """
+
+    def __init__(self, workers, queue_size):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, fn, *args):
+        """Run fn in the pool and wait for its result
+
+        Raises:
+            HashingPoolFull: every worker is busy and the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolFull
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process wide pool for the configured size
+    """
+    key = (settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = HashingPool(*key)
+        return _pools[key]
+
+
+def hash_password(raw_password):
+    """make_password in the hashing pool
+    """
+    return get_hashing_pool().run(make_password, raw_password)
+
+
+def set_password(user, raw_password):
+    """user.set_password in the hashing pool, saving the user then notifies
+    the password validators as usual
+    """
+    get_hashing_pool().run(user.set_password, raw_password)
+
+
+def _verify(raw_password, encoded):
+    rehashed = []
+    valid = check_password(
+        raw_password, encoded,
+        setter=lambda raw: rehashed.append(make_password(raw)))
+    return valid, rehashed[0] if rehashed else None
+
+
+def verify_password(raw_password, encoded):
+    """check_password in the hashing pool
+
+    Returns whether the password matches and, when the stored hash uses an
+    outdated hasher or cost, the password hashed with the current one.
+    """
+    return get_hashing_pool().run(_verify, raw_password, encoded)
@@ -1,7 +1,10 @@
+from core.models import AccountDeletion
 from django.contrib.auth import authenticate, get_user_model
 
 from rest_framework import serializers
 
+from .hashing import set_password
+
 # from django.utils.translation import ugettext_lazy as _
 
 
@@ -28,7 +31,9 @@ class UserSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """create a new user with encripted password and return it
         """
-        return get_user_model().objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+        return get_user_model().objects.create_user(
+            password=password, set_password=set_password, **validated_data)
 
     def update(self, instance, validated_data):
         """update a user, setting the password correctly and return it
@@ -51,7 +56,7 @@ class UserSerializer(serializers.ModelSerializer):
         # super to the normal update
 
         if password:
-            user.set_password(password)
+            set_password(user, password)
             user.save()
         return user
 
@@ -80,3 +85,13 @@ class AuthSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authentication')
         attrs['user'] = user
         return attrs
+
+
+class AccountDeletionSerializer(serializers.ModelSerializer):
+    """Progress of the deletion of an account
+    """
+    class Meta:
+        model = AccountDeletion
+        fields = ('id', 'status', 'step', 'rows_deleted', 'images_released',
+                  'created', 'finished')
+        read_only_fields = fields
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import get_token_cache
+
+
+def _invalidate_on_commit(using, user_id):
+    """Revoke now, for the requests later in the transaction, and after the
+    commit, for the users other processes loaded meanwhile from the data
+    before it
+    """
+    def invalidate():
+        get_token_cache().invalidate_user(user_id)
+    invalidate()
+    transaction.on_commit(invalidate, using=using)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, using, **kwargs):
+    """Revoke a token everywhere it was cached, also on user cascades
+    """
+    get_token_cache().invalidate(instance.key)
+    _invalidate_on_commit(using, instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user(sender, instance, created, using, **kwargs):
+    """Drop the cached copies of a user once it changes
+
+    Covers deactivation, password changes and token version bumps, and
+    keeps request.user from serving stale profile fields.
+    """
+    if created:
+        return
+    _invalidate_on_commit(using, instance.pk)
@@ -0,0 +1,280 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user import checks
+from user.authentication import (CachedTokenAuthentication, TokenCache,
+                                 get_token_cache, issue_access_token)
+
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('exercise:recipe-list')
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tests',
+    },
+}
+
+
+class TokenCacheTests(TestCase):
+    """Test the in-process token cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'test123')
+
+    def test_lru_bound(self):
+        """Test the least recently used entry is evicted first"""
+        cache = TokenCache(max_entries=2, ttl=60)
+        cache.set('a', self.user)
+        cache.set('b', self.user)
+        cache.get('a')
+        cache.set('c', self.user)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_ttl(self):
+        """Test expired entries are not returned"""
+        cache = TokenCache(max_entries=2, ttl=0)
+        cache.set('a', self.user)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test requests authenticated with the cached token class"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'test123', name='name')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        get_token_cache().clear()
+
+    def test_token_query_cached(self):
+        """Test the token is looked up once"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_token_deleted(self):
+        """Test a deleted token stops authenticating right away"""
+        self.client.get(RECIPES_URL)
+        self.token.delete()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_deactivated(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_changed(self):
+        """Test a password change reloads the user"""
+        self.client.get(ME_URL)
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        with self.assertNumQueries(2):
+            self.client.get(ME_URL)
+
+    def test_profile_update_not_stale(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'new name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+    def test_revoked_in_other_processes(self):
+        """Test the local entries of other processes are revoked at once"""
+        other = TokenCache(max_entries=10, ttl=60)  # another process
+        other.set(self.token.key, self.user)
+        self.assertIsNotNone(other.get(self.token.key))
+
+        self.token.delete()
+
+        self.assertIsNone(other.get(self.token.key))
+
+    def test_version_read_before_load(self):
+        """Test a user loaded while being revoked is not kept"""
+        cache = get_token_cache()
+        user_version = cache.user_version
+
+        def revoked_after_read(user_id):
+            version = user_version(user_id)
+            self.user.set_password('newpass123')
+            self.user.save()
+            return version
+
+        with patch.object(cache, 'user_version', revoked_after_read):
+            CachedTokenAuthentication().authenticate_credentials(
+                self.token.key)
+
+        self.assertIsNone(cache.get(self.token.key))
+
+    def test_user_not_shared(self):
+        """Test every request gets a user of its own"""
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        cached = get_token_cache().get(self.token.key)
+
+        user, _ = auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, cached.pk)
+        self.assertIsNot(user, cached)
+        self.assertIsNot(user._state, cached._state)
+        self.assertFalse(user._state.adding)
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='auth')
+    def test_shared_cache(self):
+        """Test other processes find the user in the shared cache"""
+        self.client.get(ME_URL)
+        get_token_cache().clear()  # what another process starts with
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.token.delete()
+        get_token_cache().clear()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AccessTokenAuthenticationTests(TestCase):
+    """Test the signed access tokens"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'test123', name='name')
+        self.client = APIClient()
+
+    def tearDown(self):
+        get_token_cache().clear()
+
+    def bearer(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_login_returns_access_token(self):
+        res = self.client.post(TOKEN_URL, {
+            'email': 'test@test.com', 'password': 'test123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+        self.bearer(res.data['access'])
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_access_token_no_queries(self):
+        """Test a warm access token is checked without the database"""
+        self.bearer(issue_access_token(self.user))
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_tampered_token(self):
+        access = issue_access_token(self.user)
+        self.bearer(access[:-1] + ('A' if access[-1] != 'A' else 'B'))
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ACCESS_TOKEN_LIFETIME=60)
+    def test_expired_token(self):
+        with patch('django.core.signing.time.time', return_value=1000):
+            access = issue_access_token(self.user)
+        self.bearer(access)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        """Test revoking bumps the version and kills every token"""
+        token = Token.objects.create(user=self.user)
+        access = issue_access_token(self.user)
+        self.bearer(access)
+        self.client.get(ME_URL)
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(Token.objects.filter(key=token.key).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+
+    def test_refresh(self):
+        """Test the database token exchanges for a new access token"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.bearer(res.data['access'])
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_refresh_needs_database_token(self):
+        self.bearer(issue_access_token(self.user))
+
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenVersionCacheCheckTests(TestCase):
+    """Test the check of the cache keeping the token versions"""
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_VERSION_CACHE='auth')
+    def test_process_local_cache(self):
+        errors = checks.check_token_version_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['user.E001'])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/token-version-check',
+        },
+    })
+    def test_shared_cache(self):
+        self.assertEqual(checks.check_token_version_cache(None), [])
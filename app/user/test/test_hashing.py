@@ -0,0 +1,117 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+from user.hashing import HashingPool, HashingPoolFull
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+VALIDATORS_NOTIFIED = \
+    'django.contrib.auth.password_validation.password_changed'
+
+
+class HashingPoolTests(TestCase):
+    """Test the bounded password hashing pool"""
+
+    def test_full_pool_rejects(self):
+        """Test jobs past the workers and the queue are turned away"""
+        pool = HashingPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        busy = threading.Thread(target=pool.run, args=(slow,))
+        busy.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(HashingPoolFull):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            busy.join()
+
+        self.assertEqual(pool.run(lambda: 'done'), 'done')
+
+
+class PasswordHashingApiTests(TestCase):
+    """Test login and signup through the hashing pool"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_signup_hashes_password(self):
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'test@test.com', 'password': 'test123', 'name': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        user = get_user_model().objects.get(email='test@test.com')
+        self.assertTrue(user.check_password('test123'))
+
+    def test_password_update_notifies_validators(self):
+        """Test a password set in the pool is saved like set_password"""
+        user = get_user_model().objects.create_user(
+            'test@test.com', 'test123')
+        self.client.force_authenticate(user)
+
+        with patch(VALIDATORS_NOTIFIED) as password_changed:
+            res = self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        password_changed.assert_called_once()
+        self.assertEqual(password_changed.call_args[0][0], 'newpass123')
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('newpass123'))
+
+    def test_signup_notifies_validators(self):
+        with patch(VALIDATORS_NOTIFIED) as password_changed:
+            res = self.client.post(CREATE_USER_URL, {
+                'email': 'test@test.com', 'password': 'test123',
+                'name': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        password_changed.assert_called_once()
+        self.assertEqual(password_changed.call_args[0][0], 'test123')
+
+    def test_login_pool_full(self):
+        """Test a saturated pool answers 429 with Retry-After"""
+        get_user_model().objects.create_user('test@test.com', 'test123')
+
+        with patch('user.hashing.HashingPool.run',
+                   side_effect=HashingPoolFull):
+            res = self.client.post(TOKEN_URL, {
+                'email': 'test@test.com', 'password': 'test123'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_wrong_password(self):
+        get_user_model().objects.create_user('test@test.com', 'test123')
+
+        res = self.client.post(TOKEN_URL, {
+            'email': 'test@test.com', 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rehash_on_login(self):
+        """Test a changed iteration count rehashes on the next login"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            user = get_user_model().objects.create_user(
+                'test@test.com', 'test123')
+        self.assertIn('$1000$', user.password)
+
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            res = self.client.post(TOKEN_URL, {
+                'email': 'test@test.com', 'password': 'test123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertIn('$2000$', user.password)
+        self.assertTrue(user.check_password('test123'))
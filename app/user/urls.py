@@ -1,6 +1,8 @@
 from django.urls import path
 
-from .views import CreateAuthView, CreateUserView, ManageUserView
+from . import async_views
+from .views import (AccountDeletionView, CreateAuthView, CreateUserView,
+                    ManageUserView, RefreshAccessTokenView, RevokeTokensView)
 
 app_name = 'user'
 
@@ -8,5 +10,11 @@ app_name = 'user'
 urlpatterns = [
     path('create/', CreateUserView.as_view(), name='create'),
     path('token/', CreateAuthView.as_view(), name='token'),
+    path('token/refresh/', RefreshAccessTokenView.as_view(),
+         name='token-refresh'),
+    path('token/revoke/', RevokeTokensView.as_view(), name='token-revoke'),
     path('me/', ManageUserView.as_view(), name='me'),
+    path('deletions/<uuid:pk>/', AccountDeletionView.as_view(),
+         name='deletion'),
+    path('async/me/', async_views.me, name='async-me'),
 ]
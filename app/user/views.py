@@ -1,31 +1,108 @@
-from rest_framework import authentication, exceptions, generics, permissions
+from core.deletion import start_deletion
+from core.models import AccountDeletion
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework import exceptions, generics, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from .serializers import AuthSerializer, UserSerializer
+from .authentication import (AccessTokenAuthentication,
+                             CachedTokenAuthentication, issue_access_token,
+                             revoke_access_tokens)
+from .serializers import (AccountDeletionSerializer, AuthSerializer,
+                          UserSerializer)
+
+
+def access_token_data(user):
+    return {
+        'access': issue_access_token(user),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
 
 
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the db
     """
     serializer_class = UserSerializer
+    throttle_scope = 'auth'
 
 
 class CreateAuthView(ObtainAuthToken):
-    """Create a new token for user
+    """Create a new token for user, with a short lived access token
     """
     serializer_class = AuthSerializer
     rendered_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken turns throttling off
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'auth'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key, **access_token_data(user)})
+
+
+class RefreshAccessTokenView(APIView):
+    """Issue a new access token in exchange for the database token
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        user = request.user
+        # the cached user could predate a revocation in another process
+        user.token_version = get_user_model().objects \
+            .values_list('token_version', flat=True).get(pk=user.pk)
+        return Response(access_token_data(user))
+
 
+class RevokeTokensView(APIView):
+    """Log the user out everywhere, deleting the database token and
+    invalidating every access token issued so far
+    """
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        Token.objects.filter(user=request.user).delete()
+        revoke_access_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Mange the authenticated user
+
+    A delete deactivates the user at once, their data is purged in the
+    background, see core.deletion.
     """
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (AccessTokenAuthentication,
+                              CachedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """Retrive and return authenticated user
         """
         return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        deletion = start_deletion(request.user)
+        return Response(AccountDeletionSerializer(deletion).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class AccountDeletionView(generics.RetrieveAPIView):
+    """Progress of the deletion of an account, the user is logged out by
+    then, the random id is the credential
+    """
+    queryset = AccountDeletion.objects.all()
+    serializer_class = AccountDeletionSerializer
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)